@@ -89,4 +89,16 @@ def create_app(script_info):
     app.register_blueprint(main_blueprint)
     app.register_blueprint(main_blueprint, url_prefix='/<lang_code>')
 
+    # encode the inline email images once at startup rather than on the first send
+    from app.services.email_assets import get_image_cache
+    with app.app_context():
+        get_image_cache()
+
+    # started from the first request so it runs in each worker rather than a pre-fork parent
+    if str(app.config['SCHEDULER_ENABLED']).lower() in ['true', '1', 'yes']:
+        @app.before_first_request
+        def start_scheduler():
+            from app.services.scheduler import get_scheduler
+            get_scheduler().start()
+
     return app
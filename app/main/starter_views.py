@@ -1,6 +1,6 @@
 from __future__ import print_function
 from app.main import main
-from flask import g, url_for, render_template, request, redirect, session as http_session, abort, current_app, flash, jsonify, make_response
+from flask import g, url_for, render_template, request, redirect, session as http_session, abort, current_app, flash, jsonify, make_response, stream_with_context
 from app.main.forms import *
 from app.services import SessionManager
 from app.services.steps import Step_0
@@ -8,7 +8,27 @@ from app.main.helpers import guess_locale
 import json
 from app.services import FormFillerService
 from app.services.usps_api import USPS_API
+from app.services.address_cache import get_address_cache
+from app.services.usps_coalescer import get_usps_coalescer
+from app.services.address_parser import prevalidation_stats
+from app.services.zip_index import get_zip_index
+from app.services.resilience import dependency_snapshots
+from app.services.voter_view_clients import get_voter_view_clients
+from app.services.registration_cache import get_registration_cache
+from app.services.voter_index import get_voter_index
+from app.services.lookup_orchestrator import get_lookup_orchestrator
+from app.services.registration_status import registration_status, batch_request_error, batch_status_lines
+from app.services.batch_runner import get_batch_runner
+from app.services.address_validation import validate_address_batch
 from app.services.email_service import EmailService
+from app.services.email_transports import get_email_router
+from app.services.smtp_pool import get_smtp_pool
+from app.services.bulk_sender import get_bulk_sender
+from app.services.challenge_sweep import sweep_incomplete_challenges
+from app.services.sweep_ledger import get_sweep_ledger
+from app.services.scheduler import get_scheduler
+from app.services.firestore_client import get_firestore
+from app.services.email_assets import get_image_cache
 from flask_cors import cross_origin
 
 from datetime import datetime, timedelta, tzinfo
@@ -18,16 +38,6 @@ import os
 import tracemalloc
 tracemalloc.start(10)
 
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import firestore
-import smtplib, ssl
-
-cred = credentials.Certificate('by8-318322-9aac6ae02900.json')
-firebase_admin.initialize_app(cred)
-
-db = firestore.client()
-
 # backend api endpoint for checking voter registration status
 @main.route('/registered', strict_slashes=False, methods=["POST"])
 @cross_origin(origin='*')
@@ -37,74 +47,19 @@ def registered():
         requestData = request.json
     else:
         requestData = request.form
-    # do error checking
-    missingParams = []
-    otherErrors = []
-    if 'state' not in requestData:
-        missingParams.append('state')
-    elif len(requestData.get('state')) != 2:
-        otherErrors.append('state must be 2 letter abbreviation')
-    if 'city' not in requestData:
-        missingParams.append('city')
-    if 'street' not in requestData:
-        missingParams.append('street')
-    if 'name_first' not in requestData:
-        missingParams.append('name_first')
-    if 'name_last' not in requestData:
-        missingParams.append('name_last')
-    if 'dob' not in requestData:
-        missingParams.append('dob')
-    else:
-        dob = requestData.get('dob').split('/')
-        if len(dob) != 3 or len(dob[0]) not in range(1, 3) or len(dob[1]) not in range(1, 3) or len(dob[2]) != 4:
-            otherErrors.append('dob must be in the form mm/dd/yyyy')
-    if 'zip' not in requestData:
-        missingParams.append('zip')
-    elif len(requestData.get('zip')) != 5:
-        otherErrors.append('zip must be 5 digits')
-    if missingParams:
-        error = 'Missing parameters: '
-        error += missingParams[0]
-        for i in range(1, len(missingParams)):
-            error = error + ', ' + missingParams[i]
-        resp = jsonify(error=error)
-        return make_response(resp, 400)
-    # check if address is valid
-    form = FormVR3(
-        addr = requestData.get('street'),
-        city = requestData.get('city'),
-        state = requestData.get('state'),
-        zip = requestData.get('zip'),
-    )
-    usps_api = USPS_API(form.data)
-    validated_addresses = usps_api.validate_addresses()
-    if not validated_addresses:
-        otherErrors.append('(street, city, state, zip) do not form a valid address')
-    if otherErrors:
-        error = otherErrors[0]
-        for i in range(1, len(otherErrors)):
-            error = error + ', ' + otherErrors[i]
-        resp = jsonify(error=error)
-        return make_response(resp, 400)
-    # check if the address is valid (via USPS address verification)
-    someJson = requestData
-    step = Step_0(someJson)
-    regFound = step.lookup_registration(
-        state=requestData.get('state'),
-        city=requestData.get('city'),
-        street=requestData.get('street'),
-        name_first=requestData.get('name_first'),
-        name_last=requestData.get('name_last'),
-        dob=requestData.get('dob'),
-        zipcode=requestData.get('zip')
-    )
-    #print(regFound)
-    if (regFound and 'status' not in regFound) or (regFound and 'status' in regFound and regFound['status'] == 'active'):
-        return jsonify({ 'registered': True })
-    elif regFound and 'status' in regFound:
-        return { 'registered': False, 'status': regFound['status'] }
-    else:
-        return { 'registered': False, 'status': 'not found' }
+    body, code = registration_status(requestData)
+    return make_response(jsonify(body), code)
+
+# backend api endpoint for checking the registration status of several people at once
+@main.route('/registered/batch', strict_slashes=False, methods=["POST"])
+@cross_origin(origin='*')
+def registered_batch():
+    body = request.get_json(silent=True)
+    error = batch_request_error(body, int(current_app.config['REGISTERED_BATCH_MAX']))
+    if error:
+        return make_response(jsonify(error=error), 400)
+    lines = batch_status_lines(body['people'], int(current_app.config['REGISTERED_BATCH_CONCURRENCY']))
+    return current_app.response_class(stream_with_context(lines), mimetype='application/x-ndjson')
 
 # backend api endpoint for filling out the Federal Form to register to vote
 @main.route('/registertovote', strict_slashes=False, methods=['POST'])
@@ -284,36 +239,14 @@ def email():
 @main.route('/challengeIncomplete', strict_slashes=False, methods=['GET', 'POST'])
 @cross_origin(origin='*')
 def challengeIncomplete():
-    # Firestore db is initiallized globally
-    users_ref = db.collection('users')
-    docs = users_ref.stream()
-    numSent = 0
-    emailServ = None
-    for doc in docs:
-        if 'challengeEndDate' in doc.to_dict() and isinstance(doc.to_dict()['challengeEndDate'], datetime):
-            # Convert challengeEndTime to UTC-7 (PST)
-            endDateTime = doc.to_dict()['challengeEndDate'] - timedelta(hours=7)
-            today = datetime.today() - timedelta(hours=7)
-            if endDateTime.date() == today.date() and len(doc.to_dict()['badges']) < 8:
-                '''
-                what doc.to_dict() looks like:
-                {'completedActionForChallenger': False, 'avatar': 4, 'invitedBy': '123randomnum123', 'isRegisteredVoter': False, 'inviteCode': '123random123', 'name': 'Person', 'notifyElectionReminders': False, 'badges': [], 'lastActive': DatetimeWithNanoseconds(2022, 3, 19, 16, 46, 22, 375000, tzinfo=<UTC>), 'challengeEndDate': DatetimeWithNanoseconds(2022, 3, 27, 16, 46, 20, 237000, tzinfo=<UTC>), 'sharedChallenge': False, 'email': 'asdf@skdfjs.com', 'startedChallenge': True}
-                '''
-                emailTo = doc.to_dict()['email']
-                try:
-                    # Initialize email service that uses Gmail API 
-                    if emailServ is None:
-                        emailServ = EmailService()
-                    message = emailServ.create_template_message(emailTo, 'challengeIncomplete')
-                    emailServ.send_message(message)
-                    numSent += 1
-                except ValueError as err: # value error if email type provided by user is not valid
-                    resp = jsonify(error=err)
-                    return make_response(resp, 400)
-                except Exception as e:
-                    resp = jsonify(error='invalid email: ' + emailTo)
-                    return make_response(resp, 400)
-    return { 'status': 'number of emails sent: ' + str(numSent) }
+    # Firestore client is created on first use; only users whose challenge ends today are read
+    '''
+    what a user document looks like:
+    {'completedActionForChallenger': False, 'avatar': 4, 'invitedBy': '123randomnum123', 'isRegisteredVoter': False, 'inviteCode': '123random123', 'name': 'Person', 'notifyElectionReminders': False, 'badges': [], 'lastActive': DatetimeWithNanoseconds(2022, 3, 19, 16, 46, 22, 375000, tzinfo=<UTC>), 'challengeEndDate': DatetimeWithNanoseconds(2022, 3, 27, 16, 46, 20, 237000, tzinfo=<UTC>), 'sharedChallenge': False, 'email': 'asdf@skdfjs.com', 'startedChallenge': True}
+    '''
+    # checkpointed and recorded in the sent ledger, so a retried or repeated request resumes and
+    # never emails anyone twice on the same day; the scheduler runs the same sweep
+    return sweep_incomplete_challenges(get_firestore().collection('users'))
 
 
 # backend api endpoint for checking voter registration status
@@ -366,6 +299,18 @@ def validateAddress():
         return { 'isValid': False }
     return { 'isValid': True }
 
+# backend api endpoint for validating a list of addresses at once
+@main.route('/validateAddress/batch', strict_slashes=False, methods=["POST"])
+@cross_origin(origin='*')
+def validateAddressBatch():
+    addresses = (request.get_json(silent=True) or {}).get('addresses')
+    max_addresses = int(current_app.config['ADDRESS_BATCH_MAX'])
+    if not isinstance(addresses, list) or not addresses:
+        return make_response(jsonify(error='addresses must be a non-empty list'), 400)
+    if len(addresses) > max_addresses:
+        return make_response(jsonify(error='at most %s addresses per batch' %(max_addresses)), 400)
+    return jsonify(results=validate_address_batch(addresses))
+
 @main.route('/altEmail', strict_slashes=False, methods=['POST'])
 @cross_origin(origin='*')
 def altemail():
@@ -415,15 +360,8 @@ def altemail():
     try:
         message = emailServ.create_template_message(emailTo, type, daysLeft, badgesLeft, firstName, avatar, isChallenger)
         sender_email = os.getenv('FROM_EMAIL')
-        receiver_email = emailTo
-        password = os.getenv('EMAIL_PWD')
-        # Create secure connection with server and send email
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-            server.login(sender_email, password)
-            server.sendmail(
-                sender_email, receiver_email, message
-            )
+        # sent on the transports of EMAIL_ROUTE other than the Gmail API
+        emailServ.send_message(message, sender=sender_email)
         return { 'status': 'email sent' }
     except ValueError: # value error if email type provided by user is not valid
         resp = jsonify(error='invalid template type, valid types include: challengerWelcome, badgeEarned, challengeWon, challengeIncomplete, playerWelcome, registered, electionReminder')
@@ -543,16 +481,9 @@ def altreg():
         subject = 'Here’s your voter registration form'
         messageWithAttachment = emailServ.create_message_with_attachment(to, subject, img)
     sender_email = os.getenv('FROM_EMAIL')
-    receiver_email = email
-    password = os.getenv('EMAIL_PWD')
 
-    # Create secure connection with server and send email
-    context = ssl.create_default_context()
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-        server.login(sender_email, password)
-        server.sendmail(
-            sender_email, receiver_email, messageWithAttachment
-        )
+    # sent on the transports of EMAIL_ROUTE other than the Gmail API
+    emailServ.send_message(messageWithAttachment, sender=sender_email)
     # previously checked if the address is valid (via USPS address verification)
     # instead of an error, send a warning if address is invalid right after email is sent
     if not validated_addresses:
@@ -576,6 +507,30 @@ def about_us():
     g.locale = guess_locale()
     return render_template('about.html')
 
+# endpoint to report cache hit rates and dependency health
+@main.route('/status/', methods=['GET'])
+def status():
+    return jsonify(
+        status='ok',
+        address_cache=get_address_cache().stats(),
+        address_prevalidation=prevalidation_stats(),
+        zip_index=get_zip_index().stats(),
+        dependencies=dependency_snapshots(),
+        voter_view_pools=get_voter_view_clients().stats(),
+        registration_cache=get_registration_cache().stats(),
+        voter_index=get_voter_index().stats() if get_voter_index() else None,
+        lookup_providers=get_lookup_orchestrator().stats(),
+        batches=get_batch_runner().stats(),
+        email_images=get_image_cache().stats(),
+        smtp_pool=get_smtp_pool().stats(),
+        email_transports=get_email_router().stats(),
+        bulk_send=get_bulk_sender().stats(),
+        sweeps=get_sweep_ledger().stats(),
+        scheduler=get_scheduler().stats(),
+        usps_coalescer=get_usps_coalescer().stats(),
+        pid=os.getpid(),
+    )
+
 # endpoint to check in on the status of the application
 @main.route('/memory/', methods=['GET'])
 def memory():
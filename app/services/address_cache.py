@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+from app.services.ttl_cache import TTLCache
+from app.services.address_parser import address_key
+
+class AddressCache():
+    """
+    Caches USPS verification results per normalized address.
+
+    Verified addresses are kept for ttl seconds, addresses USPS rejected for the shorter negative_ttl.
+    """
+
+    MISSING = TTLCache.MISSING
+
+    def __init__(self, max_size=2048, ttl=86400, negative_ttl=600, path=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # usps-v2: keys made before building and lot numbers were part of them must not be read back
+        self.cache = TTLCache(max_size=max_size, path=path, namespace='usps-v2')
+        self.lock = threading.Lock()
+        self.avg_lookup_seconds = None
+        self.saved_seconds = 0.0
+
+    def get(self, address):
+        """
+        Return the cached OrderedDict or ValueError for address, or AddressCache.MISSING.
+        """
+        value = self.cache.get(address_key(address))
+        if value is self.MISSING:
+            return value
+        with self.lock:
+            if self.avg_lookup_seconds:
+                self.saved_seconds += self.avg_lookup_seconds
+        if 'error' in value:
+            return ValueError(value['error'])
+        return OrderedDict(value['address'])
+
+    def set(self, address, result):
+        if isinstance(result, OrderedDict):
+            self.cache.set(address_key(address), {'address': list(result.items())}, self.ttl)
+        elif isinstance(result, ValueError):
+            self.cache.set(address_key(address), {'error': str(result)}, self.negative_ttl)
+
+    def record_lookup(self, seconds, count=1):
+        """
+        Fold the per-address latency of a USPS call into the running average used to estimate saved time.
+        """
+        per_address = seconds / max(count, 1)
+        with self.lock:
+            if self.avg_lookup_seconds is None:
+                self.avg_lookup_seconds = per_address
+            else:
+                self.avg_lookup_seconds = 0.8 * self.avg_lookup_seconds + 0.2 * per_address
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self.lock:
+            stats['avg_lookup_ms'] = round((self.avg_lookup_seconds or 0) * 1000, 1)
+            stats['saved_latency_ms'] = round(self.saved_seconds * 1000, 1)
+        return stats
+
+_address_cache = None
+_address_cache_lock = threading.Lock()
+
+def get_address_cache():
+    """
+    Process-wide AddressCache, configured from the app config on first use.
+    """
+    global _address_cache
+    if _address_cache is None:
+        with _address_cache_lock:
+            if _address_cache is None:
+                config = current_app.config
+                _address_cache = AddressCache(
+                    max_size=int(config['ADDRESS_CACHE_SIZE']),
+                    ttl=int(config['ADDRESS_CACHE_TTL']),
+                    negative_ttl=int(config['ADDRESS_CACHE_NEGATIVE_TTL']),
+                    path=config['ADDRESS_CACHE_PATH'],
+                )
+    return _address_cache
@@ -0,0 +1,130 @@
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+import usaddress
+
+VALID_CANDIDATE = 'candidate'
+INVALID = 'invalid'
+NEEDS_USPS = 'needs_usps'
+
+STREET_ABBREVIATIONS = {
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
+    'AVENUE': 'AVE', 'AV': 'AVE', 'BOULEVARD': 'BLVD', 'CIRCLE': 'CIR', 'COURT': 'CT',
+    'DRIVE': 'DR', 'HIGHWAY': 'HWY', 'LANE': 'LN', 'PARKWAY': 'PKWY', 'PLACE': 'PL',
+    'ROAD': 'RD', 'STREET': 'ST', 'TERRACE': 'TER', 'TRAIL': 'TRL',
+}
+UNIT_DESIGNATORS = ['APARTMENT', 'APT', 'UNIT', 'SUITE', 'STE', '#']
+STREET_LABELS = [
+    'AddressNumberPrefix', 'AddressNumber', 'AddressNumberSuffix',
+    'StreetNamePreDirectional', 'StreetNamePreModifier', 'StreetNamePreType',
+    'StreetName', 'StreetNamePostType', 'StreetNamePostDirectional',
+]
+SUBADDRESS_LABELS = ['SubaddressType', 'SubaddressIdentifier']
+OCCUPANCY_LABELS = ['OccupancyType', 'OccupancyIdentifier']
+PO_BOX_PATTERN = re.compile(r'^(P\s*O|POST\s+OFFICE)\s*BOX$')
+
+def normalize_part(value):
+    """
+    Uppercase, strip punctuation and collapse whitespace so trivially different spellings compare equal.
+    """
+    value = re.sub(r'[.,]', ' ', (value or '').upper())
+    value = value.replace('#', ' # ')
+    return ' '.join(value.split())
+
+def normalize_street(street):
+    return ' '.join(STREET_ABBREVIATIONS.get(word, word) for word in normalize_part(street).split())
+
+def normalize_unit(unit):
+    words = normalize_part(unit).split()
+    while words and words[0] in UNIT_DESIGNATORS:
+        words = words[1:]
+    return ' '.join(words)
+
+def normalize_zip(zip_code):
+    return re.sub(r'\D', '', zip_code or '')[:5]
+
+class ParsedAddress():
+    """
+    Result of parsing an address locally: its classification, why it was rejected (if it was)
+    and the normalized key used to cache its USPS result.
+    """
+
+    def __init__(self, classification, key, reason=None):
+        self.classification = classification
+        self.key = key
+        self.reason = reason
+
+    @property
+    def is_invalid(self):
+        return self.classification == INVALID
+
+def parse_address(address):
+    """
+    Parse an address dict in the pyusps request shape (address, address_extended, city, state, zip_code).
+    """
+    return _parse(
+        address.get('address') or '',
+        address.get('address_extended') or '',
+        address.get('city') or '',
+        address.get('state') or '',
+        address.get('zip_code') or '',
+    )
+
+def address_key(address):
+    return parse_address(address).key
+
+@lru_cache(maxsize=4096)
+def _parse(street, unit, city, state, zip_code):
+    tail = [normalize_part(city), normalize_part(state), normalize_zip(zip_code)]
+    fallback_key = '|'.join([normalize_street(street), normalize_unit(unit)] + tail)
+
+    if not street.strip():
+        return ParsedAddress(INVALID, fallback_key, 'missing street address')
+    if zip_code and len(tail[2]) != 5:
+        return ParsedAddress(INVALID, fallback_key, 'zip must be 5 digits')
+
+    try:
+        tags, address_type = usaddress.tag(street)
+    except usaddress.RepeatedLabelError:
+        return ParsedAddress(NEEDS_USPS, fallback_key)
+
+    if address_type == 'Intersection':
+        return ParsedAddress(INVALID, fallback_key, 'an intersection is not a residential address')
+    # rural route boxes are residential, post office boxes are not
+    if address_type == 'PO Box' and 'USPSBoxGroupType' not in tags and PO_BOX_PATTERN.match(normalize_part(tags.get('USPSBoxType'))):
+        return ParsedAddress(INVALID, fallback_key, 'a PO box is not a residential address')
+    if 'StreetName' in tags and 'AddressNumber' not in tags and 'USPSBoxGroupType' not in tags:
+        return ParsedAddress(INVALID, fallback_key, 'missing house number')
+    if address_type != 'Street Address' or 'AddressNumber' not in tags:
+        return ParsedAddress(NEEDS_USPS, fallback_key)
+
+    # a unit typed into the street line and one given separately should share a key; only the
+    # generic designators (APT, UNIT, #) are dropped, so LOT 4 and TRLR 4 stay apart
+    street_unit = normalize_unit(' '.join(tags[label] for label in OCCUPANCY_LABELS if label in tags))
+    parsed_unit = normalize_unit(unit)
+    if street_unit and street_unit != parsed_unit:
+        parsed_unit = ' '.join(filter(None, [street_unit, parsed_unit]))
+    if any(label not in STREET_LABELS + SUBADDRESS_LABELS + OCCUPANCY_LABELS for label in tags):
+        # something the key cannot place, such as a building name; keep the whole line
+        parsed_street = normalize_street(street)
+    else:
+        parsed_street = normalize_street(' '.join(tags[label] for label in STREET_LABELS + SUBADDRESS_LABELS if label in tags))
+    return ParsedAddress(VALID_CANDIDATE, '|'.join([parsed_street, parsed_unit] + tail))
+
+_classifications = Counter()
+_classifications_lock = threading.Lock()
+
+def prevalidate(addresses):
+    """
+    Parse each address ahead of any USPS call, keeping a running count of how they were classified.
+    """
+    parsed = [parse_address(address) for address in addresses]
+    with _classifications_lock:
+        _classifications.update(p.classification for p in parsed)
+    return parsed
+
+def prevalidation_stats():
+    with _classifications_lock:
+        return dict(_classifications)
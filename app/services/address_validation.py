@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from app.services.usps_api import USPS_API
+
+def address_errors(data):
+    """
+    Missing and malformed fields of an address validation request, as two lists.
+    """
+    missing = []
+    other = []
+    if 'state' not in data:
+        missing.append('state')
+    elif not isinstance(data.get('state'), str) or len(data.get('state')) != 2:
+        other.append('state must be 2 letter abbreviation')
+    if 'city' not in data:
+        missing.append('city')
+    if 'street' not in data:
+        missing.append('street')
+    if 'zip' not in data:
+        missing.append('zip')
+    elif not isinstance(data.get('zip'), str) or len(data.get('zip')) != 5:
+        # a number would lose the leading zeros of a ZIP like 02134
+        other.append('zip must be 5 digits')
+    for field in ['city', 'street', 'unit']:
+        if data.get(field) is not None and not isinstance(data.get(field), str):
+            other.append('{} must be a string'.format(field))
+    return missing, other
+
+def validate_address_batch(items):
+    """
+    Validate a list of addresses shaped like /validateAddress requests and return one result per item, in order.
+    Malformed items get an error and a 400 code, items USPS could not be asked about a 503, without failing the rest.
+    """
+    usps_api = USPS_API()
+    results = [None] * len(items)
+    to_verify = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'error': 'each address must be an object', 'code': 400}
+            continue
+        missing, other = address_errors(item)
+        if missing:
+            results[index] = {'error': 'Missing parameters: ' + ', '.join(missing), 'code': 400}
+        elif other:
+            results[index] = {'error': ', '.join(other), 'code': 400}
+        else:
+            to_verify.append((index, dict([
+                ('address', item.get('street')),
+                ('city', item.get('city')),
+                ('state', item.get('state')),
+                ('zip_code', item.get('zip')),
+                ('address_extended', item.get('unit', '')),
+            ])))
+
+    verified = usps_api.verify_many([address for _, address in to_verify]) if to_verify else []
+    for (index, _), result in zip(to_verify, verified):
+        if isinstance(result, OrderedDict):
+            results[index] = {'isValid': True, 'address': usps_api.marshall_single_address(result)}
+        elif isinstance(result, ValueError):
+            results[index] = {'isValid': False}
+        else:
+            results[index] = {'error': 'address validation is unavailable, try again later', 'code': 503}
+    return results
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app, has_app_context
+
+class BatchRunner():
+    """
+    Process-wide worker pool shared by the batch endpoints.
+
+    Each batch keeps at most limit items in flight, so one large batch cannot take every worker,
+    and results are yielded as items finish rather than in request order. Items run inside the
+    caller's app context.
+    """
+
+    def __init__(self, max_workers=32):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+
+    def run(self, fn, items, limit=8):
+        """
+        Yield (index, result, error) for each item, error being the exception fn raised or None.
+        Items not yet started are cancelled if the caller stops iterating.
+        """
+        app = current_app._get_current_object() if has_app_context() else None
+        items = list(items)
+        with self.lock:
+            self.batches += 1
+            self.items += len(items)
+        pending = {}
+        position = 0
+        try:
+            while position < len(items) or pending:
+                while position < len(items) and len(pending) < limit:
+                    pending[self.executor.submit(self._call, app, fn, items[position])] = position
+                    position += 1
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        with self.lock:
+                            self.errors += 1
+                    yield index, None if error else future.result(), error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_workers': self.max_workers,
+                'batches': self.batches,
+                'items': self.items,
+                'errors': self.errors,
+            }
+
+    def _call(self, app, fn, item):
+        if app is None:
+            return fn(item)
+        with app.app_context():
+            return fn(item)
+
+_batch_runner = None
+_batch_runner_lock = threading.Lock()
+
+def get_batch_runner():
+    global _batch_runner
+    if _batch_runner is None:
+        with _batch_runner_lock:
+            if _batch_runner is None:
+                _batch_runner = BatchRunner(max_workers=int(current_app.config['BATCH_WORKERS']))
+    return _batch_runner
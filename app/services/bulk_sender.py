@@ -0,0 +1,216 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+
+class TokenBucket():
+    """
+    Allows rate acquisitions per second on average with bursts of up to capacity; acquire
+    blocks until a token is free.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class BulkSendProgress():
+    def __init__(self, name, total):
+        self.name = name
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.unknown = 0
+        self.retries = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def count(self, counter, n=1):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def snapshot(self):
+        with self.lock:
+            end = self.finished_at or time.time()
+            return {
+                'name': self.name,
+                'total': self.total,
+                'sent': self.sent,
+                'failed': self.failed,
+                'unknown': self.unknown,
+                'retries': self.retries,
+                'pending': self.total - self.sent - self.failed - self.unknown,
+                'seconds': round(end - self.started_at, 2),
+                'finished': self.finished_at is not None,
+            }
+
+class BulkSender():
+    """
+    Sends one email per recipient on a bounded worker pool, paced by a token bucket shared by
+    every bulk send in the process so campaigns stay inside the Gmail API sending quota.
+
+    Each recipient is sent and retried on its own: a failure is retried up to attempts times
+    with exponential backoff when should_retry says it is transient, and never stops the
+    other recipients. A failure that may_have_sent says could still have been delivered is
+    never retried, and is reported as 'unknown' rather than 'failed'.
+    """
+
+    KEEP_RUNS = 5
+
+    def __init__(self, bucket, workers=4, attempts=3, backoff=2.0, should_retry=lambda err: True, may_have_sent=lambda err: False):
+        self.bucket = bucket
+        self.workers = workers
+        self.attempts = attempts
+        self.backoff = backoff
+        self.should_retry = should_retry
+        self.may_have_sent = may_have_sent
+        self.lock = threading.Lock()
+        self.runs = []
+
+    def start(self, name):
+        """
+        Progress of a send made of several runs, such as a paged and partitioned sweep: pass it
+        to each run, which adds its recipients to it, and to finish once they are all done.
+        """
+        progress = BulkSendProgress(name, 0)
+        with self.lock:
+            # the most recent few, for /status/
+            self.runs = self.runs[-(self.KEEP_RUNS - 1):] + [progress]
+        return progress
+
+    def finish(self, progress):
+        with progress.lock:
+            progress.finished_at = time.time()
+        if has_app_context():
+            current_app.logger.info("bulk send %s finished: %s" %(progress.name, progress.snapshot()))
+
+    def run(self, name, recipients, send, progress=None):
+        """
+        Call send(recipient) for each (key, recipient) pair and return one result dict per
+        recipient, in order: key, status ('sent', 'failed' or 'unknown'), attempts and error.
+        Counts go to progress if given, or else to a run of its own.
+        """
+        recipients = list(recipients)
+        return self._map(name, progress, len(recipients), lambda progress, item: self._send_one(progress, send, *item), recipients)
+
+    def run_batches(self, name, recipients, send_batch, batch_size, progress=None):
+        """
+        Like run, but hands recipients to send_batch(list of recipients) batch_size at a time.
+        send_batch returns an error or None per recipient, in order, so a batch can partly
+        fail; the recipients whose error is transient are retried together in a smaller batch.
+        """
+        recipients = list(recipients)
+        batches = [recipients[i:i + batch_size] for i in range(0, len(recipients), batch_size)]
+        results = self._map(name, progress, len(recipients), lambda progress, batch: self._send_batch(progress, send_batch, batch), batches)
+        return [result for batch in results for result in batch]
+
+    def stats(self):
+        with self.lock:
+            runs = list(self.runs)
+        return {
+            'rate': self.bucket.rate,
+            'workers': self.workers,
+            'last_run': runs[-1].snapshot() if runs else None,
+            'recent_runs': [progress.snapshot() for progress in runs],
+        }
+
+    def _send_one(self, progress, send, key, recipient):
+        for attempt in range(1, self.attempts + 1):
+            self.bucket.acquire()
+            try:
+                send(recipient)
+            except Exception as err:
+                if attempt < self.attempts and self.should_retry(err) and not self.may_have_sent(err):
+                    progress.count('retries')
+                    time.sleep(self.backoff * (2 ** (attempt - 1)))
+                    continue
+                return self._failure(progress, key, attempt, err)
+            progress.count('sent')
+            return {'key': key, 'status': 'sent', 'attempts': attempt}
+
+    def _send_batch(self, progress, send_batch, batch):
+        results = [None] * len(batch)
+        pending = list(range(len(batch)))
+        for attempt in range(1, self.attempts + 1):
+            # quota is charged per message, batched or not
+            for _ in pending:
+                self.bucket.acquire()
+            try:
+                errors = send_batch([batch[i][1] for i in pending])
+            except Exception as err:
+                errors = [err] * len(pending)
+            retrying = []
+            for i, err in zip(pending, errors):
+                if err is None:
+                    progress.count('sent')
+                    results[i] = {'key': batch[i][0], 'status': 'sent', 'attempts': attempt}
+                elif attempt < self.attempts and self.should_retry(err) and not self.may_have_sent(err):
+                    progress.count('retries')
+                    retrying.append(i)
+                else:
+                    results[i] = self._failure(progress, batch[i][0], attempt, err)
+            if not retrying:
+                break
+            pending = retrying
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+        return results
+
+    def _failure(self, progress, key, attempt, err):
+        status = 'unknown' if self.may_have_sent(err) else 'failed'
+        progress.count(status)
+        return {'key': key, 'status': status, 'attempts': attempt, 'error': str(err)}
+
+    def _map(self, name, progress, total, work, items):
+        own = progress is None
+        if own:
+            progress = self.start(name)
+        progress.count('total', total)
+        app = current_app._get_current_object() if has_app_context() else None
+
+        def run_one(item):
+            if app is None:
+                return work(progress, item)
+            with app.app_context():
+                return work(progress, item)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-send') as executor:
+            results = list(executor.map(run_one, items))
+        if own:
+            self.finish(progress)
+        return results
+
+_bulk_sender = None
+_bulk_sender_lock = threading.Lock()
+
+def get_bulk_sender():
+    global _bulk_sender
+    if _bulk_sender is None:
+        with _bulk_sender_lock:
+            if _bulk_sender is None:
+                from app.services.email_service import is_transient_gmail_error
+                from app.services.email_transports import may_have_sent
+                config = current_app.config
+                _bulk_sender = BulkSender(
+                    TokenBucket(float(config['GMAIL_SEND_RATE']), int(config['GMAIL_SEND_BURST'])),
+                    workers=int(config['BULK_SEND_WORKERS']),
+                    attempts=int(config['BULK_SEND_ATTEMPTS']),
+                    backoff=float(config['BULK_SEND_BACKOFF_SECONDS']),
+                    should_retry=is_transient_gmail_error,
+                    may_have_sent=may_have_sent,
+                )
+    return _bulk_sender
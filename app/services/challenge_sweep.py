@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from app.services.batch_runner import get_batch_runner
+from app.services.bulk_sender import get_bulk_sender
+from app.services.email_service import EmailService
+from app.services.sweep_ledger import get_sweep_ledger
+
+# the only user fields the challenge sweeps read
+SWEEP_FIELDS = ['email', 'badges', 'challengeEndDate']
+# challenge days are counted in PST (UTC-7)
+DAY_OFFSET = timedelta(hours=7)
+
+def challenge_window(today=None):
+    """
+    The UTC [start, end) range of challengeEndDate values falling on today, a PST date
+    that defaults to the current one.
+    """
+    if today is None:
+        today = (datetime.today() - DAY_OFFSET).date()
+    start = datetime(today.year, today.month, today.day, tzinfo=timezone.utc) + DAY_OFFSET
+    return start, start + timedelta(days=1)
+
+def last_ended_day(now=None):
+    """
+    The latest PST date whose challenge window has fully passed at now, a UTC datetime that
+    defaults to the current time; the day a sweep run after midnight PST should cover.
+    """
+    if now is None:
+        now = datetime.utcnow()
+    return (now - DAY_OFFSET).date() - timedelta(days=1)
+
+def partition_window(start, end, partitions):
+    """
+    [start, end) cut into partitions back to back ranges of equal length.
+    """
+    step = (end - start) / partitions
+    bounds = [start + step * i for i in range(partitions)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def user_pages(users, start, end, page_size=500, after=None):
+    """
+    Snapshots of the users whose challengeEndDate is in [start, end), a page at a time,
+    starting after the user whose document id is after.
+
+    The date range is filtered by Firestore and only SWEEP_FIELDS are fetched; each page
+    starts after the last document of the previous one, so no query reads more than
+    page_size documents.
+    """
+    query = users.where('challengeEndDate', '>=', start).where('challengeEndDate', '<', end) \
+        .order_by('challengeEndDate').select(SWEEP_FIELDS).limit(page_size)
+    last = None
+    if after is not None:
+        last = users.document(after).get()
+        if not last.exists:
+            # the user is gone, start over; the sent ledger skips whoever was already done
+            last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+def incomplete_challenger_pages(users, start, end, page_size=500, after=None):
+    """
+    For each page of users whose challenge ends in [start, end), the (document id, email) of
+    those without all 8 badges and the id of the page's last user, to resume after.
+    """
+    read = 0
+    for page in user_pages(users, start, end, page_size, after):
+        read += len(page)
+        recipients = []
+        for doc in page:
+            user = doc.to_dict()
+            # Firestore cannot filter on the length of an array
+            if len(user.get('badges') or []) < 8 and user.get('email'):
+                recipients.append((doc.id, user['email']))
+        yield recipients, page[-1].id
+    current_app.logger.info("challenge sweep of %s to %s read %s users" %(start, end, read))
+
+def incomplete_challengers(users, today=None, page_size=500):
+    """
+    (document id, email) of each user whose challenge ends today without all 8 badges.
+    """
+    start, end = challenge_window(today)
+    for recipients, _ in incomplete_challenger_pages(users, start, end, page_size):
+        for recipient in recipients:
+            yield recipient
+
+def run_sweep(ledger, sweep, type, day, pages, send):
+    """
+    Send type to the recipients pages(after) yields, a page of (user id, email) and a cursor
+    at a time, recording each page's cursor in ledger once the page is done.
+
+    A run picks up after the cursor of an unfinished earlier run of sweep on day, and any
+    user the ledger has type as already sent to on day is skipped, so a sweep can be rerun
+    or run concurrently without anyone getting the same email twice. send(recipients)
+    returns the bulk sender results. Returns the results of this run and the number of
+    recipients skipped.
+    """
+    checkpoint = ledger.checkpoint(sweep, day)
+    after = checkpoint[0] if checkpoint and not checkpoint[1] else None
+    if after is not None:
+        current_app.logger.info("sweep %s for %s resuming after %s" %(sweep, day, after))
+    results = []
+    skipped = 0
+    for recipients, cursor in pages(after):
+        claimed = set(ledger.claim(type, day, [user for user, _ in recipients]))
+        todo = [recipient for recipient in recipients if recipient[0] in claimed]
+        skipped += len(recipients) - len(todo)
+        page_results = send(todo) if todo else []
+        ledger.finish(type, day,
+            sent=[result['key'] for result in page_results if result['status'] == 'sent'],
+            failed=[result['key'] for result in page_results if result['status'] == 'failed'],
+            unknown=[result['key'] for result in page_results if result['status'] == 'unknown'])
+        ledger.save_checkpoint(sweep, day, cursor)
+        results += page_results
+    ledger.save_checkpoint(sweep, day, None, done=True)
+    return results, skipped
+
+def run_partitioned_sweep(ledger, sweep, type, users, today, send, partitions=1, parallelism=1, page_size=500):
+    """
+    run_sweep over users whose challenge ends today, with the day cut into partitions time
+    ranges that are swept parallelism at a time, each with its own checkpoint. The sent
+    ledger is shared, so a recipient is sent to once whichever partition finds them.
+
+    Returns the results and skipped count of all partitions, in partition order, and the
+    number of partitions that failed; a failed partition does not stop the others and is
+    resumed from its checkpoint by the next run.
+    """
+    start, end = challenge_window(today)
+    day = start.date()
+    ranges = partition_window(start, end, partitions)
+
+    def sweep_partition(index):
+        low, high = ranges[index]
+        # the partition count is part of the name so changing it never reuses another range's cursor
+        return run_sweep(ledger, '%s:%s/%s' %(sweep, index, partitions), type, day,
+            lambda after: incomplete_challenger_pages(users, low, high, page_size, after), send)
+
+    done = {}
+    failed = 0
+    for index, result, error in get_batch_runner().run(sweep_partition, range(partitions), limit=parallelism):
+        if error is not None:
+            failed += 1
+            current_app.logger.error("sweep %s partition %s of %s failed: %r" %(sweep, index, partitions, error))
+            continue
+        done[index] = result
+    results = [result for index in sorted(done) for result in done[index][0]]
+    skipped = sum(done[index][1] for index in done)
+    return results, skipped, failed
+
+def sweep_incomplete_challenges(users, today=None):
+    """
+    Email every user whose challenge ends today without all 8 badges, in Gmail API batches
+    of GMAIL_BATCH_SIZE, and report how many were sent, failed and skipped.
+    """
+    config = current_app.config
+    batchSize = int(config['GMAIL_BATCH_SIZE'])
+
+    # one failed recipient never stops the rest
+    emailServ = EmailService()
+    def send(emailTo):
+        message = emailServ.create_template_message(emailTo, 'challengeIncomplete')
+        emailServ.send_message(message, attempts=1)
+    def send_batch(emails):
+        messages = [emailServ.create_template_message(emailTo, 'challengeIncomplete') for emailTo in emails]
+        return [error for _, error in emailServ.send_batch(messages)]
+    # every page of every partition counts towards the one progress of this sweep
+    sender = get_bulk_sender()
+    progress = sender.start('challengeIncomplete')
+    def send_page(recipients):
+        if batchSize > 1:
+            return sender.run_batches('challengeIncomplete', recipients, send_batch, batchSize, progress=progress)
+        return sender.run('challengeIncomplete', recipients, send, progress=progress)
+
+    ledger = get_sweep_ledger()
+    ledger.prune()
+    try:
+        results, skipped, failedPartitions = run_partitioned_sweep(ledger, 'challengeIncomplete', 'challengeIncomplete',
+            users, today, send_page,
+            partitions=int(config['SWEEP_PARTITIONS']),
+            parallelism=int(config['SWEEP_PARALLELISM']),
+            page_size=int(config['CHALLENGE_SWEEP_PAGE_SIZE']))
+    finally:
+        sender.finish(progress)
+    numSent = len([result for result in results if result['status'] == 'sent'])
+    numUnknown = len([result for result in results if result['status'] == 'unknown'])
+    return {
+        'status': 'number of emails sent: ' + str(numSent),
+        'failed': len(results) - numSent - numUnknown,
+        # timed out, maybe delivered; never sent again
+        'unknown': numUnknown,
+        'skipped': skipped,
+        'failedPartitions': failedPartitions,
+        'results': results,
+    }
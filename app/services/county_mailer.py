@@ -1,9 +1,11 @@
 from flask import current_app
+from app.services.batch_runner import get_batch_runner
 from app.services.ses_mailer import SESMailer
 from flask_babel import lazy_gettext
 import os
 import hashlib
 import base64
+import time
 
 # used to email the federal out to states
 class CountyMailer():
@@ -76,31 +78,55 @@ class CountyMailer():
         attachments = self.build_attachments()
 
         current_app.logger.info("%s SEND mail to %s" %(self.registrant.session_id, clerk_email))
-        responses = {}
-
-        # first is to clerk
-        msg = self.ses.build_msg(
-            attach=attachments,
-            to=[clerk_email],
-            cc=[reg_email],
-            bcc=[current_app.config['EMAIL_BCC']],
-            subject=self.clerk_subject,
-            body=self.clerk_body,
-        )
-        responses['clerk'] = self.ses.send_msg(msg, current_app.config['EMAIL_FROM'])
-        current_app.logger.info("%s SENT to clerk %s" %(self.registrant.session_id, responses['clerk']))
-
-        # second is receipt to voter
-        receipt = self.ses.build_msg(
-            to=[reg_email],
-            bcc=[],
-            subject=self.receipt_subject,
-            body=self.receipt_body,
-        )
-        responses['receipt'] = self.ses.send_msg(receipt, current_app.config['EMAIL_FROM'])
-        current_app.logger.info("%s SENT receipt %s" %(self.registrant.session_id, responses['receipt']))
 
-        return responses
+        # first is to clerk, second is receipt to voter
+        messages = {
+            'clerk': self.ses.build_msg(
+                attach=attachments,
+                to=[clerk_email],
+                cc=[reg_email],
+                bcc=[current_app.config['EMAIL_BCC']],
+                subject=self.clerk_subject,
+                body=self.clerk_body,
+            ),
+            'receipt': self.ses.build_msg(
+                to=[reg_email],
+                bcc=[],
+                subject=self.receipt_subject,
+                body=self.receipt_body,
+            ),
+        }
+        return self.dispatch(messages, current_app.config['EMAIL_FROM'])
+
+    def dispatch(self, messages, sender):
+        """
+        Send the built messages, a dict of name to message, at the same time rather than one
+        SES round trip after the other, and return the dict of name to response.
+
+        Every message is sent even if another fails; an exception send_msg lets through is
+        raised once all are done.
+        """
+        names = list(messages)
+
+        def send(name):
+            started = time.perf_counter()
+            response = self.ses.send_msg(messages[name], sender)
+            return response, time.perf_counter() - started
+
+        sent = {}
+        errors = []
+        for index, result, error in get_batch_runner().run(send, names, limit=len(names)):
+            name = names[index]
+            if error is not None:
+                current_app.logger.error("%s FAILED %s: %r" %(self.registrant.session_id, name, error))
+                errors.append(error)
+                continue
+            sent[name], duration = result
+            current_app.logger.info("%s SENT %s in %.3fs %s" %(self.registrant.session_id, name, duration, sent[name]))
+        if errors:
+            raise errors[0]
+        # in the order given, whichever finished first
+        return dict((name, sent[name]) for name in names)
 
     def build_attachments(self):
         attachments = []
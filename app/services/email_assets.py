@@ -0,0 +1,86 @@
+import base64
+import glob
+import mimetypes
+import os
+import threading
+from email.mime.nonmultipart import MIMENonMultipart
+from flask import current_app
+
+class ImageCache():
+    """
+    Inline email images, read and base64-encoded once and kept as ready-made MIME parts.
+
+    Encoded payloads are kept per path and parts per (path, content id); the parts share
+    their path's payload, so memory is counted once per file. A file whose mtime changes is
+    re-read on its next use. Parts are shared between messages and must not be modified.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.parts = {}
+        self.hits = 0
+        self.loads = 0
+
+    def preload(self, pattern):
+        for path in sorted(glob.glob(pattern)):
+            self._file(path)
+
+    def part(self, path, content_id):
+        mtime, subtype, payload = self._file(path)
+        key = (path, content_id)
+        with self.lock:
+            cached = self.parts.get(key)
+            if cached is not None and cached[0] == mtime:
+                self.hits += 1
+                return cached[1]
+        part = MIMENonMultipart('image', subtype)
+        part.set_payload(payload)
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-ID', '<{}>'.format(content_id))
+        with self.lock:
+            self.parts[key] = (mtime, part)
+        return part
+
+    def stats(self):
+        with self.lock:
+            return {
+                'files': len(self.files),
+                'parts': len(self.parts),
+                'bytes': sum(len(payload) for _, _, payload in self.files.values()),
+                'hits': self.hits,
+                'loads': self.loads,
+            }
+
+    def _file(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.files.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        subtype = (mimetypes.guess_type(path)[0] or 'image/png').split('/')[1]
+        entry = (mtime, subtype, base64.encodebytes(data).decode('ascii'))
+        with self.lock:
+            self.files[path] = entry
+            self.loads += 1
+        return entry
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """
+    Process-wide ImageCache, preloaded with EMAIL_IMAGE_PRELOAD on first use.
+    """
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                cache = ImageCache()
+                pattern = current_app.config['EMAIL_IMAGE_PRELOAD']
+                if pattern:
+                    cache.preload(pattern)
+                _image_cache = cache
+    return _image_cache
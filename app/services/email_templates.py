@@ -0,0 +1,236 @@
+import os
+import threading
+from datetime import timedelta, date
+from types import MappingProxyType
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup, escape
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+# the fields that change from one recipient to the next; everything else is fixed per email type
+PERSONAL_FIELDS = ['p1', 'endDate', 'firstName', 'daysLeft', 'badgesLeft', 'p3']
+SENTINEL = '\x00'
+
+def freeze(types):
+    return MappingProxyType(dict((name, MappingProxyType(dict(content))) for name, content in types.items()))
+
+EMAIL_TYPES = freeze({
+    'challengerWelcome': {
+        'subject': 'Welcome to the 8by8 Challenge!',
+        'h1': 'INVITE YOUR FRIENDS',
+        'p1': 'The challenge is on! Get 8 of your friends to take action on your 8by8 Challenge by ',
+        'img1': '',
+        'img1Class': 'hidden',
+        'btn1': 'INVITE FRIENDS',
+        'h2': 'REMAINING...',
+        'img2': 'img/daysleft8.png',
+        'img2Class': '',
+        'p2': ' before ending the challenge',
+        'p3': ' badges winning!',
+        'btn2': 'INVITE FRIENDS'
+    },
+    'badgeEarned': {
+        'subject': 'You got badges!',
+        'h1': 'GREAT PROGRESS!',
+        'p1': 'You’ve earned badges! Go to 8by8 to check them out.',
+        'img1': 'img/badges3.png',
+        'img1Class': '',
+        'btn1': 'CHECK OUT YOUR BADGES',
+        'h2': 'REMAINING...',
+        'img2': '',
+        'img2Class': '',
+        'p2': ' before ending the challenge',
+        'p3': ' badges winning!',
+        'btn2': 'INVITE FRIENDS'
+    },
+    'challengeWon': {
+        'subject': 'You won the 8by8 Challenge!',
+        'h1': 'CONGRATULATIONS!',
+        'p1': 'You earned all 8 badges! We really appreciate you and your friends’ efforts in helping the AAPI community!',
+        'img1': 'img/badges8.png',
+        'img1Class': '',
+        'btn1': 'CHECK OUT YOUR BADGES',
+        'h2': 'TELL YOUR FRIENDS',
+        'img2': '',
+        'img2Class': 'hidden',
+        'p2': 'Share your achievement and encourage others to take the challenge as well! ',
+        'p3': '',
+        'btn2': 'SHARE WITH FRIENDS'
+    },
+    'challengeIncomplete': {
+        'subject': 'Restart your 8by8 Challenge',
+        'h1': 'LET\'S TRY IT AGAIN',
+        'p1': 'Your challenge ended before you’ve earned all 8 badges. Restart your challenge to try again!',
+        'img1': '',
+        'img1Class': 'hidden',
+        'btn1': 'RESTART CHALLENGE',
+        'h2': 'WHY 8BY8?',
+        'img2': '',
+        'img2Class': 'hidden',
+        'p2': 'Your participation is important to closing the voter registration gap in the AAPI community.',
+        'p3': '',
+        'btn2': 'LEARN MORE'
+    },
+    'playerWelcome': {
+        'subject': 'Welcome to the 8by8 Challenge!',
+        'h1': 'TAKE ACTION NOW',
+        'p1': 'Welcome to the 8by8 Challenge! Take action now towards your friend’s challenge.',
+        'img1': '',
+        'img1Class': 'hidden',
+        'btn1': 'TAKE ACTION',
+        'h2': 'WHAT ELSE?',
+        'img2': '',
+        'img2Class': 'hidden',
+        'p2': 'Take the 8by8 challenge yourself or spread the word!',
+        'p3': '',
+        'btn2': 'VIEW 8BY8 CHALLENGE'
+    },
+    'registered': {
+        'subject': 'You\'ve registered to vote!',
+        'h1': 'THANK YOU FOR DOING YOUR PART.',
+        'p1': 'You completed the first step in your voter registration! Remember to finish your registration at your state website or by mailing in your form. Your friend has earned a badge in their 8by8 Challenge!',
+        'img1': '',
+        'img1Class': '',
+        'btn1': 'SHARE WITH FRIENDS',
+        'h2': 'THERE\'S MORE YOU CAN DO',
+        'img2': '',
+        'img2Class': 'hidden',
+        'p2': 'Come back to 8by8 and take another action for the AAPI community!',
+        'p3': '',
+        'btn2': 'TAKE ANOTHER ACTION'
+    },
+    'electionReminder': {
+        'subject': 'Your election reminders are set!',
+        'h1': 'THANK YOU FOR DOING YOUR PART.',
+        'p1': 'You’ve set up election reminders. Your friend has earned a badge in their 8by8 Challenge!',
+        'img1': '',
+        'img1Class': '',
+        'btn1': 'SHARE WITH FRIENDS',
+        'h2': 'THERE\'S MORE YOU CAN DO',
+        'img2': '',
+        'img2Class': 'hidden',
+        'p2': 'Come back to 8by8 and take another action for the AAPI community!',
+        'p3': '',
+        'btn2': 'TAKE ANOTHER ACTION'
+    }
+})
+
+# compiled once per process; templates are only re-read if the file changes on disk
+environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True, auto_reload=True)
+
+class Skeleton():
+    """
+    An email type's HTML with all of its fixed content rendered in, split around the
+    personal fields so a send only has to escape and join those.
+    """
+
+    def __init__(self, html):
+        pieces = html.split(SENTINEL)
+        self.static = pieces[0::2]
+        self.fields = pieces[1::2]
+
+    def render(self, **values):
+        out = [self.static[0]]
+        for field, static in zip(self.fields, self.static[1:]):
+            out.append(escape(values.get(field) or ''))
+            out.append(static)
+        return ''.join(out)
+
+_skeletons = {}
+_skeletons_lock = threading.Lock()
+_skeletons_version = None
+
+def templates_version():
+    # changes whenever an email template file is edited, added or removed
+    folder = os.path.join(TEMPLATE_DIR, 'email')
+    return tuple(sorted((name, os.path.getmtime(os.path.join(folder, name))) for name in os.listdir(folder)))
+
+def refresh_skeletons():
+    """
+    Drop the cached skeletons if an email template changed since they were built, so the next
+    send renders from the new templates; returns whether they were dropped.
+    """
+    global _skeletons_version
+    version = templates_version()
+    with _skeletons_lock:
+        if version == _skeletons_version:
+            return False
+        _skeletons_version = version
+        _skeletons.clear()
+        return True
+
+def skeleton(type):
+    if type not in _skeletons:
+        with _skeletons_lock:
+            if type not in _skeletons:
+                _skeletons[type] = build_skeleton(type)
+    return _skeletons[type]
+
+def build_skeleton(type):
+    content = EMAIL_TYPES[type]
+    btn1Link = 'https://challenge.8by8.us/progress'
+    btn2Link = 'https://challenge.8by8.us/actions'
+    if type == 'playerWelcome':
+        btn1Link, btn2Link = btn2Link, btn1Link
+    values = dict(content, btn1Link=btn1Link, btn2Link=btn2Link,
+        buttonSize='14' if type in ['badgeEarned', 'challengeWon'] else '16')
+    for field in PERSONAL_FIELDS:
+        values[field] = Markup(SENTINEL + field + SENTINEL)
+    return Skeleton(environment.get_template('email/challenge.html').render(**values))
+
+def render_template_message(type, daysLeft='', badgesLeft='', firstName='', avatar=None, isChallenger=''):
+    """
+    Subject, HTML and inline images (content id, path) of a templated email.
+    Raises ValueError for an unknown email type.
+    """
+    if type not in EMAIL_TYPES:
+        raise ValueError("invalid email type")
+    content = EMAIL_TYPES[type]
+    img1 = content['img1']
+    img2 = content['img2']
+    paragraph = content['p1']
+    p3 = content['p3']
+
+    if type == 'badgeEarned':
+        img2 = 'img/daysleft' + daysLeft + '.png'
+        if daysLeft == '1':
+            daysLeft = daysLeft + ' day'
+        else:
+            daysLeft = daysLeft + ' days'
+        if badgesLeft == '1':
+            p3 = p3[:6] + p3[7:]
+        badgesLeft = badgesLeft + ' more'
+    elif type != 'challengerWelcome':
+        daysLeft = ''
+        badgesLeft = ''
+    if type == 'challengerWelcome':
+        endDate = date.today() + timedelta(days=8)
+        endDateStr = endDate.strftime("%B %d, %Y") + '.'
+        daysLeft = '8 days'
+        badgesLeft = '8 more'
+    else:
+        endDateStr = ''
+    if type == 'registered' or type == 'electionReminder':
+        img1 = 'img/avatar' + avatar + '.png'
+        if isChallenger and isChallenger.lower() == 'true':
+            index = paragraph.find('Your friend has')
+            paragraph = paragraph[:index]
+    else:
+        firstName = ''
+
+    html = skeleton(type).render(p1=paragraph, endDate=endDateStr, firstName=(firstName or '').upper(),
+        daysLeft=daysLeft, badgesLeft=badgesLeft, p3=p3)
+
+    images = [('image0', 'img/8by8challenge.png')]
+    if img1:
+        images.append(('image1', img1))
+    if img2:
+        images.append(('image2', img2))
+    images += [('facebook', 'img/facebook.png'), ('linkedin', 'img/linkedin.png'), ('instagram', 'img/instagram.png')]
+    return content['subject'], html, images
+
+def render_attachment_message():
+    """
+    HTML of the email carrying a filled-in registration form; it has no personal fields.
+    """
+    return environment.get_template('email/form-attachment.html').render()
@@ -0,0 +1,306 @@
+import base64
+import os
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.utils import getaddresses
+import botocore.exceptions
+from flask import current_app
+from app.services.lookup_orchestrator import LatencyHistogram
+from app.services.resilience import CircuitBreaker, DependencyError, DependencyTimeout
+
+class TransportsUnavailable(DependencyError):
+    """
+    Every transport on the route failed, or was skipped because its circuit is open; errors
+    are the ones the tried transports raised, in order.
+    """
+
+    def __init__(self, message, errors):
+        DependencyError.__init__(self, message)
+        self.errors = errors
+
+def recipients(message):
+    """
+    Envelope recipients of a complete MIME message: everyone in To, Cc and Bcc.
+    """
+    headers = BytesParser().parsebytes(message, headersonly=True)
+    return [address for _, address in getaddresses(headers.get_all('to', []) + headers.get_all('cc', []) + headers.get_all('bcc', [])) if address]
+
+def strip_bcc(message):
+    """
+    message without its Bcc header, for handing to a server that would deliver the header as
+    written and show every recipient the blind copies. The rest is left byte for byte.
+    """
+    end = len(message)
+    for separator in [b'\r\n\r\n', b'\n\n']:
+        found = message.find(separator)
+        if found != -1 and found + len(separator) // 2 < end:
+            # the headers end with the line ending of the last one
+            end = found + len(separator) // 2
+    lines = message[:end].splitlines(True)
+    kept = []
+    in_bcc = False
+    for line in lines:
+        # a line starting with whitespace continues the header before it
+        if not line[:1].isspace():
+            in_bcc = line.lower().startswith(b'bcc:')
+        if not in_bcc:
+            kept.append(line)
+    return b''.join(kept) + message[end:]
+
+def may_have_sent(err):
+    """
+    Whether a send that raised err may still have gone out, so sending it again, on the same
+    transport or another, could deliver it twice: it timed out waiting for the answer.
+    """
+    return isinstance(err, (DependencyTimeout, socket.timeout, botocore.exceptions.ReadTimeoutError))
+
+class Transport():
+    """
+    One way of sending a complete MIME message. send returns an id for the sent message;
+    sender is the envelope sender, or None for the transport's own.
+    """
+
+    name = None
+
+    def send(self, message, sender=None):
+        raise NotImplementedError
+
+    def is_failure(self, err):
+        # whether err says something about the transport's health, rather than about the message
+        return True
+
+    def may_have_sent(self, err):
+        # the message may still have gone out, so sending it another way could deliver it twice
+        return may_have_sent(err)
+
+class GmailTransport(Transport):
+    """
+    The Gmail API, as the authorized account, through the gmail dependency's timeout and breaker.
+    """
+
+    name = 'gmail'
+
+    def send(self, message, sender=None):
+        from app.services.email_service import is_gmail_failure
+        from app.services.gmail_client import get_gmail_client
+        from app.services.resilience import get_dependency
+        gmail = get_dependency('gmail', is_failure=is_gmail_failure)
+        raw = {'raw': base64.urlsafe_b64encode(message).decode('ascii')}
+        return gmail.call(get_gmail_client().send, raw, 'me')['id']
+
+    def is_failure(self, err):
+        from app.services.email_service import is_gmail_failure
+        return is_gmail_failure(err)
+
+class SMTPTransport(Transport):
+    """
+    The pooled SMTP connections, by default sending as the account they log in with.
+    """
+
+    name = 'smtp'
+
+    def __init__(self, sender=None):
+        self.sender = sender
+
+    def send(self, message, sender=None):
+        from app.services.smtp_pool import get_smtp_pool
+        # Bcc addresses go on the envelope only
+        get_smtp_pool().send(sender or self.sender, recipients(message), strip_bcc(message))
+        return BytesParser().parsebytes(message, headersonly=True).get('message-id')
+
+    def is_failure(self, err):
+        return not isinstance(err, smtplib.SMTPRecipientsRefused)
+
+    def may_have_sent(self, err):
+        # the pool marks a connection lost once the message was handed over
+        return may_have_sent(err) or getattr(err, 'after_data', False)
+
+class SESTransport(Transport):
+    """
+    SES send_raw_email on the process-wide client, by default from the EMAIL_FROM identity.
+    """
+
+    name = 'ses'
+    REJECTIONS = ['MessageRejected', 'InvalidParameterValue']
+
+    def __init__(self, sender=None):
+        self.sender = sender
+
+    def send(self, message, sender=None):
+        from app.services.ses_client import get_ses_client
+        response = get_ses_client().send_raw_email(RawMessage={'Data': message}, Source=sender or self.sender)
+        return response['MessageId']
+
+    def is_failure(self, err):
+        if isinstance(err, botocore.exceptions.ClientError):
+            return err.response.get('Error', {}).get('Code') not in self.REJECTIONS
+        return True
+
+class FileTransport(Transport):
+    """
+    Writes each message to an .eml file in directory instead of sending it, for local runs.
+    """
+
+    name = 'file'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, message, sender=None):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '%s-%s.eml' %(time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex))
+        # written under another name first, so anything watching the directory never sees half a message
+        with open(path + '.tmp', 'wb') as eml:
+            eml.write(message)
+        os.replace(path + '.tmp', path)
+        return path
+
+class TransportStats():
+    def __init__(self, decay, failure_threshold, reset_timeout):
+        self.decay = decay
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.histogram = LatencyHistogram()
+        self.lock = threading.Lock()
+        self.latency = None
+        self.error_rate = 0.0
+        self.counters = {'sent': 0, 'rejected': 0, 'failed': 0, 'skipped': 0, 'failovers': 0}
+
+    def record(self, seconds, counter):
+        failed = counter == 'failed'
+        self.histogram.observe(seconds)
+        with self.lock:
+            # moving averages, so the route follows how the transport has done lately
+            self.latency = seconds if self.latency is None else self.latency + self.decay * (seconds - self.latency)
+            self.error_rate += self.decay * ((1.0 if failed else 0.0) - self.error_rate)
+            self.counters[counter] += 1
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = dict(self.counters,
+                recent_ms=round(self.latency * 1000, 1) if self.latency is not None else None,
+                recent_error_rate=round(self.error_rate, 3))
+        snapshot.update(circuit=self.breaker.snapshot(), latency=self.histogram.snapshot())
+        return snapshot
+
+def parse_route(route):
+    """
+    (name, priority) pairs of a route such as 'gmail,smtp' or 'ses:1,smtp:1,file:2'; a
+    transport without a priority gets its position in the list.
+    """
+    pairs = []
+    for position, entry in enumerate(part.strip() for part in route.split(',')):
+        if not entry:
+            continue
+        name, _, priority = entry.partition(':')
+        pairs.append((name.strip(), int(priority) if priority else position))
+    return pairs
+
+class EmailRouter():
+    """
+    Sends each message on the first transport of its route that takes it, shared by every
+    mailer in the process.
+
+    Healthy transports are tried in priority order, those with the same priority fastest
+    first by recent latency. A transport whose recent error rate is over max_error_rate or
+    whose recent latency is over slow_after seconds is only tried after the healthy ones,
+    and one with an open circuit is skipped until its reset timeout lets a probe through.
+
+    A transport failing fails the message over to the next one. A message the transport
+    rejected is not failed over, since the others would reject it too, and neither is one
+    whose send timed out, since it may have gone out already.
+    """
+
+    def __init__(self, transports, decay=0.2, max_error_rate=0.5, slow_after=5.0, failure_threshold=5, reset_timeout=30):
+        self.transports = dict((transport.name, transport) for transport in transports)
+        self.max_error_rate = max_error_rate
+        self.slow_after = slow_after
+        self.stats_by_name = dict((name, TransportStats(decay, failure_threshold, reset_timeout)) for name in self.transports)
+
+    def order(self, route):
+        """
+        Names of the transports on route, a list of (name, priority), in the order they are tried.
+        """
+        for name, _ in route:
+            if name not in self.transports:
+                raise ValueError("unknown email transport %s" %(name))
+
+        def key(entry):
+            name, priority = entry
+            stats = self.stats_by_name[name]
+            with stats.lock:
+                latency = stats.latency or 0.0
+                degraded = stats.error_rate > self.max_error_rate or latency > self.slow_after
+            return degraded, priority, latency
+        return [name for name, _ in sorted(route, key=key)]
+
+    def send(self, message, sender=None, route=None):
+        """
+        Send message, the complete MIME message as bytes, and return (transport name, message id).
+        route defaults to every transport, in the order they were given.
+        """
+        if route is None:
+            route = [(name, position) for position, name in enumerate(self.transports)]
+        errors = []
+        for name in self.order(route):
+            transport = self.transports[name]
+            stats = self.stats_by_name[name]
+            if not stats.breaker.allow():
+                stats.count('skipped')
+                continue
+            started = time.perf_counter()
+            try:
+                message_id = transport.send(message, sender)
+            except Exception as err:
+                elapsed = time.perf_counter() - started
+                if not transport.is_failure(err):
+                    stats.record(elapsed, 'rejected')
+                    raise
+                stats.record(elapsed, 'failed')
+                if transport.may_have_sent(err):
+                    raise
+                current_app.logger.warning("email transport %s failed after %.3fs: %r" %(name, elapsed, err))
+                errors.append(err)
+                continue
+            stats.record(time.perf_counter() - started, 'sent')
+            if errors:
+                stats.count('failovers')
+            return name, message_id
+        raise TransportsUnavailable("no email transport of %s could send: %r" %([name for name, _ in route], errors), errors)
+
+    def stats(self):
+        return dict((name, stats.snapshot()) for name, stats in self.stats_by_name.items())
+
+_email_router = None
+_email_router_lock = threading.Lock()
+
+def get_email_router():
+    global _email_router
+    if _email_router is None:
+        with _email_router_lock:
+            if _email_router is None:
+                config = current_app.config
+                _email_router = EmailRouter([
+                        GmailTransport(),
+                        SMTPTransport(sender=config['SMTP_USERNAME']),
+                        SESTransport(sender=config['EMAIL_FROM']),
+                        FileTransport(config['EMAIL_FILE_DIR']),
+                    ],
+                    decay=float(config['EMAIL_ROUTE_DECAY']),
+                    max_error_rate=float(config['EMAIL_ROUTE_MAX_ERROR_RATE']),
+                    slow_after=float(config['EMAIL_ROUTE_SLOW_MS']) / 1000,
+                    failure_threshold=int(config['BREAKER_FAILURE_THRESHOLD']),
+                    reset_timeout=float(config['BREAKER_RESET_SECONDS']),
+                )
+    return _email_router
@@ -0,0 +1,27 @@
+import os
+import threading
+from flask import current_app
+
+_firestore = None
+_firestore_pid = None
+_firestore_lock = threading.Lock()
+
+def get_firestore():
+    """
+    Process-wide Firestore client, created on first use from the service account file in
+    FIREBASE_CREDENTIALS, so importing the app never reads credentials or opens a channel.
+
+    gRPC channels do not survive fork, so a worker forked after the client was created makes
+    its own, under its own firebase_admin app.
+    """
+    global _firestore, _firestore_pid
+    if _firestore is None or _firestore_pid != os.getpid():
+        with _firestore_lock:
+            if _firestore is None or _firestore_pid != os.getpid():
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+                cred = credentials.Certificate(current_app.config['FIREBASE_CREDENTIALS'])
+                app = firebase_admin.initialize_app(cred, name='firestore-%s' %(os.getpid()))
+                _firestore = firestore.client(app)
+                _firestore_pid = os.getpid()
+    return _firestore
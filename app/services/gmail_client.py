@@ -0,0 +1,163 @@
+import os
+import pickle
+import threading
+from datetime import datetime, timedelta
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.transport.requests import Request
+from flask import current_app
+
+SCOPES = ['https://www.googleapis.com/auth/gmail.send']
+
+def load_credentials(token_path):
+    """
+    Load the OAuth credentials stored in token_path, refreshing them or running the
+    authorization flow if they are not valid.
+    """
+    creds = None
+    # The file token.pickle stores the user's access and refresh tokens, and is
+    # created automatically when the authorization flow completes for the first
+    # time.
+    if os.path.exists(token_path):
+        with open(token_path, 'rb') as token:
+            creds = pickle.load(token)
+    # If there are no (valid) credentials available, let the user log in.
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_config(
+                {"web":
+                    {
+                        "client_id":os.getenv('CLIENT_ID'),
+                        "project_id":os.getenv('PROJECT_ID'),
+                        "auth_uri":"https://accounts.google.com/o/oauth2/auth",
+                        "token_uri":"https://oauth2.googleapis.com/token",
+                        "auth_provider_x509_cert_url":"https://www.googleapis.com/oauth2/v1/certs",
+                        "client_secret":os.getenv('CLIENT_SECRET')
+                    }
+                },
+                SCOPES)
+            creds = flow.run_local_server(port=5500)
+        # Save the credentials for the next run
+        with open(token_path, 'wb') as token:
+            pickle.dump(creds, token)
+    return creds
+
+class GmailClient():
+    """
+    Gmail API client shared by every request in the process.
+
+    Credentials are loaded and the API service is built once; the discovery document comes
+    from the copy bundled with googleapiclient. The access token is refreshed under a lock
+    once it is within refresh_margin seconds of expiring, so concurrent sends never race to
+    refresh it or go out with a token about to lapse.
+
+    httplib2 connections are not thread-safe, so each thread executes requests on its own
+    authorized connection.
+
+    api_endpoint replaces https://gmail.googleapis.com/ for both single and batch requests,
+    for pointing the client at a local stand-in.
+    """
+
+    def __init__(self, token_path='token.pickle', refresh_margin=300, api_endpoint=None):
+        self.token_path = token_path
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.creds = load_credentials(token_path)
+        client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+        self.service = build('gmail', 'v1', credentials=self.creds, cache_discovery=False, static_discovery=True,
+            client_options=client_options)
+        # the batch URI is taken from the discovery document and ignores api_endpoint
+        self.batch_uri = api_endpoint.rstrip('/') + '/batch/gmail/v1' if api_endpoint else None
+        self.refreshes = 0
+        self.sent = 0
+        self.batches = 0
+
+    def send(self, message, user_id='me'):
+        self.ensure_fresh()
+        request = self.service.users().messages().send(userId=user_id, body=message)
+        result = request.execute(http=self._http())
+        with self.lock:
+            self.sent += 1
+        return result
+
+    def send_batch(self, messages, user_id='me', callback=None):
+        """
+        Send messages in a single batch HTTP request and return (response, error) per message,
+        in order; error is the HttpError Gmail returned for that message, or None.
+
+        callback(index, response, error) is called for each message as the batch response is
+        read. Only a failure of the batch request as a whole is raised.
+        """
+        self.ensure_fresh()
+        results = [None] * len(messages)
+
+        def collect(request_id, response, error):
+            index = int(request_id)
+            results[index] = (response, error)
+            if callback is not None:
+                callback(index, response, error)
+
+        if self.batch_uri:
+            batch = BatchHttpRequest(callback=collect, batch_uri=self.batch_uri)
+        else:
+            batch = self.service.new_batch_http_request(callback=collect)
+        for index, message in enumerate(messages):
+            batch.add(self.service.users().messages().send(userId=user_id, body=message), request_id=str(index))
+        batch.execute(http=self._http())
+        with self.lock:
+            self.batches += 1
+            self.sent += len([error for _, error in results if error is None])
+        return results
+
+    def ensure_fresh(self):
+        if not self._expiring():
+            return
+        with self.lock:
+            if self._expiring():
+                self.creds.refresh(Request())
+                self.refreshes += 1
+                with open(self.token_path, 'wb') as token:
+                    pickle.dump(self.creds, token)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'token_expiry': self.creds.expiry.isoformat() if self.creds.expiry else None,
+                'refreshes': self.refreshes,
+                'sent': self.sent,
+                'batches': self.batches,
+            }
+
+    def _expiring(self):
+        # google-auth keeps expiry as a naive UTC datetime
+        return self.creds.expiry is not None and self.creds.expiry - datetime.utcnow() < self.refresh_margin
+
+    def _http(self):
+        http = getattr(self.local, 'http', None)
+        if http is None or self.local.pid != os.getpid():
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+            self.local.http = http
+            self.local.pid = os.getpid()
+        return http
+
+_gmail_client = None
+_gmail_client_lock = threading.Lock()
+
+def get_gmail_client():
+    global _gmail_client
+    if _gmail_client is None:
+        with _gmail_client_lock:
+            if _gmail_client is None:
+                config = current_app.config
+                _gmail_client = GmailClient(
+                    token_path=config['GMAIL_TOKEN_PATH'],
+                    refresh_margin=int(config['GMAIL_REFRESH_MARGIN_SECONDS']),
+                    api_endpoint=config['GMAIL_API_ENDPOINT'] or None,
+                )
+    return _gmail_client
@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app, has_app_context
+from app.services.resilience import DependencyError
+
+class LookupTimeout(DependencyError):
+    pass
+
+class LatencyHistogram():
+    """
+    Fixed-bucket latency histogram; percentiles are reported as the upper bound of the bucket
+    they fall in, which is plenty to tell a 200ms provider from a 5s one.
+    """
+
+    BUCKETS_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def percentile(self, p):
+        with self.lock:
+            target = p * self.total
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if count and seen >= target:
+                    return self.BUCKETS_MS[i] if i < len(self.BUCKETS_MS) else float('inf')
+        return 0
+
+    def snapshot(self):
+        with self.lock:
+            buckets = dict(('le_%s' %(bound), count) for bound, count in zip(self.BUCKETS_MS, self.counts))
+            buckets['le_inf'] = self.counts[-1]
+            total = self.total
+            avg = round(self.sum_ms / total, 1) if total else 0.0
+        return {'count': total, 'avg_ms': avg, 'p50_ms': self.percentile(0.5), 'p95_ms': self.percentile(0.95), 'buckets': buckets}
+
+class LookupOrchestrator():
+    """
+    Runs registration lookups against one or more providers at once and returns the first
+    authoritative (found) answer.
+
+    A provider that has not answered after hedge_after seconds gets a duplicate request, up to
+    max_hedges times, so one slow connection does not stall the whole lookup. "Not found"
+    answers are only returned once every provider has had its say. Attempts still waiting to
+    start when an answer arrives are cancelled; ones already in flight are abandoned and are
+    bounded by the provider's own timeout.
+    """
+
+    def __init__(self, hedge_after=2.0, max_hedges=1, timeout=10, max_workers=20):
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lookup')
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def lookup(self, providers, is_authoritative=bool):
+        """
+        providers is a list of (name, fn) pairs, fn taking no arguments. Returns (name, result);
+        raises the first provider error if every attempt failed, or LookupTimeout.
+        """
+        app = current_app._get_current_object() if has_app_context() else None
+        start = time.time()
+        deadline = start + self.timeout + self.hedge_after * self.max_hedges
+        fns = dict(providers)
+        attempts = dict((name, 0) for name in fns)
+        pending = {}
+        answered = set()
+        fallback = None
+        errors = []
+
+        for name in fns:
+            self._submit(app, name, fns[name], attempts, pending)
+        next_hedge = start + self.hedge_after
+        try:
+            while pending:
+                now = time.time()
+                if now >= deadline:
+                    break
+                hedging = any(attempts[name] <= self.max_hedges for name in fns if name not in answered)
+                until = min(next_hedge, deadline) if hedging else deadline
+                done, _ = wait(list(pending), timeout=max(0, until - now), return_when=FIRST_COMPLETED)
+
+                if not done:
+                    if hedging and time.time() >= next_hedge:
+                        for name in fns:
+                            if name not in answered and attempts[name] <= self.max_hedges:
+                                self._count(name, 'hedges')
+                                self._submit(app, name, fns[name], attempts, pending)
+                        next_hedge += self.hedge_after
+                    continue
+
+                for future in done:
+                    name, attempt = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as err:
+                        errors.append(err)
+                        continue
+                    if is_authoritative(result):
+                        self._count(name, 'wins')
+                        if attempt:
+                            self._count(name, 'hedge_wins')
+                        return name, result
+                    answered.add(name)
+                    if fallback is None:
+                        fallback = (name, result)
+                    # a duplicate of a request that already came back empty will not do better
+                    for other, (other_name, _) in list(pending.items()):
+                        if other_name == name:
+                            self._cancel(other_name, other)
+                            pending.pop(other)
+        finally:
+            for future, (name, _) in pending.items():
+                self._cancel(name, future)
+
+        if fallback is not None:
+            return fallback
+        if errors:
+            raise errors[0]
+        raise LookupTimeout("no lookup provider answered within %ss" %(round(time.time() - start, 2)))
+
+    def stats(self):
+        with self.lock:
+            names = list(self.histograms)
+            counters = dict((name, dict(self.counters[name])) for name in names)
+        return dict((name, dict(counters[name], latency=self.histograms[name].snapshot())) for name in names)
+
+    def _submit(self, app, name, fn, attempts, pending):
+        attempt = attempts[name]
+        attempts[name] += 1
+        self._count(name, 'attempts')
+        pending[self.executor.submit(self._run, app, name, fn)] = (name, attempt)
+
+    def _run(self, app, name, fn):
+        start = time.time()
+        try:
+            if app is None:
+                return fn()
+            with app.app_context():
+                return fn()
+        except Exception:
+            self._count(name, 'errors')
+            raise
+        finally:
+            self._histogram(name).observe(time.time() - start)
+
+    def _cancel(self, name, future):
+        # attempts already running cannot be interrupted, only ones still queued
+        if future.cancel():
+            self._count(name, 'cancelled')
+        else:
+            self._count(name, 'abandoned')
+
+    def _histogram(self, name):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            return self.histograms[name]
+
+    def _count(self, name, counter):
+        self._histogram(name)
+        with self.lock:
+            counters = self.counters.setdefault(name, {})
+            counters[counter] = counters.get(counter, 0) + 1
+
+_orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+def get_lookup_orchestrator():
+    global _orchestrator
+    if _orchestrator is None:
+        with _orchestrator_lock:
+            if _orchestrator is None:
+                config = current_app.config
+                _orchestrator = LookupOrchestrator(
+                    hedge_after=float(config['LOOKUP_HEDGE_MS']) / 1000,
+                    max_hedges=int(config['LOOKUP_MAX_HEDGES']),
+                    timeout=float(config['VOTER_VIEW_TIMEOUT']),
+                    max_workers=int(config['LOOKUP_WORKERS']),
+                )
+    return _orchestrator
@@ -0,0 +1,87 @@
+import hashlib
+import hmac
+import re
+import threading
+from flask import current_app
+from app.services.ttl_cache import TTLCache
+
+def normalize_identity(name_first, name_last, dob, zipcode, state):
+    """
+    Canonical form of the fields a registration lookup is keyed on; dob is expected as mm/dd/yyyy.
+    """
+    def name(value):
+        return re.sub(r"[\s'\"?.-]", '', (value or '').lower())
+    parts = (dob or '').split('/')
+    if len(parts) == 3:
+        dob = '{}-{:0>2}-{:0>2}'.format(parts[2], parts[0], parts[1])
+    return '|'.join([name(name_first), name(name_last), dob or '', (zipcode or '')[:5], (state or '').upper()])
+
+def registration_summary(result):
+    """
+    What the registration views use of a lookup result: whether the voter is registered and the
+    provider's status, or None when nothing was found. Provider records also carry addresses,
+    districts and voting history, none of which should sit in a cache.
+    """
+    if not result:
+        return None
+    if isinstance(result, dict) and 'status' in result:
+        return {'registered': result['status'] == 'active', 'status': result['status']}
+    # voter file and SOS records only come back for a registration
+    return {'registered': True, 'status': 'active'}
+
+class RegistrationCache():
+    """
+    Caches registration summaries under a salted hash of the voter's identity, so no names
+    or birth dates end up in cache keys, and only registration_summary's fields in values.
+
+    Active registrations are kept for ttl seconds; inactive, pending and "not found" answers
+    for the shorter not_found_ttl, since someone who just registered should show up soon.
+    """
+
+    MISSING = TTLCache.MISSING
+
+    def __init__(self, salt, ttl=900, not_found_ttl=120, max_size=4096, path=None):
+        self.salt = salt.encode('utf-8') if isinstance(salt, str) else salt
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self.cache = TTLCache(max_size=max_size, path=path, namespace='registration-v2')
+
+    def key(self, **identity):
+        return hmac.new(self.salt, normalize_identity(**identity).encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def get(self, **identity):
+        value = self.cache.get(self.key(**identity))
+        if value is self.MISSING:
+            return value
+        return value['result']
+
+    def set(self, summary, **identity):
+        """
+        Cache summary, as returned by registration_summary, for the voter with identity.
+        """
+        ttl = self.ttl if summary and summary['registered'] else self.not_found_ttl
+        self.cache.set(self.key(**identity), {'result': summary}, ttl)
+
+    def delete(self, **identity):
+        self.cache.delete(self.key(**identity))
+
+    def stats(self):
+        return self.cache.stats()
+
+_registration_cache = None
+_registration_cache_lock = threading.Lock()
+
+def get_registration_cache():
+    global _registration_cache
+    if _registration_cache is None:
+        with _registration_cache_lock:
+            if _registration_cache is None:
+                config = current_app.config
+                _registration_cache = RegistrationCache(
+                    salt=config['REGISTRATION_CACHE_SALT'] or config['SECRET_KEY'],
+                    ttl=int(config['REGISTRATION_CACHE_TTL']),
+                    not_found_ttl=int(config['REGISTRATION_CACHE_NOT_FOUND_TTL']),
+                    max_size=int(config['REGISTRATION_CACHE_SIZE']),
+                    path=config['REGISTRATION_CACHE_PATH'],
+                )
+    return _registration_cache
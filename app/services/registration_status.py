@@ -0,0 +1,104 @@
+import json
+from flask import current_app
+from app.services.batch_runner import get_batch_runner
+from app.services.usps_api import USPS_API
+from app.services.steps import Step_0
+
+def request_errors(data):
+    """
+    Missing and malformed fields of a registration status request, as two lists.
+    """
+    missing = []
+    other = []
+    if 'state' not in data:
+        missing.append('state')
+    elif not isinstance(data.get('state'), str) or len(data.get('state')) != 2:
+        other.append('state must be 2 letter abbreviation')
+    if 'city' not in data:
+        missing.append('city')
+    if 'street' not in data:
+        missing.append('street')
+    if 'name_first' not in data:
+        missing.append('name_first')
+    if 'name_last' not in data:
+        missing.append('name_last')
+    if 'dob' not in data:
+        missing.append('dob')
+    else:
+        dob = data.get('dob').split('/') if isinstance(data.get('dob'), str) else []
+        if len(dob) != 3 or len(dob[0]) not in range(1, 3) or len(dob[1]) not in range(1, 3) or len(dob[2]) != 4:
+            other.append('dob must be in the form mm/dd/yyyy')
+    if 'zip' not in data:
+        missing.append('zip')
+    elif not isinstance(data.get('zip'), str) or len(data.get('zip')) != 5:
+        other.append('zip must be 5 digits')
+    return missing, other
+
+def registration_status(data):
+    """
+    Response body and HTTP status code for one /registered request; shared with /registered/batch.
+    """
+    missing, other = request_errors(data)
+    if missing:
+        return {'error': 'Missing parameters: ' + ', '.join(missing)}, 400
+    # check if the address is valid (via USPS address verification)
+    usps_api = USPS_API({
+        'addr': data.get('street'),
+        'city': data.get('city'),
+        'state': data.get('state'),
+        'zip': data.get('zip'),
+    })
+    if not usps_api.validate_addresses():
+        other.append('(street, city, state, zip) do not form a valid address')
+    if other:
+        return {'error': ', '.join(other)}, 400
+
+    step = Step_0(data)
+    regFound = step.lookup_registration(
+        state=data.get('state'),
+        city=data.get('city'),
+        street=data.get('street'),
+        name_first=data.get('name_first'),
+        name_last=data.get('name_last'),
+        dob=data.get('dob'),
+        zipcode=data.get('zip'),
+        # callers pass refresh to skip the registration cache, e.g. right after registering
+        refresh=str(data.get('refresh', '')).lower() in ['true', '1', 'yes'],
+    )
+    if regFound and regFound['registered']:
+        return {'registered': True}, 200
+    elif regFound:
+        return {'registered': False, 'status': regFound['status']}, 200
+    return {'registered': False, 'status': 'not found'}, 200
+
+def batch_request_error(body, max_people):
+    """
+    The error message for a /registered/batch request body that cannot be run, or None.
+    """
+    people = body.get('people') if isinstance(body, dict) else None
+    if not isinstance(people, list) or not people:
+        return 'people must be a non-empty list'
+    if len(people) > max_people:
+        return 'at most %s people per batch' %(max_people)
+    return None
+
+def batch_status_lines(people, limit):
+    """
+    One NDJSON line per person, in completion order, with the body /registered would have
+    returned plus the person's index, the status code and any id they were sent with.
+    """
+    def check(person):
+        if not isinstance(person, dict):
+            return {'error': 'each person must be an object'}, 400
+        return registration_status(person)
+
+    for index, result, error in get_batch_runner().run(check, people, limit=limit):
+        if error is not None:
+            current_app.logger.error("batch registration lookup failed: %s" %(error))
+            body, code = {'error': 'registration lookup failed'}, 500
+        else:
+            body, code = result
+        line = dict(body, index=index, code=code)
+        if isinstance(people[index], dict) and 'id' in people[index]:
+            line['id'] = people[index]['id']
+        yield json.dumps(line) + '\n'
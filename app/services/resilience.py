@@ -0,0 +1,195 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+
+class DependencyError(RuntimeError):
+    """
+    Base class for calls refused or abandoned by the resilience layer.
+    """
+    pass
+
+class CircuitOpenError(DependencyError):
+    pass
+
+class BulkheadFullError(DependencyError):
+    pass
+
+class DependencyTimeout(DependencyError):
+    pass
+
+class CircuitBreaker():
+    """
+    Opens after failure_threshold consecutive failures and refuses calls for reset_timeout seconds,
+    then lets a single probe through (half-open); the probe's outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.probe_in_flight = False
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+            }
+
+class Dependency():
+    """
+    Guards calls to one remote provider with a timeout, a circuit breaker and a bulkhead
+    capping how many calls may be in flight at once.
+
+    Calls run on the dependency's own worker pool, so a caller stops waiting after timeout
+    seconds even if the provider never answers; the abandoned call keeps its bulkhead slot
+    until it really finishes, which is what stops a degraded provider from soaking up every
+    request thread.
+    """
+
+    def __init__(self, name, timeout=10, max_concurrent=10, failure_threshold=5, reset_timeout=30, is_failure=None):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=name)
+        self.is_failure = is_failure or (lambda err: True)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def call(self, fn, *args, **kwargs):
+        # take the bulkhead slot first so a refused call never holds the half-open probe
+        if not self.slots.acquire(blocking=False):
+            self._count('rejected')
+            raise BulkheadFullError("%s has %s calls in flight" %(self.name, self.max_concurrent))
+        if not self.breaker.allow():
+            self.slots.release()
+            self._count('rejected')
+            raise CircuitOpenError("%s circuit is open" %(self.name))
+
+        self._count('calls')
+        with self.lock:
+            self.in_flight += 1
+        future = self.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self._count('timeouts')
+            self.breaker.record_failure()
+            raise DependencyTimeout("%s did not answer within %ss" %(self.name, self.timeout))
+        except Exception as err:
+            if self.is_failure(err):
+                self._count('errors')
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def snapshot(self):
+        snapshot = self.breaker.snapshot()
+        with self.lock:
+            snapshot.update({
+                'timeout': self.timeout,
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self.in_flight,
+                'calls': self.calls,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+            })
+        return snapshot
+
+    def _release(self, _future):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+def retry(fn, attempts=3, backoff=0.5, should_retry=lambda err: True):
+    """
+    Call fn until it succeeds or attempts run out, sleeping backoff, 2*backoff, ... between tries.
+    Errors for which should_retry returns False are raised immediately.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as err:
+            if attempt == attempts - 1 or not should_retry(err):
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+def get_dependency(name, is_failure=None):
+    """
+    Process-wide Dependency for name, configured from <NAME>_TIMEOUT and <NAME>_MAX_CONCURRENT
+    plus the shared BREAKER_* settings on first use.
+    """
+    if name not in _dependencies:
+        with _dependencies_lock:
+            if name not in _dependencies:
+                config = current_app.config
+                prefix = name.upper()
+                _dependencies[name] = Dependency(
+                    name,
+                    timeout=float(config[prefix + '_TIMEOUT']),
+                    max_concurrent=int(config[prefix + '_MAX_CONCURRENT']),
+                    failure_threshold=int(config['BREAKER_FAILURE_THRESHOLD']),
+                    reset_timeout=float(config['BREAKER_RESET_SECONDS']),
+                    is_failure=is_failure,
+                )
+    return _dependencies[name]
+
+def dependency_snapshots():
+    with _dependencies_lock:
+        return dict((name, dep.snapshot()) for name, dep in _dependencies.items())
@@ -0,0 +1,206 @@
+import atexit
+import fcntl
+import os
+import threading
+import time
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from flask import current_app
+
+class LeaderLock():
+    """
+    Elects the one process on the host that runs leader-only jobs: whoever first takes an
+    exclusive flock on path keeps it for as long as it lives. The OS drops the lock when that
+    process exits, and the next worker to try takes over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+
+    def acquire(self):
+        with self.lock:
+            if self.file is not None and self.pid == os.getpid():
+                return True
+            lock_file = open(self.path, 'a+')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            self.file = lock_file
+            self.pid = os.getpid()
+            return True
+
+    def held(self):
+        with self.lock:
+            return self.file is not None and self.pid == os.getpid()
+
+class JobStats():
+    def __init__(self, leader_only):
+        self.leader_only = leader_only
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_error = None
+
+    def snapshot(self):
+        return {
+            'leader_only': self.leader_only,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'last_started': self.last_started,
+            'last_seconds': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'avg_seconds': round(self.total_duration / self.runs, 3) if self.runs else None,
+            'max_seconds': round(self.max_duration, 3),
+            'last_error': self.last_error,
+        }
+
+class Scheduler():
+    """
+    Runs periodic jobs on a background thread of every worker process.
+
+    Jobs that keep per-process state warm run in every worker; leader_only jobs, such as
+    the email sweeps, run only in the worker holding the leader lock. Every trigger gets up
+    to jitter seconds of random delay so the workers' jobs do not all fire at once, runs
+    of one job never overlap, and a run missed while the process was busy is run once late
+    rather than several times.
+    """
+
+    def __init__(self, app, leader, jitter=30):
+        self.app = app
+        self.leader = leader
+        self.jitter = jitter
+        self.scheduler = BackgroundScheduler(timezone='UTC',
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 300})
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.pid = None
+
+    def every(self, name, seconds, fn, leader_only=False):
+        self._add(name, IntervalTrigger(seconds=seconds, jitter=self.jitter), fn, leader_only)
+
+    def cron(self, name, crontab, fn, leader_only=True):
+        # crontab is the usual five fields: minute hour day month day-of-week, in UTC
+        minute, hour, day, month, day_of_week = crontab.split()
+        trigger = CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week,
+            timezone='UTC', jitter=self.jitter)
+        self._add(name, trigger, fn, leader_only)
+
+    def start(self):
+        """
+        Start the scheduler thread in this process; a no-op if it is already running here.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.scheduler.start()
+        atexit.register(self.shutdown)
+        self.app.logger.info("scheduler started in %s with jobs %s" %(self.pid, sorted(self.jobs)))
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def run(self, name, fn):
+        stats = self.jobs[name]
+        if stats.leader_only and not self.leader.acquire():
+            with self.lock:
+                stats.skipped += 1
+            return
+        started = time.time()
+        error = None
+        with self.app.app_context():
+            try:
+                fn()
+            except Exception as err:
+                error = repr(err)
+                self.app.logger.exception("scheduled job %s failed" %(name))
+        duration = time.time() - started
+        with self.lock:
+            stats.runs += 1
+            stats.last_started = started
+            stats.last_duration = duration
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            if error:
+                stats.failures += 1
+                stats.last_error = error
+        self.app.logger.info("scheduled job %s took %.3fs" %(name, duration))
+
+    def stats(self):
+        with self.lock:
+            jobs = dict((name, stats.snapshot()) for name, stats in self.jobs.items())
+        running = self.scheduler.running and self.pid == os.getpid()
+        if running:
+            for job in self.scheduler.get_jobs():
+                jobs[job.id]['next_run'] = job.next_run_time.isoformat() if job.next_run_time else None
+        return {
+            'running': running,
+            'leader': self.leader.held(),
+            'jobs': jobs,
+        }
+
+    def _add(self, name, trigger, fn, leader_only):
+        with self.lock:
+            self.jobs[name] = JobStats(leader_only)
+        self.scheduler.add_job(self.run, trigger, args=[name, fn], id=name, name=name, replace_existing=True)
+
+def sweep_challenges():
+    from app.services.challenge_sweep import last_ended_day, sweep_incomplete_challenges
+    from app.services.firestore_client import get_firestore
+    # the day whose challenges have all ended, so nobody is told theirs ended while it still runs
+    result = sweep_incomplete_challenges(get_firestore().collection('users'), today=last_ended_day())
+    current_app.logger.info("scheduled challengeIncomplete sweep: %s, %s failed, %s skipped"
+        %(result['status'], result['failed'], result['skipped']))
+
+def warm_caches():
+    from app.services.email_assets import get_image_cache
+    from app.services.zip_index import get_zip_index
+    from app.services.voter_index import get_voter_index
+    # re-encodes any email image changed on disk, and loads the indexes if nothing has yet
+    pattern = current_app.config['EMAIL_IMAGE_PRELOAD']
+    if pattern:
+        get_image_cache().preload(pattern)
+    get_zip_index()
+    get_voter_index()
+
+def refresh_templates():
+    from app.services.email_templates import EMAIL_TYPES, refresh_skeletons, skeleton
+    refresh_skeletons()
+    for type in EMAIL_TYPES:
+        skeleton(type)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    Process-wide Scheduler with the app's jobs registered; it only runs once started.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = current_app.config
+                scheduler = Scheduler(current_app._get_current_object(), LeaderLock(config['SCHEDULER_LOCK_PATH']),
+                    jitter=int(config['SCHEDULER_JITTER_SECONDS']))
+                if config['CHALLENGE_SWEEP_CRON']:
+                    scheduler.cron('challengeIncomplete', config['CHALLENGE_SWEEP_CRON'], sweep_challenges)
+                scheduler.every('warmCaches', int(config['CACHE_WARMUP_SECONDS']), warm_caches)
+                scheduler.every('refreshTemplates', int(config['TEMPLATE_REFRESH_SECONDS']), refresh_templates)
+                _scheduler = scheduler
+    return _scheduler
@@ -0,0 +1,40 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+from flask import current_app
+
+_ses_client = None
+_ses_client_pid = None
+_ses_client_lock = threading.Lock()
+
+def get_ses_client():
+    """
+    Process-wide SES client, built on first use, so a send no longer pays for loading the
+    service model, resolving the endpoint and a new TLS handshake.
+
+    boto3 clients are thread-safe and keep a pool of up to SES_MAX_POOL_CONNECTIONS
+    connections, reused across sends. Throttling and transient errors are retried up to
+    SES_MAX_ATTEMPTS attempts in all. A process forked after the client was built makes its
+    own, since pooled sockets cannot be shared with the parent.
+    """
+    global _ses_client, _ses_client_pid
+    if _ses_client is None or _ses_client_pid != os.getpid():
+        with _ses_client_lock:
+            if _ses_client is None or _ses_client_pid != os.getpid():
+                config = current_app.config
+                # sessions are not thread-safe, so the client gets one of its own
+                _ses_client = boto3.session.Session().client('ses',
+                    region_name=config['AWS_DEFAULT_REGION'],
+                    aws_access_key_id=config['SES_ACCESS_KEY_ID'],
+                    aws_secret_access_key=config['SES_SECRET_ACCESS_KEY'],
+                    endpoint_url=config['SES_ENDPOINT_URL'] or None,
+                    config=Config(
+                        max_pool_connections=int(config['SES_MAX_POOL_CONNECTIONS']),
+                        connect_timeout=float(config['SES_CONNECT_TIMEOUT']),
+                        read_timeout=float(config['SES_READ_TIMEOUT']),
+                        retries={'max_attempts': int(config['SES_MAX_ATTEMPTS']), 'mode': 'standard'},
+                    ),
+                )
+                _ses_client_pid = os.getpid()
+    return _ses_client
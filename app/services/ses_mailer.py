@@ -1,10 +1,12 @@
-import boto3
 import botocore
 import newrelic.agent
+import smtplib
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from flask import current_app
+from googleapiclient.errors import HttpError
+from app.services.email_transports import get_email_router, parse_route
 import os
 
 # used for emailing to states
@@ -61,18 +63,11 @@ class SESMailer():
             if msg['To'] == current_app.config['FAIL_EMAIL']:
                 raise RuntimeError('Failure testing works')
 
-            ses = boto3.client('ses',
-                region_name=current_app.config['AWS_DEFAULT_REGION'],
-                aws_access_key_id=current_app.config['SES_ACCESS_KEY_ID'],
-                aws_secret_access_key=current_app.config['SES_SECRET_ACCESS_KEY']
-            )
-            resp = ses.send_raw_email(
-                RawMessage={'Data': msg.as_string()},
-                Source=sender,
-            )
-            return resp
+            # sent by the shared email router, failing over along MAILER_ROUTE
+            transport, message_id = get_email_router().send(msg.as_bytes(), sender, parse_route(current_app.config['MAILER_ROUTE']))
+            return {'MessageId': message_id, 'transport': transport}
 
-        except botocore.exceptions.ClientError as err:
+        except (botocore.exceptions.ClientError, smtplib.SMTPException, HttpError) as err:
             current_app.logger.error(str(err))
             newrelic.agent.record_exception()
             return {'msg': msg, 'MessageId': False, 'error': err}
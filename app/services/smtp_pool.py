@@ -0,0 +1,190 @@
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from flask import current_app
+
+class TrackedSMTP():
+    """
+    Notes when the DATA command goes out: a send that fails after that may still have been delivered.
+    """
+
+    data_sent = False
+
+    def data(self, msg):
+        self.data_sent = True
+        return super().data(msg)
+
+class PoolSMTP(TrackedSMTP, smtplib.SMTP):
+    pass
+
+class PoolSMTP_SSL(TrackedSMTP, smtplib.SMTP_SSL):
+    pass
+
+class PooledConnection():
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.time()
+
+class SMTPPool():
+    """
+    A small pool of logged-in SMTP connections that are kept open between sends.
+
+    A connection idle for more than noop_after seconds is checked with NOOP before it is
+    reused and replaced if the server has dropped it. A connection is retired after
+    max_messages sends, and any connection that errors is thrown away. A send that fails
+    because the connection went away before the message was handed over is retried once on
+    a fresh one; one that timed out or failed after DATA may have been delivered, and is not.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=True, size=2, max_messages=100, noop_after=30, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.size = size
+        self.max_messages = max_messages
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.sent = 0
+
+    def send(self, from_addr, to_addrs, msg):
+        """
+        sendmail on a pooled connection; msg is the complete message as str or bytes.
+        """
+        for attempt in range(2):
+            conn = self._acquire()
+            conn.smtp.data_sent = False
+            try:
+                result = conn.smtp.sendmail(from_addr, to_addrs, msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as err:
+                self._release(conn, broken=True)
+                # smtplib reports a read that timed out as a lost connection
+                if isinstance(err.__context__, socket.timeout):
+                    raise err.__context__
+                if isinstance(err, socket.timeout):
+                    raise
+                err.after_data = conn.smtp.data_sent
+                if attempt or err.after_data:
+                    raise
+                current_app.logger.warning("SMTP connection to %s lost, retrying on a new one: %s" %(self.host, err))
+                continue
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                # the server refused this message, smtplib has already reset the session
+                self._release(conn)
+                raise
+            except Exception:
+                self._release(conn, broken=True)
+                raise
+            conn.sent += 1
+            with self.lock:
+                self.sent += 1
+            self._release(conn)
+            return result
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            self._quit(conn)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'sent': self.sent,
+            }
+
+    def _acquire(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise smtplib.SMTPConnectError(421, "no SMTP connection free within %ss" %(self.timeout))
+        try:
+            while True:
+                with self.lock:
+                    conn = self.idle.pop() if self.idle else None
+                if conn is None:
+                    return self._connect()
+                if time.time() - conn.last_used < self.noop_after or self._healthy(conn):
+                    with self.lock:
+                        self.reused += 1
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _release(self, conn, broken=False):
+        conn.last_used = time.time()
+        if broken or conn.sent >= self.max_messages:
+            self._discard(conn)
+        else:
+            with self.lock:
+                self.idle.append(conn)
+        self.slots.release()
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = PoolSMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = PoolSMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        with self.lock:
+            self.created += 1
+        return PooledConnection(smtp)
+
+    def _healthy(self, conn):
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _discard(self, conn):
+        with self.lock:
+            self.discarded += 1
+        self._quit(conn)
+
+    def _quit(self, conn):
+        try:
+            conn.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.smtp.close()
+
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+def get_smtp_pool():
+    global _smtp_pool
+    if _smtp_pool is None:
+        with _smtp_pool_lock:
+            if _smtp_pool is None:
+                config = current_app.config
+                _smtp_pool = SMTPPool(
+                    host=config['SMTP_HOST'],
+                    port=int(config['SMTP_PORT']),
+                    username=config['SMTP_USERNAME'],
+                    password=config['SMTP_PASSWORD'],
+                    use_ssl=str(config['SMTP_SSL']).lower() in ['true', '1', 'yes'],
+                    size=int(config['SMTP_POOL_SIZE']),
+                    max_messages=int(config['SMTP_MAX_MESSAGES']),
+                    noop_after=float(config['SMTP_NOOP_AFTER_SECONDS']),
+                    timeout=float(config['SMTP_TIMEOUT']),
+                )
+    return _smtp_pool
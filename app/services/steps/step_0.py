@@ -1,16 +1,24 @@
 from app.services.steps import Step
+from app.services.resilience import get_dependency, DependencyError
+from app.services.voter_view_clients import get_voter_view_clients
+from app.services.registration_cache import get_registration_cache, registration_summary
+from app.services.voter_index import get_voter_index
+from app.services.lookup_orchestrator import get_lookup_orchestrator
 from flask import current_app
 import os
 import sys
-import myvoteinfo
 import requests
 
+AR_LOOKUP_URL = 'https://www.voterview.ar-nova.org/voterview'
+ROCKTHEVOTE_LOOKUP_URL = 'https://register.rockthevote.com/lookup'
+
 class Step_0(Step):
     form_requirements = ['state', 'city', 'street', 'name_first', 'name_last', 'dob', 'email']
     step_requirements = ['reg_lookup_complete']
     reg_lookup_complete = False
     reg_found = False
     voter_view_fail = False
+    lookup_failed = False
     endpoint = '/'
     prev_step = None
     next_step = None
@@ -43,41 +51,95 @@ class Step_0(Step):
         self.next_step = 'Step_1'
         return True
 
-    def lookup_registration(self, state, city, street, name_first, name_last, dob, zipcode):
+    def lookup_client(self, state):
+        """
+        MyVoteInfo client for the provider that covers state, on a pooled keep-alive connection.
+        """
+        clients = get_voter_view_clients()
+        if state.upper() == 'AR':
+            return clients.client(state='ar', url=AR_LOOKUP_URL)
+        elif state.upper() != 'KS':
+            return clients.client(state='rockthevote', url=ROCKTHEVOTE_LOOKUP_URL)
+        return clients.client(url=os.getenv('VOTER_VIEW_URL'))
+
+    def lookup_url(self, state):
+        if state.upper() == 'AR':
+            return AR_LOOKUP_URL
+        elif state.upper() != 'KS':
+            return ROCKTHEVOTE_LOOKUP_URL
+        return os.getenv('VOTER_VIEW_URL')
+
+    def lookup_registration(self, state, city, street, name_first, name_last, dob, zipcode, refresh=False):
+        """
+        Look up a registration, answering from the registration cache unless refresh is set, then
+        from the local Kansas voter file index, and only then from VoterView.
+        Returns the registration_summary of the result; failed lookups are never cached.
+        """
+        cache = get_registration_cache()
+        identity = dict(name_first=name_first, name_last=name_last, dob=dob, zipcode=zipcode, state=state)
+        if not refresh:
+            cached = cache.get(**identity)
+            if cached is not cache.MISSING:
+                return cached
+
+        result = None
+        voter_index = get_voter_index()
+        if voter_index and state.upper() == 'KS':
+            result = voter_index.lookup(name_first, name_last, dob, zipcode)
+        if not result:
+            result = self.lookup_voter_view(state, city, street, name_first, name_last, dob, zipcode)
+        summary = registration_summary(result)
+        if not self.lookup_failed:
+            cache.set(summary, **identity)
+        return summary
+
+    def lookup_voter_view(self, state, city, street, name_first, name_last, dob, zipcode):
+        """
+        KS and AR have a single authoritative provider; other states go through the lookup
+        orchestrator, which hedges slow requests.
+        """
+        self.lookup_failed = False
+        lookup = dict(state=state, city=city, street=street, name_first=name_first, name_last=name_last, dob=dob, zipcode=zipcode)
         try:
-            kmvi = myvoteinfo.MyVoteInfo()
-            if os.getenv('VOTER_VIEW_URL'):
-                kmvi = myvoteinfo.MyVoteInfo(url=os.getenv('VOTER_VIEW_URL'))
-            zpcd = int(zipcode)
-            if state.upper() == 'AR':
-                kmvi = myvoteinfo.MyVoteInfo(state='ar', url='https://www.voterview.ar-nova.org/voterview')
-            elif state.upper() != 'KS':
-                kmvi = myvoteinfo.MyVoteInfo(state='rockthevote', url='https://register.rockthevote.com/lookup')
-            dob = dob.split('/')
-            formatted_dob = "{year}-{month}-{day}".format(year=dob[2], month=dob[0], day=dob[1])
-            request = kmvi.lookup(
-                first_name = name_first,
-                last_name = name_last,
-                dob = formatted_dob,
-                zipcode = zipcode,
-                state = state.upper(),
-                gender = 'decline',
-                street = street,
-                city = city,
-                email = 'person@email.com'
-            )
-            if request and (state.upper() == 'AR' or state.upper() == 'KS'):
-                sosrecs = request.parsed()
-                return sosrecs
-            elif request and 'status' in request[0]:
-                return request[0]
-        except requests.exceptions.ConnectionError as err:
-            self.voter_view_fail = kmvi.url
+            if state.upper() == 'AR' or state.upper() == 'KS':
+                return self.query_provider(**lookup)
+            provider, result = get_lookup_orchestrator().lookup([
+                ('rockthevote', lambda: self.query_provider(**lookup)),
+            ])
+            return result
+        except (requests.exceptions.ConnectionError, DependencyError) as err:
+            self.voter_view_fail = self.lookup_url(state)
+            self.lookup_failed = True
             current_app.logger.warn("voter view connection failure: %s" %(err))
             return False
         except:
+            self.lookup_failed = True
             err = sys.exc_info()[0]
             current_app.logger.warn("voter view failure: %s" %(err))
             return False
 
+    def query_provider(self, state, city, street, name_first, name_last, dob, zipcode):
+        """
+        One lookup against the provider for state, on a fresh client. Errors are raised.
+        """
+        kmvi = self.lookup_client(state)
+        zpcd = int(zipcode)
+        dob = dob.split('/')
+        formatted_dob = "{year}-{month}-{day}".format(year=dob[2], month=dob[0], day=dob[1])
+        request = get_dependency('voter_view').call(kmvi.lookup,
+            first_name = name_first,
+            last_name = name_last,
+            dob = formatted_dob,
+            zipcode = zipcode,
+            state = state.upper(),
+            gender = 'decline',
+            street = street,
+            city = city,
+            email = 'person@email.com'
+        )
+        if request and (state.upper() == 'AR' or state.upper() == 'KS'):
+            sosrecs = request.parsed()
+            return sosrecs
+        elif request and 'status' in request[0]:
+            return request[0]
         return False
@@ -1,11 +1,13 @@
 from app.services.steps import Step
 from app.services.usps_api import USPS_API
+from app.services.zip_index import get_zip_index
 
 class Step_VR_3(Step):
     form_requirements = ['addr', 'city', 'state', 'zip']
     step_requirements = ['addr_lookup_complete']
     address_order = ['current_address']
     addr_lookup_complete = False
+    county = None
     endpoint = '/vr/address'
     prev_step = 'Step_VR_2'
     next_step = None
@@ -23,8 +25,13 @@ class Step_VR_3(Step):
         if not self.verify_form_requirements():
             return False
 
+        # derive the county locally, without waiting on USPS
+        self.county = get_zip_index().county(self.form_payload.get('zip'))
         usps_api = USPS_API(self.form_payload)
         self.validated_addresses = usps_api.validate_addresses()
+        current = self.validated_addresses and self.validated_addresses.get('current_address')
+        if self.county and current and 'error' not in current:
+            current.setdefault('county', self.county)
         self.next_step = 'Step_VR_4'
         self.addr_lookup_complete = True
         self.is_complete = True # always complete, regardless of USPS response. Invalid != incomplete
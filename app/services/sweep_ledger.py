@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from flask import current_app
+
+class SweepLedger():
+    """
+    Records, in a sqlite file shared by every worker process on the host, which users were
+    sent which email on which day, and how far each sweep got.
+
+    A recipient is claimed before it is sent to, so two overlapping runs of a sweep never
+    both send to it. A claim is turned into a sent entry when the send succeeds and dropped
+    when it fails; a claim left behind by a process that died mid-send can be taken over
+    once it is claim_ttl seconds old. A send that timed out may have been delivered, so its
+    claim is kept as unknown and never taken over.
+    """
+
+    def __init__(self, path, claim_ttl=3600, keep_days=14):
+        self.path = path
+        self.claim_ttl = claim_ttl
+        self.keep_days = keep_days
+        self.local = threading.local()
+        with self._transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS sent (type TEXT, day TEXT, user TEXT, status TEXT, updated REAL, PRIMARY KEY (type, day, user))')
+            conn.execute('CREATE TABLE IF NOT EXISTS checkpoints (sweep TEXT, day TEXT, cursor TEXT, done INTEGER, updated REAL, PRIMARY KEY (sweep, day))')
+
+    def claim(self, type, day, users):
+        """
+        Claim users for type on day and return the ones claimed, in order; users already sent
+        to, or claimed by a run still in progress, are left out.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            taken = {}
+            for start in range(0, len(users), 500):
+                chunk = users[start:start + 500]
+                rows = conn.execute('SELECT user, status, updated FROM sent WHERE type = ? AND day = ? AND user IN (%s)' %(','.join('?' * len(chunk))),
+                    [type, str(day)] + list(chunk)).fetchall()
+                taken.update((user, (status, updated)) for user, status, updated in rows)
+            claimed = [user for user in users if user not in taken or (taken[user][0] == 'sending' and now - taken[user][1] > self.claim_ttl)]
+            conn.executemany('INSERT OR REPLACE INTO sent (type, day, user, status, updated) VALUES (?, ?, ?, ?, ?)',
+                [(type, str(day), user, 'sending', now) for user in claimed])
+        return claimed
+
+    def finish(self, type, day, sent, failed, unknown=()):
+        """
+        Record the users sent to and release the claims of the users whose send failed, so
+        the next run tries them again. The users in unknown stay claimed: their send may have
+        gone out, and sending again could email them twice.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany('UPDATE sent SET status = ?, updated = ? WHERE type = ? AND day = ? AND user = ?',
+                [('sent', now, type, str(day), user) for user in sent] + [('unknown', now, type, str(day), user) for user in unknown])
+            conn.executemany('DELETE FROM sent WHERE type = ? AND day = ? AND user = ?',
+                [(type, str(day), user) for user in failed])
+
+    def checkpoint(self, sweep, day):
+        """
+        (cursor, done) of the last run of sweep on day, or None if it has not run.
+        """
+        row = self._connection().execute('SELECT cursor, done FROM checkpoints WHERE sweep = ? AND day = ?', (sweep, str(day))).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), bool(row[1])
+
+    def save_checkpoint(self, sweep, day, cursor, done=False):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO checkpoints (sweep, day, cursor, done, updated) VALUES (?, ?, ?, ?, ?)',
+                (sweep, str(day), json.dumps(cursor), int(done), time.time()))
+
+    def prune(self, today=None):
+        cutoff = str((today or date.today()) - timedelta(days=self.keep_days))
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM sent WHERE day < ?', (cutoff,))
+            conn.execute('DELETE FROM checkpoints WHERE day < ?', (cutoff,))
+
+    def stats(self):
+        conn = self._connection()
+        rows = conn.execute('SELECT type, day, status, COUNT(*) FROM sent GROUP BY type, day, status ORDER BY day DESC LIMIT 20').fetchall()
+        checkpoints = conn.execute('SELECT sweep, day, cursor, done, updated FROM checkpoints ORDER BY day DESC LIMIT 5').fetchall()
+        return {
+            'ledger': [{'type': type, 'day': day, 'status': status, 'users': count} for type, day, status, count in rows],
+            'checkpoints': [{'sweep': sweep, 'day': day, 'cursor': json.loads(cursor), 'done': bool(done), 'updated': updated}
+                for sweep, day, cursor, done, updated in checkpoints],
+        }
+
+    @contextmanager
+    def _transaction(self):
+        # an immediate transaction takes the write lock up front, so claims from two processes never interleave
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _connection(self):
+        # sqlite connections may not cross threads or forks, so keep one per thread per process
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+_sweep_ledger = None
+_sweep_ledger_lock = threading.Lock()
+
+def get_sweep_ledger():
+    global _sweep_ledger
+    if _sweep_ledger is None:
+        with _sweep_ledger_lock:
+            if _sweep_ledger is None:
+                config = current_app.config
+                _sweep_ledger = SweepLedger(
+                    path=config['SWEEP_LEDGER_PATH'],
+                    claim_ttl=int(config['SWEEP_CLAIM_TTL_SECONDS']),
+                    keep_days=int(config['SWEEP_LEDGER_DAYS']),
+                )
+    return _sweep_ledger
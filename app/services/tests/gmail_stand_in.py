@@ -0,0 +1,95 @@
+import base64
+import json
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class GmailStandIn(ThreadingHTTPServer):
+  """
+  Minimal local Gmail API for tests and benchmarks: answers messages.send, one at a time or in
+  batch requests, keeps the recipient of every message it accepts, and adds request_delay to
+  every HTTP request (standing in for the round trip) and message_delay to every message.
+
+  failures maps a recipient to the HTTP statuses returned for its next sends, one per attempt.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, request_delay=0, message_delay=0, failures=None):
+    ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), GmailHandler)
+    self.request_delay = request_delay
+    self.message_delay = message_delay
+    self.failures = dict((to, list(statuses)) for to, statuses in (failures or {}).items())
+    self.sent = []
+    self.requests = 0
+    self.lock = threading.Lock()
+
+  @property
+  def endpoint(self):
+    return 'http://127.0.0.1:%s/' %(self.server_address[1])
+
+  def start(self):
+    threading.Thread(target=self.serve_forever, daemon=True).start()
+    return self
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
+
+  def send_message(self, body):
+    time.sleep(self.message_delay)
+    raw = json.loads(body.decode('utf-8'))['raw']
+    to = BytesParser().parsebytes(base64.urlsafe_b64decode(raw), headersonly=True)['to']
+    with self.lock:
+      statuses = self.failures.get(to)
+      status = statuses.pop(0) if statuses else 200
+      if status == 200:
+        self.sent.append(to)
+        return 200, {'id': uuid.uuid4().hex, 'labelIds': ['SENT']}
+    return status, {'error': {'code': status, 'message': 'stand-in refused %s' %(to)}}
+
+class GmailHandler(BaseHTTPRequestHandler):
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_POST(self):
+    server = self.server
+    with server.lock:
+      server.requests += 1
+    body = self.rfile.read(int(self.headers['Content-Length']))
+    time.sleep(server.request_delay)
+    if self.path.startswith('/batch/'):
+      self.batch(body)
+    else:
+      status, result = server.send_message(body)
+      self.respond(status, 'application/json', json.dumps(result).encode('utf-8'))
+
+  def batch(self, body):
+    # split by hand; the email parser is far slower than Gmail on multi-megabyte batches
+    delimiter = b'--' + self.headers['Content-Type'].split('boundary=')[1].strip('"').encode('ascii')
+    boundary = 'batch_' + uuid.uuid4().hex
+    out = []
+    for part in body.split(delimiter)[1:-1]:
+      headers, inner = re.split(b'\r?\n\r?\n', part.lstrip(), 1)
+      content_id = re.search(rb'Content-ID: <([^>]*)>', headers).group(1).decode('ascii')
+      status, result = self.server.send_message(re.split(b'\r?\n\r?\n', inner, 1)[1].strip())
+      payload = json.dumps(result)
+      out.append('--%s\r\nContent-Type: application/http\r\nContent-ID: <response-%s>\r\n\r\n'
+        'HTTP/1.1 %s %s\r\nContent-Type: application/json\r\nContent-Length: %s\r\n\r\n%s\r\n'
+        %(boundary, content_id, status, self.responses[status][0], len(payload), payload))
+    out.append('--%s--\r\n' %(boundary))
+    self.respond(200, 'multipart/mixed; boundary=' + boundary, ''.join(out).encode('utf-8'))
+
+  def respond(self, status, content_type, body):
+    self.send_response(status)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
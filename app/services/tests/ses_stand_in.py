@@ -0,0 +1,100 @@
+import base64
+import ssl
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+class SESStandIn(ThreadingHTTPServer):
+  """
+  Minimal local SES for tests and benchmarks: answers SendRawEmail, keeps the recipient of
+  every message it accepts and counts the connections opened to it. Every request waits
+  request_delay, standing in for the round trip; with certfile, the stand-in speaks TLS, so
+  a client opening a connection per send pays for the handshake as it would against AWS.
+
+  failures maps a recipient to the SES error codes returned for its next sends, one per attempt.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, request_delay=0, failures=None, certfile=None):
+    ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), SESHandler)
+    self.request_delay = request_delay
+    self.failures = dict((to, list(codes)) for to, codes in (failures or {}).items())
+    self.scheme = 'http'
+    if certfile:
+      context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+      context.load_cert_chain(certfile)
+      self.socket = context.wrap_socket(self.socket, server_side=True)
+      self.scheme = 'https'
+    self.sent = []
+    self.requests = 0
+    self.connections = 0
+    self.lock = threading.Lock()
+
+  @property
+  def endpoint(self):
+    return '%s://127.0.0.1:%s' %(self.scheme, self.server_address[1])
+
+  def start(self):
+    threading.Thread(target=self.serve_forever, daemon=True).start()
+    return self
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
+
+  def send_raw_email(self, data):
+    to = BytesParser().parsebytes(base64.b64decode(data), headersonly=True)['To']
+    with self.lock:
+      codes = self.failures.get(to)
+      code = codes.pop(0) if codes else None
+      if code is None:
+        self.sent.append(to)
+    return code
+
+class SESHandler(BaseHTTPRequestHandler):
+
+  protocol_version = 'HTTP/1.1'
+  # headers and body go out in separate writes; without this, a kept-alive connection waits on delayed acks
+  disable_nagle_algorithm = True
+
+  def setup(self):
+    BaseHTTPRequestHandler.setup(self)
+    with self.server.lock:
+      self.server.connections += 1
+
+  def do_POST(self):
+    server = self.server
+    with server.lock:
+      server.requests += 1
+    form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+    time.sleep(server.request_delay)
+    request_id = uuid.uuid4()
+    if form['Action'][0] != 'SendRawEmail':
+      return self.error(400, 'InvalidAction', request_id)
+    code = server.send_raw_email(form['RawMessage.Data'][0])
+    if code is not None:
+      return self.error(400, code, request_id)
+    self.respond(200, '<SendRawEmailResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">'
+      '<SendRawEmailResult><MessageId>%s</MessageId></SendRawEmailResult>'
+      '<ResponseMetadata><RequestId>%s</RequestId></ResponseMetadata></SendRawEmailResponse>' %(uuid.uuid4().hex, request_id))
+
+  def error(self, status, code, request_id):
+    self.respond(status, '<ErrorResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/">'
+      '<Error><Type>Sender</Type><Code>%s</Code><Message>stand-in refused the message</Message></Error>'
+      '<RequestId>%s</RequestId></ErrorResponse>' %(code, request_id))
+
+  def respond(self, status, body):
+    body = body.encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'text/xml')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
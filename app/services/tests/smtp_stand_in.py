@@ -0,0 +1,82 @@
+import socketserver
+import threading
+import time
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+  """
+  Minimal local SMTP server for tests and benchmarks: accepts any login, keeps every message it
+  receives, and can add latency to the greeting (standing in for TLS and login) and to each message.
+  """
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, connect_delay=0, message_delay=0):
+    socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0), SMTPHandler)
+    self.connect_delay = connect_delay
+    self.message_delay = message_delay
+    self.messages = []
+    self.connections = 0
+    self.lock = threading.Lock()
+
+  @property
+  def port(self):
+    return self.server_address[1]
+
+  def start(self):
+    threading.Thread(target=self.serve_forever, daemon=True).start()
+    return self
+
+  def stop(self):
+    self.shutdown()
+    self.server_close()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+  def reply(self, line):
+    self.wfile.write((line + '\r\n').encode('ascii'))
+
+  def handle(self):
+    server = self.server
+    with server.lock:
+      server.connections += 1
+    time.sleep(server.connect_delay)
+    self.reply('220 stand-in ESMTP')
+    sender, recipients = None, []
+    while True:
+      line = self.rfile.readline()
+      if not line:
+        return
+      command = line.decode('ascii', 'replace').strip()
+      verb = command.split(' ')[0].upper()
+      if verb == 'EHLO':
+        self.wfile.write(b'250-stand-in\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+      elif verb == 'HELO':
+        self.reply('250 stand-in')
+      elif verb == 'AUTH':
+        self.reply('235 2.7.0 Accepted')
+      elif verb == 'MAIL':
+        sender, recipients = command[10:].strip('<>'), []
+        self.reply('250 OK')
+      elif verb == 'RCPT':
+        recipients.append(command[8:].strip('<>'))
+        self.reply('250 OK')
+      elif verb == 'DATA':
+        self.reply('354 End data with <CR><LF>.<CR><LF>')
+        data = []
+        while True:
+          chunk = self.rfile.readline()
+          if not chunk or chunk == b'.\r\n':
+            break
+          data.append(chunk)
+        time.sleep(server.message_delay)
+        with server.lock:
+          server.messages.append((sender, recipients, b''.join(data)))
+        self.reply('250 OK queued')
+      elif verb in ['NOOP', 'RSET']:
+        self.reply('250 OK')
+      elif verb == 'QUIT':
+        self.reply('221 Bye')
+        return
+      else:
+        self.reply('502 Command not implemented')
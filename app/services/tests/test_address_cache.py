@@ -0,0 +1,33 @@
+import time
+from collections import OrderedDict
+from app.services.address_cache import AddressCache, address_key
+
+def usps_address(street, city='Lawrence', state='KS', zip_code='66044', unit=''):
+  return {'address': street, 'address_extended': unit, 'city': city, 'state': state, 'zip_code': zip_code}
+
+def test_address_key_normalizes_spelling():
+  assert address_key(usps_address('707 Vermont Street', unit='Apt. 4')) == address_key(usps_address('707  VERMONT ST', unit='#4', city='LAWRENCE', zip_code='66044-1234'))
+  assert address_key(usps_address('707 Vermont St')) != address_key(usps_address('708 Vermont St'))
+
+def test_positive_and_negative_ttls():
+  cache = AddressCache(ttl=60, negative_ttl=0.01)
+  valid = usps_address('707 Vermont St')
+  invalid = usps_address('1 Nowhere Rd')
+  cache.set(valid, OrderedDict([('address', '707 VERMONT ST'), ('zip5', '66044')]))
+  cache.set(invalid, ValueError('-2147219401: Address Not Found.'))
+
+  assert cache.get(valid)['address'] == '707 VERMONT ST'
+  assert isinstance(cache.get(invalid), ValueError)
+  time.sleep(0.02)
+  assert cache.get(invalid) is AddressCache.MISSING
+  assert cache.get(valid) is not AddressCache.MISSING
+
+def test_disk_tier_is_shared(tmp_path):
+  path = str(tmp_path / 'address-cache.sqlite')
+  first = AddressCache(path=path)
+  second = AddressCache(path=path)
+  address = usps_address('707 Vermont St')
+  first.set(address, OrderedDict([('address', '707 VERMONT ST')]))
+
+  assert second.get(address) == OrderedDict([('address', '707 VERMONT ST')])
+  assert second.stats()['disk_hits'] == 1
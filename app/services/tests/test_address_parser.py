@@ -0,0 +1,29 @@
+from app.services.address_parser import parse_address, VALID_CANDIDATE, INVALID, NEEDS_USPS
+
+def usps_address(street, unit='', city='Lawrence', state='KS', zip_code='66044'):
+  return {'address': street, 'address_extended': unit, 'city': city, 'state': state, 'zip_code': zip_code}
+
+def test_well_formed_address_is_candidate():
+  parsed = parse_address(usps_address('707 Vermont Street'))
+  assert parsed.classification == VALID_CANDIDATE
+  assert parsed.key == '707 VERMONT ST||LAWRENCE|KS|66044'
+
+def test_unit_in_street_line_shares_key():
+  assert parse_address(usps_address('707 Vermont St Apt 4')).key == parse_address(usps_address('707 Vermont St', unit='#4')).key
+
+def test_obviously_malformed_addresses_are_invalid():
+  assert parse_address(usps_address('Vermont St')).reason == 'missing house number'
+  assert parse_address(usps_address('PO Box 12')).classification == INVALID
+  assert parse_address(usps_address('Vermont St and 7th St')).classification == INVALID
+  assert parse_address(usps_address('')).classification == INVALID
+
+def test_rural_route_box_is_not_rejected():
+  assert parse_address(usps_address('RR 2 Box 15')).classification != INVALID
+
+def test_unparseable_address_needs_usps():
+  assert parse_address(usps_address('the blue house')).classification == NEEDS_USPS
+
+def test_building_and_lot_numbers_are_part_of_the_key():
+  assert parse_address(usps_address('123 Main St Bldg 5')).key != parse_address(usps_address('123 Main St Bldg 6')).key
+  assert parse_address(usps_address('123 Main St Lot 4')).key != parse_address(usps_address('123 Main St Trlr 4')).key
+  assert parse_address(usps_address('123 Main St Lot 4')).key == parse_address(usps_address('123 Main St', unit='Lot 4')).key
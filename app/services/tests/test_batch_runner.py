@@ -0,0 +1,30 @@
+import threading
+import time
+from app.services.batch_runner import BatchRunner
+
+def test_keeps_at_most_limit_items_in_flight():
+  runner = BatchRunner(max_workers=8)
+  lock = threading.Lock()
+  state = {'running': 0, 'peak': 0}
+  def work(item):
+    with lock:
+      state['running'] += 1
+      state['peak'] = max(state['peak'], state['running'])
+    time.sleep(0.02)
+    with lock:
+      state['running'] -= 1
+    return item * 2
+  results = dict((index, result) for index, result, error in runner.run(work, range(10), limit=3))
+  assert results == dict((i, i * 2) for i in range(10))
+  assert state['peak'] == 3
+
+def test_item_errors_are_isolated():
+  runner = BatchRunner(max_workers=2)
+  def work(item):
+    if item == 1:
+      raise ValueError('bad person')
+    return item
+  results = sorted(runner.run(work, [0, 1, 2]), key=lambda r: r[0])
+  assert [r[1] for r in results] == [0, None, 2]
+  assert isinstance(results[1][2], ValueError)
+  assert runner.stats()['errors'] == 1
@@ -0,0 +1,58 @@
+import time
+from app.services.bulk_sender import BulkSender, TokenBucket
+
+def test_token_bucket_paces_after_burst():
+  bucket = TokenBucket(rate=50, capacity=5)
+  start = time.monotonic()
+  for _ in range(15):
+    bucket.acquire()
+  # 5 from the burst, the other 10 at 50/s
+  assert time.monotonic() - start >= 0.18
+
+def test_failures_are_isolated_and_retried():
+  calls = {}
+  def send(email):
+    calls[email] = calls.get(email, 0) + 1
+    if email == 'flaky@example.com' and calls[email] < 2:
+      raise IOError('try again')
+    if email == 'bad@example.com':
+      raise ValueError('rejected')
+  sender = BulkSender(TokenBucket(1000, 1000), workers=2, attempts=3, backoff=0.001,
+    should_retry=lambda err: isinstance(err, IOError))
+  results = sender.run('test', [(1, 'ok@example.com'), (2, 'flaky@example.com'), (3, 'bad@example.com')], send)
+  assert [r['status'] for r in results] == ['sent', 'sent', 'failed']
+  assert results[1]['attempts'] == 2
+  assert results[2]['attempts'] == 1
+  progress = sender.stats()['last_run']
+  assert (progress['sent'], progress['failed'], progress['retries'], progress['finished']) == (2, 1, 1, True)
+
+def test_batches_retry_only_the_failed_messages():
+  batches = []
+  def send_batch(emails):
+    batches.append(emails)
+    return [IOError('throttled') if email == 'slow@example.com' and len(batches) == 1 else
+      ValueError('rejected') if email == 'bad@example.com' else None for email in emails]
+  sender = BulkSender(TokenBucket(1000, 1000), workers=1, attempts=3, backoff=0.001,
+    should_retry=lambda err: isinstance(err, IOError))
+  emails = ['a@example.com', 'slow@example.com', 'bad@example.com', 'd@example.com', 'e@example.com']
+  results = sender.run_batches('test', list(enumerate(emails)), send_batch, 3)
+  assert batches == [emails[:3], ['slow@example.com'], emails[3:]]
+  assert [r['status'] for r in results] == ['sent', 'sent', 'failed', 'sent', 'sent']
+  assert [r['key'] for r in results] == [0, 1, 2, 3, 4]
+  assert results[1]['attempts'] == 2
+
+def test_pages_of_one_sweep_add_up():
+  from concurrent.futures import ThreadPoolExecutor
+  sender = BulkSender(TokenBucket(1000, 1000), workers=2, attempts=1)
+  progress = sender.start('sweep')
+  def send_batch(emails):
+    return [ValueError('rejected') if email.startswith('bad') else None for email in emails]
+  pages = [[(i, 'bad%s@example.com' %(i) if i % 5 == 0 else 'ok%s@example.com' %(i)) for i in range(start, start + 10)]
+    for start in range(0, 40, 10)]
+  # partitions send their pages at the same time
+  with ThreadPoolExecutor(4) as pool:
+    list(pool.map(lambda page: sender.run_batches('sweep', page, send_batch, 3, progress=progress), pages))
+  assert not sender.stats()['last_run']['finished']
+  sender.finish(progress)
+  run = sender.stats()['last_run']
+  assert (run['total'], run['sent'], run['failed'], run['pending'], run['finished']) == (40, 32, 8, 0, True)
@@ -0,0 +1,153 @@
+from datetime import date, datetime, timedelta, timezone
+from flask import Flask
+from app.services.challenge_sweep import challenge_window, incomplete_challengers, last_ended_day
+
+class Snapshot():
+  def __init__(self, id, data):
+    self.id = id
+    self.data = data
+
+  def to_dict(self):
+    return dict(self.data)
+
+class Query():
+  # just enough of a Firestore query: range filters, one ordering, projection, limit and cursor
+  def __init__(self, docs, filters=(), fields=None, limit=None, after=None, log=None):
+    self.docs, self.filters, self.fields, self.count, self.after = docs, filters, fields, limit, after
+    self.log = log if log is not None else []
+
+  def _with(self, **changes):
+    args = dict(filters=self.filters, fields=self.fields, limit=self.count, after=self.after, log=self.log)
+    args.update(changes)
+    return Query(self.docs, **args)
+
+  def where(self, field, op, value):
+    return self._with(filters=self.filters + ((field, op, value),))
+
+  def order_by(self, field):
+    return self
+
+  def select(self, fields):
+    return self._with(fields=fields)
+
+  def limit(self, count):
+    return self._with(limit=count)
+
+  def start_after(self, snapshot):
+    return self._with(after=(snapshot.data['challengeEndDate'], snapshot.id))
+
+  def stream(self):
+    ops = {'>=': lambda a, b: a >= b, '<': lambda a, b: a < b}
+    docs = sorted((d for d in self.docs if isinstance(d.data.get('challengeEndDate'), datetime)),
+      key=lambda d: (d.data['challengeEndDate'], d.id))
+    docs = [d for d in docs if all(ops[op](d.data[field], value) for field, op, value in self.filters)]
+    if self.after:
+      docs = [d for d in docs if (d.data['challengeEndDate'], d.id) > self.after]
+    docs = docs[:self.count]
+    self.log.append(len(docs))
+    return [Snapshot(d.id, dict((f, d.data[f]) for f in self.fields if f in d.data)) for d in docs]
+
+def test_window_is_the_pst_day_in_utc():
+  start, end = challenge_window(date(2022, 3, 27))
+  assert start == datetime(2022, 3, 27, 7, tzinfo=timezone.utc)
+  assert end == datetime(2022, 3, 28, 7, tzinfo=timezone.utc)
+
+def test_scheduled_sweep_covers_a_day_that_has_ended():
+  # 23:00 PST on the 27th: the 27th still has an hour to go
+  assert last_ended_day(datetime(2022, 3, 28, 6)) == date(2022, 3, 26)
+  # the default schedule, just after midnight PST
+  assert last_ended_day(datetime(2022, 3, 28, 7, 15)) == date(2022, 3, 27)
+  for hour in range(24):
+    now = datetime(2022, 3, 28, hour)
+    _, end = challenge_window(last_ended_day(now))
+    assert end <= now.replace(tzinfo=timezone.utc) < end + timedelta(days=1)
+
+def test_sweep_pages_through_todays_challenges():
+  start, _ = challenge_window(date(2022, 3, 27))
+  docs = [Snapshot('u%02d' %(i), {'email': 'u%s@example.com' %(i), 'name': 'Person', 'badges': ['b'] * (i % 10),
+    'challengeEndDate': start + timedelta(hours=i)}) for i in range(30)]
+  docs.append(Snapshot('nodate', {'email': 'x@example.com', 'badges': [], 'challengeEndDate': 'soon'}))
+  users = Query(docs)
+  with Flask(__name__).app_context():
+    found = list(incomplete_challengers(users, today=date(2022, 3, 27), page_size=4))
+  # hours 0-23 end today; those with 8 or 9 badges are done
+  assert found == [('u%02d' %(i), 'u%s@example.com' %(i)) for i in range(24) if i % 10 < 8]
+  assert users.log == [4, 4, 4, 4, 4, 4, 0]
+
+def test_rerun_resumes_and_never_sends_twice(tmp_path):
+  from app.services.challenge_sweep import run_sweep
+  from app.services.sweep_ledger import SweepLedger
+  ledger = SweepLedger(str(tmp_path / 'ledger.sqlite3'))
+  day = date(2022, 3, 27)
+  users = [('u%s' %(i), 'u%s@example.com' %(i)) for i in range(9)]
+  def pages(after):
+    start = 0 if after is None else [user for user, _ in users].index(after) + 1
+    for i in range(start, len(users), 3):
+      yield users[i:i + 3], users[i + 2][0]
+  sent = []
+  def send(recipients, crash_at=None):
+    if crash_at in [user for user, _ in recipients]:
+      raise RuntimeError('worker killed')
+    sent.extend(user for user, _ in recipients)
+    return [{'key': user, 'status': 'failed' if user == 'u1' else 'sent', 'attempts': 1} for user, _ in recipients]
+  with Flask(__name__).app_context():
+    try:
+      run_sweep(ledger, 'sweep', 'challengeIncomplete', day, pages, lambda r: send(r, crash_at='u4'))
+    except RuntimeError:
+      pass
+    # the second run starts after the first page and leaves the crashed page's claims alone
+    results, skipped = run_sweep(ledger, 'sweep', 'challengeIncomplete', day, pages, send)
+    assert [r['key'] for r in results] == ['u6', 'u7', 'u8']
+    assert skipped == 3
+    # a finished sweep rescans, retrying only the user whose send failed
+    results, skipped = run_sweep(ledger, 'sweep', 'challengeIncomplete', day, pages, send)
+    assert [r['key'] for r in results] == ['u1']
+  assert sent == ['u0', 'u1', 'u2', 'u6', 'u7', 'u8', 'u1']
+
+def test_partitions_cover_the_day_once(tmp_path):
+  from app.services.challenge_sweep import partition_window, run_partitioned_sweep
+  from app.services.sweep_ledger import SweepLedger
+  start, end = challenge_window(date(2022, 3, 27))
+  ranges = partition_window(start, end, 7)
+  assert ranges[0][0] == start and ranges[-1][1] == end
+  assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+  docs = [Snapshot('u%03d' %(i), {'email': 'u%s@example.com' %(i), 'badges': ['b'] * (i % 10),
+    'challengeEndDate': start + timedelta(minutes=13 * i)}) for i in range(200)]
+  sent = []
+  def send(recipients):
+    sent.extend(user for user, _ in recipients)
+    return [{'key': user, 'status': 'sent', 'attempts': 1} for user, _ in recipients]
+  app = Flask(__name__)
+  app.config['BATCH_WORKERS'] = '4'
+  with app.app_context():
+    expected = [user for user, _ in incomplete_challengers(Query(docs), today=date(2022, 3, 27), page_size=10)]
+    results, skipped, failed = run_partitioned_sweep(SweepLedger(str(tmp_path / 'ledger.sqlite3')), 'sweep',
+      'challengeIncomplete', Query(docs), date(2022, 3, 27), send, partitions=7, parallelism=3, page_size=10)
+  assert (skipped, failed) == (0, 0)
+  assert [r['key'] for r in results] == expected
+  assert sorted(sent) == expected
+
+def test_timed_out_send_is_not_sent_again(tmp_path):
+  from app.services.bulk_sender import BulkSender, TokenBucket
+  from app.services.challenge_sweep import run_sweep
+  from app.services.email_transports import may_have_sent
+  from app.services.resilience import DependencyTimeout
+  from app.services.sweep_ledger import SweepLedger
+  ledger = SweepLedger(str(tmp_path / 'ledger.sqlite3'))
+  day = date(2022, 3, 27)
+  users = [('u0', 'u0@example.com'), ('u1', 'u1@example.com'), ('u2', 'u2@example.com')]
+  sender = BulkSender(TokenBucket(1000, 1000), attempts=3, backoff=0, may_have_sent=may_have_sent)
+  attempts = []
+  def send(email):
+    attempts.append(email)
+    if email == 'u1@example.com':
+      raise DependencyTimeout('gmail did not answer within 10s')
+  def pages(after):
+    yield users, 'u2'
+  with Flask(__name__).app_context():
+    results, _ = run_sweep(ledger, 'sweep', 'challengeIncomplete', day, pages, lambda r: sender.run('sweep', r, send))
+    assert [r['status'] for r in results] == ['sent', 'unknown', 'sent']
+    results, skipped = run_sweep(ledger, 'sweep', 'challengeIncomplete', day, pages, lambda r: sender.run('sweep', r, send))
+  assert (results, skipped) == ([], 3)
+  # never retried either, even though the sender would retry any other error
+  assert attempts.count('u1@example.com') == 1
@@ -0,0 +1,49 @@
+import base64
+import time
+from flask import Flask
+from flask_babel import Babel
+from config import Config
+from app.services import ses_client
+from app.services.county_mailer import CountyMailer
+from app.services.tests.ses_stand_in import SESStandIn
+
+class Registrant():
+  session_id = 'session'
+  county = 'Douglas'
+
+  def try_value(self, field):
+    return {
+      'email': 'voter@example.com',
+      'name_first': 'Jane',
+      'vr_form': 'data:image/png;base64,' + base64.b64encode(b'form').decode('ascii'),
+    }.get(field)
+
+  def name(self):
+    return 'Jane Doe'
+
+class Clerk():
+  county = 'Douglas'
+  officer = 'Clerk'
+  email = 'clerk@example.com'
+  phone = '555-0100'
+
+def test_clerk_and_receipt_go_out_together():
+  server = SESStandIn(request_delay=0.3).start()
+  app = Flask(__name__)
+  app.config.from_object(Config)
+  app.config.update(SEND_EMAIL='true', BATCH_WORKERS='4', EMAIL_FROM='from@example.com', EMAIL_BCC='bcc@example.com',
+    AWS_DEFAULT_REGION='us-east-1', SES_ACCESS_KEY_ID='stand-in', SES_SECRET_ACCESS_KEY='stand-in', SES_ENDPOINT_URL=server.endpoint)
+  Babel(app)
+  ses_client._ses_client = None
+  with app.test_request_context():
+    mailer = CountyMailer(Registrant(), Clerk(), 'vr_form')
+    started = time.time()
+    responses = mailer.send()
+    elapsed = time.time() - started
+  assert list(responses) == ['clerk', 'receipt']
+  assert all(response['MessageId'] for response in responses.values())
+  assert sorted(server.sent) == ['clerk@example.com', 'voter@example.com']
+  # one round trip, not two
+  assert elapsed < 0.55
+  ses_client._ses_client = None
+  server.stop()
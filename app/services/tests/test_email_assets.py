@@ -0,0 +1,23 @@
+import base64
+import os
+from app.services.email_assets import ImageCache
+
+def test_parts_are_cached_and_reloaded_when_the_file_changes(tmpdir):
+  path = str(tmpdir.join('logo.png'))
+  with open(path, 'wb') as f:
+    f.write(b'first')
+  cache = ImageCache()
+  cache.preload(str(tmpdir.join('*.png')))
+  part = cache.part(path, 'image0')
+  assert part['Content-ID'] == '<image0>'
+  assert part.get_content_type() == 'image/png'
+  assert base64.b64decode(part.get_payload()) == b'first'
+  assert cache.part(path, 'image0') is part
+  assert cache.stats()['loads'] == 1
+
+  with open(path, 'wb') as f:
+    f.write(b'second')
+  stat = os.stat(path)
+  os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+  assert base64.b64decode(cache.part(path, 'image0').get_payload()) == b'second'
+  assert cache.stats()['loads'] == 2
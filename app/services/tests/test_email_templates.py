@@ -0,0 +1,22 @@
+import pytest
+from app.services.email_templates import EMAIL_TYPES, render_template_message
+
+def test_email_types_are_frozen():
+  with pytest.raises(TypeError):
+    EMAIL_TYPES['badgeEarned']['p3'] = ' badge winning!'
+
+def test_singular_badge_does_not_leak_into_later_sends():
+  _, single, images = render_template_message('badgeEarned', daysLeft='2', badgesLeft='1', avatar='1')
+  _, plural, _ = render_template_message('badgeEarned', daysLeft='2', badgesLeft='3', avatar='1')
+  assert '1 more</b> badge winning!' in single
+  assert '3 more</b> badges winning!' in plural
+  assert ('image2', 'img/daysleft2.png') in images
+
+def test_personal_fields_are_escaped():
+  _, html, images = render_template_message('registered', firstName='<b>ann</b>', avatar='3')
+  assert '&lt;B&gt;ANN&lt;/B&gt;' in html
+  assert ('image1', 'img/avatar3.png') in images
+
+def test_unknown_type():
+  with pytest.raises(ValueError):
+    render_template_message('nope')
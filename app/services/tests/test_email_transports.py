@@ -0,0 +1,83 @@
+import smtplib
+from flask import Flask
+from app.services import smtp_pool
+from app.services.email_transports import EmailRouter, FileTransport, SMTPTransport, Transport, TransportsUnavailable, parse_route, strip_bcc
+from app.services.resilience import DependencyTimeout
+from app.services.smtp_pool import SMTPPool
+from app.services.tests.smtp_stand_in import SMTPStandIn
+
+MESSAGE = b'To: a@example.com\r\nCc: b@example.com\r\nSubject: hi\r\n\r\nhello\r\n'
+
+class FakeTransport(Transport):
+  def __init__(self, name, errors=()):
+    self.name = name
+    self.errors = list(errors)
+    self.sent = 0
+
+  def send(self, message, sender=None):
+    if self.errors:
+      raise self.errors.pop(0)
+    self.sent += 1
+    return '%s-%s' %(self.name, self.sent)
+
+  def is_failure(self, err):
+    return not isinstance(err, ValueError)
+
+def test_route_fails_over_and_demotes_a_failing_transport():
+  primary = FakeTransport('primary', [ConnectionError('down')] * 3)
+  backup = FakeTransport('backup')
+  router = EmailRouter([primary, backup], decay=0.5, max_error_rate=0.5, failure_threshold=10)
+  route = parse_route('primary,backup')
+  with Flask(__name__).app_context():
+    assert router.send(MESSAGE, route=route) == ('backup', 'backup-1')
+    assert router.order(route) == ['primary', 'backup']
+    router.send(MESSAGE, route=route)
+    # two failures in a row put primary over the error rate, so backup goes first
+    assert router.order(route) == ['backup', 'primary']
+    router.send(MESSAGE, route=route)
+  # the third send never went to primary
+  assert len(primary.errors) == 1
+  stats = router.stats()
+  assert stats['primary']['failed'] == 2 and stats['backup']['sent'] == 3 and stats['backup']['failovers'] == 2
+
+def test_rejections_and_timeouts_are_not_failed_over():
+  primary = FakeTransport('primary', [ValueError('bad address'), DependencyTimeout('slow'), ConnectionError('down')])
+  backup = FakeTransport('backup', [ConnectionError('down')])
+  router = EmailRouter([primary, backup])
+  with Flask(__name__).app_context():
+    for error in [ValueError, DependencyTimeout, TransportsUnavailable]:
+      try:
+        router.send(MESSAGE, route=parse_route('primary,backup'))
+        assert False
+      except error:
+        pass
+  assert backup.sent == 0
+  assert router.stats()['primary']['rejected'] == 1
+
+def test_equal_priorities_go_to_the_faster_transport():
+  router = EmailRouter([FakeTransport('a'), FakeTransport('b'), FakeTransport('c')])
+  router.stats_by_name['a'].record(0.8, 'sent')
+  router.stats_by_name['b'].record(0.2, 'sent')
+  router.stats_by_name['c'].record(0.1, 'sent')
+  assert router.order(parse_route('a:1,b:1,c:2')) == ['b', 'a', 'c']
+
+def test_file_and_smtp_transports(tmp_path):
+  path = FileTransport(str(tmp_path / 'outbox')).send(MESSAGE)
+  assert open(path, 'rb').read() == MESSAGE
+  smtp = SMTPTransport()
+  assert not smtp.is_failure(smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no such user')}))
+  assert smtp.is_failure(smtplib.SMTPServerDisconnected())
+
+def test_bcc_is_on_the_envelope_but_not_in_the_message(monkeypatch):
+  message = b'To: a@example.com\r\nBcc: hidden@example.com,\r\n other@example.com\r\nSubject: hi\r\n\r\nBcc: body text\r\n'
+  assert strip_bcc(message) == b'To: a@example.com\r\nSubject: hi\r\n\r\nBcc: body text\r\n'
+  assert strip_bcc(b'To: a@example.com\nbcc: hidden@example.com\n\nhello\n') == b'To: a@example.com\n\nhello\n'
+  server = SMTPStandIn().start()
+  pool = SMTPPool('127.0.0.1', server.port, username='user', password='pwd', use_ssl=False)
+  monkeypatch.setattr(smtp_pool, 'get_smtp_pool', lambda: pool)
+  SMTPTransport(sender='from@example.com').send(message)
+  sender, envelope, data = server.messages[0]
+  assert sorted(envelope) == ['a@example.com', 'hidden@example.com', 'other@example.com']
+  assert b'hidden@example.com' not in data and b'other@example.com' not in data
+  pool.close()
+  server.stop()
@@ -0,0 +1,48 @@
+import threading
+import time
+import firebase_admin
+from firebase_admin import credentials, firestore
+from flask import Flask
+from app.services import firestore_client
+
+def fake_firebase(monkeypatch):
+  apps = []
+  def initialize_app(cred, name):
+    # slow enough that concurrent callers all find no client yet
+    time.sleep(0.05)
+    apps.append((cred, name))
+    return name
+  monkeypatch.setattr(credentials, 'Certificate', lambda path: 'certificate from %s' %(path))
+  monkeypatch.setattr(firebase_admin, 'initialize_app', initialize_app)
+  monkeypatch.setattr(firestore, 'client', lambda app: {'app': app})
+  monkeypatch.setattr(firestore_client, '_firestore', None)
+  monkeypatch.setattr(firestore_client, '_firestore_pid', None)
+  app = Flask(__name__)
+  app.config['FIREBASE_CREDENTIALS'] = 'service-account.json'
+  return app, apps
+
+def test_client_is_created_once_on_first_use(monkeypatch):
+  app, apps = fake_firebase(monkeypatch)
+  assert apps == []
+  clients = []
+  def use():
+    with app.app_context():
+      clients.append(firestore_client.get_firestore())
+  threads = [threading.Thread(target=use) for _ in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert len(apps) == 1 and apps[0][0] == 'certificate from service-account.json'
+  assert all(client is clients[0] for client in clients)
+
+def test_forked_worker_gets_its_own_client(monkeypatch):
+  app, apps = fake_firebase(monkeypatch)
+  pid = firestore_client.os.getpid()
+  with app.app_context():
+    parent = firestore_client.get_firestore()
+    monkeypatch.setattr(firestore_client.os, 'getpid', lambda: pid + 1)
+    child = firestore_client.get_firestore()
+    assert firestore_client.get_firestore() is child
+  assert child is not parent
+  assert [name for _, name in apps] == ['firestore-%s' %(pid), 'firestore-%s' %(pid + 1)]
@@ -0,0 +1,31 @@
+import base64
+import pickle
+from email.mime.text import MIMEText
+from google.oauth2.credentials import Credentials
+from app.services.gmail_client import GmailClient
+from app.services.tests.gmail_stand_in import GmailStandIn
+
+def message(to):
+  mime = MIMEText('hello')
+  mime['to'] = to
+  return {'raw': base64.urlsafe_b64encode(mime.as_bytes()).decode('ascii')}
+
+def client(server, tmp_path):
+  token_path = str(tmp_path / 'token.pickle')
+  with open(token_path, 'wb') as token:
+    pickle.dump(Credentials(token='stand-in'), token)
+  return GmailClient(token_path=token_path, api_endpoint=server.endpoint)
+
+def test_batch_reports_each_message(tmp_path):
+  server = GmailStandIn(failures={'bad@example.com': [400]}).start()
+  gmail = client(server, tmp_path)
+  seen = []
+  results = gmail.send_batch([message('a@example.com'), message('bad@example.com'), message('c@example.com')],
+    callback=lambda index, response, error: seen.append(index))
+  assert server.requests == 1
+  assert sorted(seen) == [0, 1, 2]
+  assert [error is None for _, error in results] == [True, False, True]
+  assert results[1][1].resp.status == 400
+  assert server.sent == ['a@example.com', 'c@example.com']
+  assert gmail.stats()['sent'] == 2
+  server.stop()
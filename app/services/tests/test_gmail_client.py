@@ -0,0 +1,51 @@
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+from google.oauth2.credentials import Credentials
+from app.services import gmail_client
+from app.services.gmail_client import GmailClient
+
+def client(tmp_path):
+  token_path = str(tmp_path / 'token.pickle')
+  with open(token_path, 'wb') as token:
+    pickle.dump(Credentials(token='stand-in', expiry=datetime.utcnow() + timedelta(hours=1)), token)
+  return GmailClient(token_path=token_path, refresh_margin=300)
+
+def test_expiring_token_is_refreshed_once(tmp_path, monkeypatch):
+  refreshes = []
+  def refresh(creds, request):
+    refreshes.append(threading.current_thread().name)
+    # slow enough that every sender is waiting on the lock
+    time.sleep(0.05)
+    creds.token = 'refreshed'
+    creds.expiry = datetime.utcnow() + timedelta(hours=1)
+  monkeypatch.setattr(Credentials, 'refresh', refresh)
+  gmail = client(tmp_path)
+  gmail.ensure_fresh()
+  assert refreshes == []
+
+  gmail.creds.expiry = datetime.utcnow() + timedelta(seconds=60)
+  threads = [threading.Thread(target=gmail.ensure_fresh) for _ in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  assert len(refreshes) == 1 and gmail.stats()['refreshes'] == 1
+  # the refreshed token is saved for the next process
+  with open(gmail.token_path, 'rb') as token:
+    assert pickle.load(token).token == 'refreshed'
+
+def test_http_is_per_thread_and_rebuilt_after_fork(tmp_path, monkeypatch):
+  gmail = client(tmp_path)
+  main = gmail._http()
+  assert gmail._http() is main
+  other = []
+  thread = threading.Thread(target=lambda: other.append(gmail._http()))
+  thread.start()
+  thread.join()
+  assert other[0] is not main
+  pid = gmail_client.os.getpid()
+  monkeypatch.setattr(gmail_client.os, 'getpid', lambda: pid + 1)
+  child = gmail._http()
+  assert child is not main and gmail._http() is child
@@ -0,0 +1,55 @@
+import threading
+import time
+import pytest
+from app.services.lookup_orchestrator import LookupOrchestrator, LookupTimeout
+
+def slow_then_fast():
+  calls = []
+  lock = threading.Lock()
+  def provider():
+    with lock:
+      calls.append(1)
+      first = len(calls) == 1
+    time.sleep(0.5 if first else 0.01)
+    return {'status': 'registered', 'first': first}
+  return provider, calls
+
+def test_hedged_request_wins_over_slow_one():
+  orchestrator = LookupOrchestrator(hedge_after=0.05, max_hedges=1, timeout=2)
+  provider, calls = slow_then_fast()
+  start = time.time()
+  name, result = orchestrator.lookup([('rtv', provider)])
+  assert name == 'rtv'
+  assert result['first'] is False
+  assert time.time() - start < 0.3
+  assert len(calls) == 2
+  stats = orchestrator.stats()['rtv']
+  assert stats['hedges'] == 1
+  assert stats['hedge_wins'] == 1
+
+def test_found_answer_beats_not_found():
+  orchestrator = LookupOrchestrator(hedge_after=1, max_hedges=0, timeout=2)
+  def found():
+    time.sleep(0.05)
+    return [{'tree': {}}]
+  name, result = orchestrator.lookup([('empty', lambda: False), ('found', found)])
+  assert name == 'found'
+
+def test_not_found_returned_when_no_provider_finds():
+  orchestrator = LookupOrchestrator(hedge_after=1, max_hedges=0, timeout=2)
+  assert orchestrator.lookup([('a', lambda: False), ('b', lambda: None)])[1] in [False, None]
+
+def test_all_errors_raise_first_error():
+  orchestrator = LookupOrchestrator(hedge_after=0.01, max_hedges=1, timeout=1)
+  def fail():
+    raise IOError('down')
+  with pytest.raises(IOError):
+    orchestrator.lookup([('a', fail)])
+  assert orchestrator.stats()['a']['errors'] >= 1
+
+def test_times_out_when_nothing_answers():
+  orchestrator = LookupOrchestrator(hedge_after=0.02, max_hedges=1, timeout=0.05)
+  release = threading.Event()
+  with pytest.raises(LookupTimeout):
+    orchestrator.lookup([('a', release.wait)])
+  release.set()
@@ -0,0 +1,47 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from app.services.registration_cache import RegistrationCache, registration_summary
+
+JANE = dict(name_first='Jane', name_last="O'Neil", dob='01/02/1990', zipcode='66044', state='ks')
+
+def record(status):
+  return {
+    'tree': OrderedDict([('Status', status), ('Name', "Jane O'Neil"), ('Residence Address', '707 Vermont St, Lawrence KS')]),
+    'elections': [{'date': '11/03/2020', 'name': 'General', 'type': 'General', 'how': 'Advance'}],
+  }
+
+def test_summary_keeps_only_registration_and_status():
+  assert registration_summary([record('Active')]) == {'registered': True, 'status': 'active'}
+  assert registration_summary({'status': 'active', 'name': 'Jane'}) == {'registered': True, 'status': 'active'}
+  assert registration_summary({'status': 'pending', 'name': 'Jane'}) == {'registered': False, 'status': 'pending'}
+  assert registration_summary(None) is None and registration_summary(False) is None
+
+def test_identity_is_normalized_and_hashed():
+  cache = RegistrationCache('salt')
+  key = cache.key(**JANE)
+  assert key == cache.key(name_first=' JANE', name_last='oneil', dob='1/2/1990', zipcode='66044-1234', state='KS')
+  assert 'jane' not in key.lower() and '1990' not in key
+  assert key != RegistrationCache('pepper').key(**JANE)
+
+def test_ttl_follows_active_status():
+  cache = RegistrationCache('salt', ttl=60, not_found_ttl=0.01)
+  bob = dict(JANE, name_first='Bob')
+  sam = dict(JANE, name_first='Sam')
+  cache.set(registration_summary([record('Active')]), **JANE)
+  cache.set(registration_summary({'status': 'inactive'}), **bob)
+  cache.set(None, **sam)
+  assert cache.get(**JANE) == {'registered': True, 'status': 'active'}
+  assert cache.get(**bob) == {'registered': False, 'status': 'inactive'}
+  assert cache.get(**sam) is None
+  time.sleep(0.02)
+  assert cache.get(**bob) is cache.MISSING and cache.get(**sam) is cache.MISSING
+  assert cache.get(**JANE) is not cache.MISSING
+
+def test_disk_tier_holds_no_records(tmp_path):
+  path = str(tmp_path / 'registration-cache.sqlite')
+  RegistrationCache('salt', path=path).set(registration_summary([record('Active')]), **JANE)
+  assert RegistrationCache('salt', path=path).get(**JANE) == {'registered': True, 'status': 'active'}
+  rows = sqlite3.connect(path).execute('SELECT key, value FROM cache').fetchall()
+  assert len(rows) == 1
+  assert not any(word in ' '.join(rows[0]) for word in ['Jane', 'Neil', 'Vermont', 'General', '1990'])
@@ -0,0 +1,71 @@
+import json
+from flask import Flask
+from config import Config
+from app.services import registration_status as status
+from app.services.registration_status import batch_request_error, batch_status_lines, registration_status
+
+JANE = {'state': 'KS', 'city': 'Lawrence', 'street': '707 Vermont St', 'name_first': 'Jane', 'name_last': 'Doe',
+  'dob': '01/02/1990', 'zip': '66044'}
+
+def setup(monkeypatch, found):
+  """
+  found maps a first name to the summary its lookup returns, or to an exception it raises.
+  """
+  app = Flask(__name__)
+  app.config.from_object(Config)
+  def lookup_registration(step, name_first, **identity):
+    result = found.get(name_first)
+    if isinstance(result, Exception):
+      raise result
+    return result
+  monkeypatch.setattr(status.USPS_API, 'validate_addresses', lambda api: api.address_payload['addr'] != '1 Nowhere Rd')
+  monkeypatch.setattr(status.Step_0, 'lookup_registration', lookup_registration)
+  return app
+
+def test_registered_keeps_its_response_shape(monkeypatch):
+  found = {'Jane': {'registered': True, 'status': 'active'}, 'Bob': {'registered': False, 'status': 'dropped'}}
+  with setup(monkeypatch, found).app_context():
+    assert registration_status(JANE) == ({'registered': True}, 200)
+    assert registration_status(dict(JANE, name_first='Bob')) == ({'registered': False, 'status': 'dropped'}, 200)
+    assert registration_status(dict(JANE, name_first='Sam')) == ({'registered': False, 'status': 'not found'}, 200)
+    assert registration_status({'state': 'KS'}) == ({'error': 'Missing parameters: city, street, name_first, name_last, dob, zip'}, 400)
+    assert registration_status(dict(JANE, street='1 Nowhere Rd')) == ({'error': '(street, city, state, zip) do not form a valid address'}, 400)
+    assert registration_status(dict(JANE, zip=66044, dob='1990-01-02')) == (
+      {'error': 'dob must be in the form mm/dd/yyyy, zip must be 5 digits'}, 400)
+    assert registration_status(dict(JANE, state=None, dob=None))[1] == 400
+
+def test_batch_request_validation():
+  assert batch_request_error({'people': [JANE]}, 50) is None
+  assert batch_request_error([JANE], 50) == 'people must be a non-empty list'
+  assert batch_request_error(None, 50) == 'people must be a non-empty list'
+  assert batch_request_error({'people': JANE}, 50) == 'people must be a non-empty list'
+  assert batch_request_error({'people': []}, 50) == 'people must be a non-empty list'
+  assert batch_request_error({'people': [JANE] * 3}, 2) == 'at most 2 people per batch'
+
+def test_batch_lines_carry_each_persons_result(monkeypatch):
+  found = {'Jane': {'registered': True, 'status': 'active'}, 'Bob': RuntimeError('VoterView returned garbage')}
+  people = [
+    dict(JANE, id='friend-1'),
+    dict(JANE, zip='6604', id='friend-2'),
+    'not a person',
+    dict(JANE, name_first='Bob', id=7),
+    dict(JANE, name_first='Sam'),
+  ]
+  with setup(monkeypatch, found).app_context():
+    lines = [json.loads(line) for line in batch_status_lines(people, limit=4)]
+  assert sorted(lines, key=lambda line: line['index']) == [
+    {'registered': True, 'index': 0, 'code': 200, 'id': 'friend-1'},
+    {'error': 'zip must be 5 digits', 'index': 1, 'code': 400, 'id': 'friend-2'},
+    {'error': 'each person must be an object', 'index': 2, 'code': 400},
+    {'error': 'registration lookup failed', 'index': 3, 'code': 500, 'id': 7},
+    {'registered': False, 'status': 'not found', 'index': 4, 'code': 200},
+  ]
+
+def test_batch_streams_ndjson(monkeypatch):
+  app = setup(monkeypatch, {'Jane': {'registered': True, 'status': 'active'}})
+  with app.test_request_context():
+    response = app.response_class(batch_status_lines([JANE, dict(JANE, zip=None)], limit=2), mimetype='application/x-ndjson')
+    body = response.get_data(as_text=True)
+  assert response.mimetype == 'application/x-ndjson'
+  assert body.endswith('\n') and len(body.splitlines()) == 2
+  assert sorted(json.loads(line)['code'] for line in body.splitlines()) == [200, 400]
@@ -0,0 +1,49 @@
+import threading
+import time
+import pytest
+from app.services.resilience import Dependency, CircuitBreaker, CircuitOpenError, BulkheadFullError, DependencyTimeout, retry
+
+def fail():
+  raise IOError('provider down')
+
+def test_breaker_opens_then_probes_half_open():
+  dep = Dependency('test', timeout=1, failure_threshold=2, reset_timeout=0.05)
+  for _ in range(2):
+    with pytest.raises(IOError):
+      dep.call(fail)
+  assert dep.snapshot()['state'] == CircuitBreaker.OPEN
+  with pytest.raises(CircuitOpenError):
+    dep.call(lambda: 'ok')
+
+  time.sleep(0.06)
+  assert dep.call(lambda: 'ok') == 'ok'
+  assert dep.snapshot()['state'] == CircuitBreaker.CLOSED
+
+def test_timeout_frees_caller_but_keeps_bulkhead_slot():
+  dep = Dependency('test', timeout=0.05, max_concurrent=1)
+  release = threading.Event()
+  with pytest.raises(DependencyTimeout):
+    dep.call(release.wait)
+  with pytest.raises(BulkheadFullError):
+    dep.call(lambda: 'ok')
+
+  release.set()
+  time.sleep(0.05)
+  assert dep.call(lambda: 'ok') == 'ok'
+
+def test_client_errors_do_not_trip_breaker():
+  dep = Dependency('test', failure_threshold=1, is_failure=lambda err: not isinstance(err, ValueError))
+  def reject():
+    raise ValueError('bad address')
+  with pytest.raises(ValueError):
+    dep.call(reject)
+  assert dep.snapshot()['state'] == CircuitBreaker.CLOSED
+
+def test_retry_stops_on_permanent_errors():
+  attempts = []
+  def flaky():
+    attempts.append(1)
+    raise IOError('again')
+  with pytest.raises(IOError):
+    retry(flaky, attempts=3, backoff=0, should_retry=lambda err: len(attempts) < 2)
+  assert len(attempts) == 2
@@ -0,0 +1,35 @@
+import multiprocessing
+from flask import Flask
+from app.services.scheduler import LeaderLock, Scheduler
+
+def try_lock(path, results):
+  results.put(LeaderLock(path).acquire())
+
+def test_only_one_process_leads(tmp_path):
+  path = str(tmp_path / 'scheduler.lock')
+  leader = LeaderLock(path)
+  assert leader.acquire() and leader.acquire()
+  results = multiprocessing.Queue()
+  other = multiprocessing.Process(target=try_lock, args=(path, results))
+  other.start()
+  other.join()
+  assert results.get() is False
+
+def test_jobs_record_durations_and_skip_without_the_lock(tmp_path):
+  path = str(tmp_path / 'scheduler.lock')
+  # another worker leads
+  other = LeaderLock(path)
+  assert other.acquire()
+  scheduler = Scheduler(Flask(__name__), LeaderLock(path), jitter=0)
+  ran = []
+  scheduler.every('warm', 60, lambda: ran.append('warm'))
+  scheduler.cron('sweep', '0 6 * * *', lambda: ran.append('sweep'))
+  scheduler.every('broken', 60, lambda: 1 / 0)
+  scheduler.run('warm', lambda: ran.append('warm'))
+  scheduler.run('sweep', lambda: ran.append('sweep'))
+  scheduler.run('broken', lambda: 1 / 0)
+  assert ran == ['warm']
+  jobs = scheduler.stats()['jobs']
+  assert jobs['sweep']['skipped'] == 1 and jobs['sweep']['runs'] == 0
+  assert jobs['warm']['runs'] == 1 and jobs['warm']['last_seconds'] is not None
+  assert jobs['broken']['failures'] == 1 and 'ZeroDivisionError' in jobs['broken']['last_error']
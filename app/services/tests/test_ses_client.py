@@ -0,0 +1,25 @@
+from flask import Flask
+from config import Config
+from app.services import ses_client
+from app.services.ses_mailer import SESMailer
+from app.services.tests.ses_stand_in import SESStandIn
+
+def test_sends_share_one_client_and_connection():
+  server = SESStandIn(failures={'slow@example.com': ['Throttling'], 'bad@example.com': ['MessageRejected']}).start()
+  app = Flask(__name__)
+  app.config.from_object(Config)
+  app.config.update(SEND_EMAIL='true', FAIL_EMAIL='fail@example.com', AWS_DEFAULT_REGION='us-east-1',
+    SES_ACCESS_KEY_ID='stand-in', SES_SECRET_ACCESS_KEY='stand-in', SES_ENDPOINT_URL=server.endpoint)
+  ses_client._ses_client = None
+  with app.app_context():
+    mailer = SESMailer()
+    responses = [mailer.send_msg(mailer.build_msg(to=[to], subject='hi', body='hello'), 'from@example.com')
+      for to in ['a@example.com', 'slow@example.com', 'bad@example.com']]
+    assert ses_client.get_ses_client() is ses_client.get_ses_client()
+  assert responses[0]['MessageId'] and responses[1]['MessageId']
+  # throttling is retried, a rejected message is not
+  assert responses[2]['MessageId'] is False
+  assert server.sent == ['a@example.com', 'slow@example.com']
+  assert server.requests == 4 and server.connections == 1
+  ses_client._ses_client = None
+  server.stop()
@@ -0,0 +1,45 @@
+import socket
+import time
+from flask import Flask
+from app.services.smtp_pool import SMTPPool
+from app.services.tests.smtp_stand_in import SMTPStandIn
+
+def pool(server, **kwargs):
+  return SMTPPool('127.0.0.1', server.port, username='user', password='pwd', use_ssl=False, **kwargs)
+
+def test_connections_are_reused_and_retired():
+  server = SMTPStandIn().start()
+  smtp = pool(server, size=1, max_messages=3)
+  for i in range(7):
+    smtp.send('from@example.com', ['to%s@example.com' %(i)], 'Subject: hi\r\n\r\nhello')
+  assert len(server.messages) == 7
+  assert server.connections == 3
+  assert smtp.stats()['created'] == 3
+  smtp.close()
+  server.stop()
+
+def test_dropped_connection_is_replaced():
+  server = SMTPStandIn().start()
+  smtp = pool(server, size=1, noop_after=0)
+  smtp.send('from@example.com', ['a@example.com'], 'Subject: 1\r\n\r\none')
+  # the server goes away behind the pooled connection's back
+  smtp.idle[0].smtp.sock.shutdown(socket.SHUT_RDWR)
+  with Flask(__name__).app_context():
+    smtp.send('from@example.com', ['b@example.com'], 'Subject: 2\r\n\r\ntwo')
+  assert len(server.messages) == 2
+  assert smtp.stats()['discarded'] == 1
+  server.stop()
+
+def test_timed_out_send_is_not_retried():
+  server = SMTPStandIn(message_delay=0.5).start()
+  smtp = pool(server, size=1, timeout=0.2)
+  try:
+    smtp.send('from@example.com', ['a@example.com'], 'Subject: slow\r\n\r\nslow')
+    assert False
+  except socket.timeout:
+    pass
+  time.sleep(0.6)
+  # the server got it anyway; a retry would have delivered it twice
+  assert len(server.messages) == 1
+  assert server.connections == 1
+  server.stop()
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from flask import Flask
+from config import Config
+from app.services import address_cache, usps_coalescer, zip_index
+from app.services.address_cache import AddressCache
+from app.services.steps import Step_VR_3
+from app.services.usps_coalescer import USPSCoalescer
+from app.services.zip_index import ZipIndex
+
+def setup(monkeypatch, fetch):
+  app = Flask(__name__)
+  app.config.from_object(Config)
+  monkeypatch.setattr(address_cache, '_address_cache', AddressCache())
+  monkeypatch.setattr(zip_index, '_zip_index', ZipIndex.from_rows([
+    ('66044', 'Lawrence', 'KS', 'Douglas'),
+    ('66012', 'Bonner Springs', 'KS', 'Wyandotte'),
+    ('66012', 'Bonner Springs', 'KS', 'Leavenworth'),
+  ]))
+  monkeypatch.setattr(usps_coalescer, '_coalescer', USPSCoalescer(fetch, window=0))
+  return app
+
+def usps(addresses):
+  return [OrderedDict([('address', address['address'].upper()), ('city', address['city'].upper())]) for address in addresses]
+
+def test_county_comes_from_the_zip(monkeypatch):
+  with setup(monkeypatch, usps).app_context():
+    step = Step_VR_3({'addr': '707 Vermont St', 'city': 'Lawrence', 'state': 'KS', 'zip': '66044'})
+    assert step.run()
+  assert step.county == 'Douglas'
+  assert step.validated_addresses['current_address'] == {'address': '707 VERMONT ST', 'city': 'LAWRENCE', 'county': 'Douglas'}
+  assert step.next_step == 'Step_VR_4'
+
+def test_no_county_for_a_zip_that_straddles_counties_or_a_bad_address(monkeypatch):
+  with setup(monkeypatch, usps).app_context():
+    step = Step_VR_3({'addr': '1 Main St', 'city': 'Bonner Springs', 'state': 'KS', 'zip': '66012'})
+    step.run()
+    assert step.county is None and 'county' not in step.validated_addresses['current_address']
+  with setup(monkeypatch, lambda addresses: [ValueError('-2147219401: Address Not Found.')]).app_context():
+    step = Step_VR_3({'addr': '1 Nowhere Rd', 'city': 'Lawrence', 'state': 'KS', 'zip': '66044'})
+    step.run()
+  # a single address USPS does not know has always been reported as a failed lookup
+  assert step.validated_addresses is False and step.county == 'Douglas'
+  assert step.is_complete
@@ -0,0 +1,31 @@
+import time
+from datetime import date
+from app.services.sweep_ledger import SweepLedger
+
+def test_claims_skip_sent_and_in_flight_users(tmp_path):
+  ledger = SweepLedger(str(tmp_path / 'ledger.sqlite3'), claim_ttl=60)
+  day = date(2022, 3, 27)
+  assert ledger.claim('challengeIncomplete', day, ['a', 'b', 'c']) == ['a', 'b', 'c']
+  # a second run while the first is still sending gets nobody
+  assert ledger.claim('challengeIncomplete', day, ['a', 'b', 'c', 'd']) == ['d']
+  ledger.finish('challengeIncomplete', day, sent=['a'], failed=['b'])
+  assert ledger.claim('challengeIncomplete', day, ['a', 'b']) == ['b']
+  # other days and other email types are separate
+  assert ledger.claim('challengeIncomplete', date(2022, 3, 28), ['a']) == ['a']
+  assert ledger.claim('challengeWon', day, ['a']) == ['a']
+
+def test_stale_claims_are_taken_over(tmp_path):
+  ledger = SweepLedger(str(tmp_path / 'ledger.sqlite3'), claim_ttl=0.05)
+  day = date(2022, 3, 27)
+  ledger.claim('challengeIncomplete', day, ['a', 'b'])
+  ledger.finish('challengeIncomplete', day, sent=['a'], failed=[])
+  time.sleep(0.1)
+  assert ledger.claim('challengeIncomplete', day, ['a', 'b']) == ['b']
+
+def test_unknown_sends_stay_claimed(tmp_path):
+  ledger = SweepLedger(str(tmp_path / 'ledger.sqlite3'), claim_ttl=0.05)
+  day = date(2022, 3, 27)
+  ledger.claim('challengeIncomplete', day, ['a', 'b'])
+  ledger.finish('challengeIncomplete', day, sent=[], failed=['a'], unknown=['b'])
+  time.sleep(0.1)
+  assert ledger.claim('challengeIncomplete', day, ['a', 'b']) == ['a']
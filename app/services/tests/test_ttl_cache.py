@@ -0,0 +1,25 @@
+import sqlite3
+import time
+from app.services.ttl_cache import TTLCache
+
+def rows(path):
+  return sorted(sqlite3.connect(path).execute('SELECT namespace, key FROM cache').fetchall())
+
+def test_writes_sweep_expired_rows_of_every_namespace(tmp_path):
+  path = str(tmp_path / 'cache.sqlite')
+  old = TTLCache(path=path, namespace='usps')
+  old.set('short', 1, 0.01)
+  old.set('long', 2, 60)
+  time.sleep(0.02)
+
+  cache = TTLCache(path=path, namespace='usps-v2', sweep_interval=60)
+  cache.set('a', 3, 0.01)
+  assert rows(path) == [('usps', 'long'), ('usps-v2', 'a')]
+
+  # within the sweep interval expired rows are only skipped
+  time.sleep(0.02)
+  cache.set('b', 4, 60)
+  assert cache.get('a') is TTLCache.MISSING
+  assert rows(path) == [('usps', 'long'), ('usps-v2', 'a'), ('usps-v2', 'b')]
+  cache.sweep()
+  assert rows(path) == [('usps', 'long'), ('usps-v2', 'b')]
@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from flask import Flask
+from config import Config
+from app.services import address_cache, usps_coalescer, zip_index
+from app.services.address_cache import AddressCache
+from app.services.address_validation import validate_address_batch
+from app.services.usps_api import USPS_API
+from app.services.usps_coalescer import USPSCoalescer
+from app.services.zip_index import ZipIndex
+
+def usps_address(street, city='Lawrence', state='KS', zip_code='66044', unit=''):
+  return {'address': street, 'address_extended': unit, 'city': city, 'state': state, 'zip_code': zip_code}
+
+class FakeUSPS():
+  def __init__(self, unknown=(), down=()):
+    self.unknown = unknown
+    self.down = down
+    self.calls = []
+    self.lock = threading.Lock()
+
+  def fetch(self, addresses):
+    streets = [address['address'] for address in addresses]
+    with self.lock:
+      self.calls.append(streets)
+    if any(street in self.down for street in streets):
+      return False
+    return [ValueError('-2147219401: Address Not Found.') if street in self.unknown
+      else OrderedDict([('address', street.upper())]) for street in streets]
+
+def answers(results):
+  return [result.get('address') if isinstance(result, OrderedDict) else str(result) for result in results]
+
+def setup(monkeypatch, usps):
+  app = Flask(__name__)
+  app.config.from_object(Config)
+  app.config.update(USPS_BATCH_SIZE='2', BATCH_WORKERS='4')
+  monkeypatch.setattr(address_cache, '_address_cache', AddressCache())
+  monkeypatch.setattr(zip_index, '_zip_index', ZipIndex.from_rows([('66044', 'Lawrence', 'KS', 'Douglas'), ('64101', 'Kansas City', 'MO', 'Jackson')]))
+  monkeypatch.setattr(usps_coalescer, '_coalescer', USPSCoalescer(usps.fetch, window=0))
+  return app
+
+def test_batch_is_deduplicated_and_answered_in_order(monkeypatch):
+  usps = FakeUSPS(unknown=['1 Nowhere Rd'])
+  addresses = [
+    usps_address('707 Vermont Street'),
+    usps_address('1 Nowhere Rd'),
+    usps_address('12 Main St'),
+    # the first address again, spelled another way
+    usps_address('707 VERMONT ST', zip_code='66044-1234'),
+    usps_address('9 Elm St', state='MO'),
+    usps_address(''),
+    usps_address('1 Nowhere Rd'),
+    usps_address('33 Oak St'),
+  ]
+  with setup(monkeypatch, usps).app_context():
+    results = USPS_API().verify_many(addresses)
+    assert sorted(street for call in usps.calls for street in call) == ['1 Nowhere Rd', '12 Main St', '33 Oak St', '707 Vermont Street']
+    # four lookups in chunks of two
+    assert len(usps.calls) == 2
+    assert answers(results) == [
+      '707 VERMONT STREET',
+      '-2147219401: Address Not Found.',
+      '12 MAIN ST',
+      '707 VERMONT STREET',
+      'zip 66044 is not in MO',
+      'missing street address',
+      '-2147219401: Address Not Found.',
+      '33 OAK ST',
+    ]
+    # all answered from the cache the second time
+    assert answers(USPS_API().verify_many(addresses)) == answers(results)
+    assert len(usps.calls) == 2
+
+def test_unreachable_chunk_is_false_and_not_cached(monkeypatch):
+  usps = FakeUSPS(down=['12 Main St'])
+  addresses = [usps_address('707 Vermont St'), usps_address('44 Pine St'), usps_address('12 Main St'), usps_address('707 Vermont St')]
+  with setup(monkeypatch, usps).app_context():
+    results = USPS_API().verify_many(addresses)
+    assert results[0] == results[3] == OrderedDict([('address', '707 VERMONT ST')])
+    assert results[1:3] == [OrderedDict([('address', '44 PINE ST')]), False]
+    usps.down = []
+    assert USPS_API().verify_many([usps_address('12 Main St')]) == [OrderedDict([('address', '12 MAIN ST')])]
+    assert usps.calls[-1] == ['12 Main St']
+
+def test_validate_address_batch_keeps_each_item_in_place(monkeypatch):
+  usps = FakeUSPS(unknown=['1 Nowhere Rd'])
+  vermont = {'street': '707 Vermont St', 'city': 'Lawrence', 'state': 'KS', 'zip': '66044'}
+  items = [
+    vermont,
+    'not an address',
+    {'street': '1 Nowhere Rd', 'city': 'Lawrence', 'state': 'KS', 'zip': '66044'},
+    {'street': '12 Main St', 'city': 'Lawrence', 'state': 'Kansas', 'zip': '66044'},
+    dict(vermont, unit=''),
+    {'city': 'Lawrence', 'state': 'KS'},
+  ]
+  with setup(monkeypatch, usps).app_context():
+    results = validate_address_batch(items)
+  assert usps.calls == [['707 Vermont St', '1 Nowhere Rd']]
+  assert results == [
+    {'isValid': True, 'address': {'address': '707 VERMONT ST'}},
+    {'error': 'each address must be an object', 'code': 400},
+    {'isValid': False},
+    {'error': 'state must be 2 letter abbreviation', 'code': 400},
+    {'isValid': True, 'address': {'address': '707 VERMONT ST'}},
+    {'error': 'Missing parameters: street, zip', 'code': 400},
+  ]
+
+def test_po_box_mailing_address_goes_to_usps(monkeypatch):
+  usps = FakeUSPS()
+  payload = {'addr': '707 Vermont St', 'city': 'Lawrence', 'state': 'KS', 'zip': '66044',
+    'has_mail_addr': True, 'mail_addr': 'PO Box 12', 'mail_city': 'Lawrence', 'mail_state': 'KS', 'mail_zip': '66044'}
+  with setup(monkeypatch, usps).app_context():
+    results = USPS_API(payload).validate_addresses()
+    assert usps.calls == [['707 Vermont St', 'PO Box 12']]
+    assert results == {'current_address': {'address': '707 VERMONT ST'}, 'mail_addr': {'address': 'PO BOX 12'}}
+    # where the voter lives still has to be residential
+    assert str(USPS_API().verify_many([usps_address('PO Box 12')])[0]) == 'a PO box is not a residential address'
+    assert len(usps.calls) == 1
+
+def test_batch_items_with_the_wrong_types_fail_alone(monkeypatch):
+  usps = FakeUSPS()
+  vermont = {'street': '707 Vermont St', 'city': 'Lawrence', 'state': 'KS', 'zip': '66044'}
+  items = [dict(vermont, zip=66044), dict(vermont, zip=None), dict(vermont, state=None), dict(vermont, street=707), vermont]
+  with setup(monkeypatch, usps).app_context():
+    results = validate_address_batch(items)
+  assert results == [
+    {'error': 'zip must be 5 digits', 'code': 400},
+    {'error': 'zip must be 5 digits', 'code': 400},
+    {'error': 'state must be 2 letter abbreviation', 'code': 400},
+    {'error': 'street must be a string', 'code': 400},
+    {'isValid': True, 'address': {'address': '707 VERMONT ST'}},
+  ]
+  assert usps.calls == [['707 Vermont St']]
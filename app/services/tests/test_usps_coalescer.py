@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from app.services.usps_coalescer import USPSCoalescer
+
+def usps_address(street, city='Lawrence', state='KS', zip_code='66044', unit=''):
+  return {'address': street, 'address_extended': unit, 'city': city, 'state': state, 'zip_code': zip_code}
+
+class SlowUSPS():
+  def __init__(self, answers):
+    self.answers = list(answers)
+    self.calls = []
+    self.release = threading.Event()
+
+  def fetch(self, addresses):
+    self.calls.append([address['address'] for address in addresses])
+    self.release.wait(5)
+    answer = self.answers.pop(0)
+    if isinstance(answer, Exception):
+      raise answer
+    return answer and [OrderedDict([('address', address['address'].upper())]) for address in addresses]
+
+def verify_concurrently(coalescer, usps, addresses):
+  results = [None] * len(addresses)
+  def verify(i):
+    try:
+      results[i] = coalescer.verify([addresses[i]])
+    except Exception as err:
+      results[i] = err
+  threads = [threading.Thread(target=verify, args=(i,)) for i in range(len(addresses))]
+  for thread in threads:
+    thread.start()
+  # every caller has joined the call in flight before USPS answers
+  deadline = time.time() + 5
+  while coalescer.stats()['shared_lookups'] < len(addresses) - 1 and time.time() < deadline:
+    time.sleep(0.005)
+  usps.release.set()
+  for thread in threads:
+    thread.join()
+  return results
+
+def test_identical_lookups_share_one_usps_call():
+  usps = SlowUSPS([True, True])
+  coalescer = USPSCoalescer(usps.fetch, window=0.01)
+  # the same address spelled two ways
+  addresses = [usps_address('707 Vermont Street')] * 4 + [usps_address('707 VERMONT ST', zip_code='66044-1234')]
+  results = verify_concurrently(coalescer, usps, addresses)
+  assert usps.calls == [['707 Vermont Street']]
+  assert all(result == [OrderedDict([('address', '707 VERMONT STREET')])] for result in results)
+  assert coalescer.stats()['direct_calls'] == 1 and coalescer.stats()['batches'] == 0
+  # once answered, the next lookup asks again
+  assert coalescer.verify([usps_address('707 Vermont St')]) == [OrderedDict([('address', '707 VERMONT ST')])]
+  assert len(usps.calls) == 2
+
+def test_a_failed_call_reaches_every_waiter_and_is_not_kept():
+  usps = SlowUSPS([ConnectionError('USPS down'), True])
+  coalescer = USPSCoalescer(usps.fetch, window=0.01)
+  results = verify_concurrently(coalescer, usps, [usps_address('707 Vermont St')] * 3)
+  assert len(usps.calls) == 1
+  # the caller that made the call sees the error, the ones waiting on it see USPS unreachable
+  assert sorted(repr(result) for result in results) == ['ConnectionError(\'USPS down\')', 'False', 'False']
+  assert coalescer.in_flight == {}
+  assert coalescer.verify([usps_address('707 Vermont St')]) == [OrderedDict([('address', '707 VERMONT ST')])]
+  assert len(usps.calls) == 2
+
+def test_distinct_lookups_arriving_together_are_batched():
+  usps = SlowUSPS([True, True])
+  coalescer = USPSCoalescer(usps.fetch, window=0.05, batch_size=5)
+  first = threading.Thread(target=coalescer.verify, args=([usps_address('1 Main St')],))
+  first.start()
+  while not usps.calls:
+    time.sleep(0.005)
+  results = [None] * 3
+  def verify(i):
+    results[i] = coalescer.verify([usps_address('%s Elm St' %(i + 2))])
+  threads = [threading.Thread(target=verify, args=(i,)) for i in range(3)]
+  for thread in threads:
+    thread.start()
+  # USPS answers once the batch has gone out behind the first call
+  while len(usps.calls) < 2:
+    time.sleep(0.005)
+  usps.release.set()
+  for thread in threads + [first]:
+    thread.join()
+  assert usps.calls[0] == ['1 Main St'] and sorted(usps.calls[1]) == ['2 Elm St', '3 Elm St', '4 Elm St']
+  assert results == [[OrderedDict([('address', '%s ELM ST' %(i + 2))])] for i in range(3)]
+  assert coalescer.stats()['batches'] == 1 and coalescer.stats()['avg_batch_size'] == 3.0
@@ -0,0 +1,45 @@
+from app.services.voter_index import VOTER_FILE_COLUMNS, VoterIndex, build_voter_index
+
+COLUMNS = ['first', 'last', 'dob', 'zip5', 'address_nbr', 'registrant_id', 'county', 'party', 'reg_date', 'status']
+
+def write_voter_file(path, rows):
+  with open(path, 'w', encoding='latin-1') as f:
+    f.write('\t'.join(VOTER_FILE_COLUMNS[column] for column in COLUMNS) + '\n')
+    for row in rows:
+      f.write('\t'.join(row) + '\n')
+
+JANE = ['Jane', "O'Neil", '01/02/1990', '66044', '707', 'KS1', 'Douglas', 'Democratic', '2008-09-30', 'A']
+# the same name and birthday registered in another county
+JANE_TOPEKA = ['JANE', 'ONEIL', '1990-01-02', '66603', '12', 'KS2', 'Shawnee', 'Unaffiliated', '2012-01-05', 'A']
+BOB = ['Bob', 'Smith', '03/04/1985', '66044', '9', 'KS3', 'Douglas', 'Republican', '2001-02-03', 'I']
+
+def test_build_then_lookup(tmp_path):
+  source = str(tmp_path / 'voters.txt')
+  dest = str(tmp_path / 'voters.sqlite')
+  write_voter_file(source, [JANE, JANE_TOPEKA, BOB])
+  assert build_voter_index(source, dest)['rows'] == 3
+
+  index = VoterIndex(dest)
+  records = index.lookup('Jane', 'oneil', '1/2/1990', '66044-1234')
+  assert len(records) == 1
+  assert records[0]['tree']['County'] == 'Douglas' and records[0]['tree']['Status'] == 'Active'
+  # without a zip both registrations come back
+  assert len(index.lookup('Jane', "O'Neil", '01/02/1990')) == 2
+  # inactive registrations and people not in the file are left to VoterView
+  assert index.lookup('Bob', 'Smith', '03/04/1985', '66044') is None
+  assert index.lookup('Sam', 'Smith', '03/04/1985', '66044') is None
+  assert index.stats()['hits'] == 2 and index.stats()['misses'] == 2
+
+def test_rebuild_is_picked_up_by_an_open_index(tmp_path):
+  source = str(tmp_path / 'voters.txt')
+  dest = str(tmp_path / 'voters.sqlite')
+  write_voter_file(source, [JANE, BOB])
+  build_voter_index(source, dest)
+  index = VoterIndex(dest)
+  assert index.lookup('Bob', 'Smith', '03/04/1985') is None
+
+  # Bob is reactivated and Jane moves away
+  write_voter_file(source, [BOB[:-1] + ['A']])
+  build_voter_index(source, dest)
+  assert index.lookup('Bob', 'Smith', '03/04/1985')[0]['tree']['Party'] == 'Republican'
+  assert index.lookup('Jane', "O'Neil", '01/02/1990') is None
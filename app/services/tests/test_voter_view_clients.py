@@ -0,0 +1,70 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from flask import Flask
+from app.services import voter_view_clients
+from app.services.voter_view_clients import VoterViewClients
+
+class FakeMyVoteInfo():
+  def __init__(self, state='ks', url='https://voterview.example.com/'):
+    self.url = url
+    self.session = requests.Session()
+
+class LookupHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def do_POST(self):
+    self.rfile.read(int(self.headers.get('Content-Length', 0)))
+    body = b'<html>found</html>'
+    self.send_response(200)
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+def mounted(kmvi):
+  return kmvi.session.get_adapter('https://voterview.example.com/')
+
+def test_one_adapter_per_provider_under_concurrency(monkeypatch):
+  monkeypatch.setattr(voter_view_clients.myvoteinfo, 'MyVoteInfo', FakeMyVoteInfo)
+  clients = VoterViewClients(connect_timeout=1, read_timeout=2)
+  created = []
+  def lookup():
+    created.append(clients.client(state='ar', url='https://ar.example.com/'))
+  with Flask(__name__).app_context():
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    other = clients.client()
+  adapters = set(id(mounted(kmvi)) for kmvi in created)
+  assert len(adapters) == 1 and len(clients.adapters) == 2
+  assert mounted(other) is not mounted(created[0])
+  assert mounted(other).timeout == (1, 2)
+
+def test_lookups_reuse_the_pooled_connection(monkeypatch):
+  server = ThreadingHTTPServer(('127.0.0.1', 0), LookupHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  url = 'http://127.0.0.1:%s/voterview' %(server.server_address[1])
+  monkeypatch.setattr(voter_view_clients.myvoteinfo, 'MyVoteInfo', FakeMyVoteInfo)
+  clients = VoterViewClients()
+  with Flask(__name__).app_context():
+    for _ in range(5):
+      # a new lookup client each time, as Step_0 makes
+      assert clients.client(url=url).session.post(url, data={'name': 'x'}).text == '<html>found</html>'
+  assert clients.stats()['ks %s' %(url)] == {'requests': 5, 'connections': 1, 'reuse_rate': 0.8}
+  server.shutdown()
+  server.server_close()
+
+def test_forked_worker_gets_fresh_pools(monkeypatch):
+  monkeypatch.setattr(voter_view_clients.myvoteinfo, 'MyVoteInfo', FakeMyVoteInfo)
+  clients = VoterViewClients()
+  with Flask(__name__).app_context():
+    parent = mounted(clients.client())
+    assert mounted(clients.client()) is parent
+    monkeypatch.setattr(voter_view_clients.os, 'getpid', lambda: clients.pid + 1)
+    child = mounted(clients.client())
+  assert child is not parent and clients.adapters == {('ks', 'https://voterview.example.com/'): child}
@@ -0,0 +1,70 @@
+import gzip
+import pytest
+from app.services.zip_index import ZipIndex, read_zip_source, write_zip_file
+
+ROWS = [
+  ('66044', 'Lawrence', 'KS', 'Douglas County'),
+  ('66046', 'Lawrence', 'KS', 'Douglas County'),
+  ('64101', 'Kansas City', 'MO', 'Jackson County'),
+  ('66101', 'Kansas City', 'KS', 'Wyandotte County'),
+  # a ZIP shared by two places
+  ('66049', 'Lawrence', 'KS', 'Douglas County'),
+  ('66049', 'Lecompton', 'KS', 'Douglas County'),
+  # and one that straddles counties
+  ('66012', 'Bonner Springs', 'KS', 'Wyandotte County'),
+  ('66012', 'Bonner Springs', 'KS', 'Leavenworth County'),
+]
+
+def test_lookup_finds_every_row_of_a_zip():
+  index = ZipIndex.from_rows(ROWS)
+  assert index.lookup('66049') == [('LAWRENCE', 'KS', 'Douglas County'), ('LECOMPTON', 'KS', 'Douglas County')]
+  assert index.lookup('66044-1234') == [('LAWRENCE', 'KS', 'Douglas County')]
+  assert index.lookup('99999') == [] and index.lookup('abcde') == []
+  assert len(index) == 8 and index.stats()['cities'] == 5
+
+def test_county_is_only_given_when_the_zip_has_one():
+  index = ZipIndex.from_rows(ROWS)
+  assert index.county('66049') == 'Douglas County'
+  assert index.county('66101-0001') == 'Wyandotte County'
+  assert index.county('66012') is None and index.county('99999') is None
+
+def test_cities_with_prefix():
+  index = ZipIndex.from_rows(ROWS)
+  assert index.cities_with_prefix('kan') == [('KANSAS CITY', 'KS'), ('KANSAS CITY', 'MO')]
+  assert index.cities_with_prefix('Kan', state='mo') == [('KANSAS CITY', 'MO')]
+  assert index.cities_with_prefix('L', limit=1) == [('LAWRENCE', 'KS')]
+  assert index.cities_with_prefix('Topeka') == []
+
+def test_mismatch_rejects_only_known_inconsistencies():
+  index = ZipIndex.from_rows(ROWS)
+  assert index.mismatch('Lawrence', 'ks', '66044') is None
+  assert index.mismatch('Lawrence', 'MO', '66044') == 'zip 66044 is not in MO'
+  # a city the index knows, in the wrong ZIP
+  assert index.mismatch('Kansas City', 'KS', '66044') == 'zip 66044 is not in KANSAS CITY'
+  # names it has never seen, and ZIPs it does not have, are left to USPS
+  assert index.mismatch('West Lawrence', 'KS', '66044') is None
+  assert index.mismatch('Anywhere', 'KS', '99999') is None
+
+def test_loader_round_trip(tmp_path):
+  source = tmp_path / 'zipcodes.csv'
+  source.write_text('Zipcode,Primary_City,State,County_Name\n'
+    '66044,Lawrence,KS,Douglas County\n601,Adjuntas,PR,Adjuntas\nn/a,Nowhere,KS,\n66044,Lawrence,KS,Douglas County\n')
+  rows = read_zip_source(str(source))
+  assert rows == [('66044', 'Lawrence', 'KS', 'Douglas County'), ('00601', 'Adjuntas', 'PR', 'Adjuntas'), ('66044', 'Lawrence', 'KS', 'Douglas County')]
+  path = str(tmp_path / 'zipcodes.csv.gz')
+  write_zip_file(rows, path)
+  index = ZipIndex.load(path)
+  assert len(index) == 2
+  # the source's unpadded ZIP comes back padded
+  assert index.lookup('00601') == [('ADJUNTAS', 'PR', 'Adjuntas')]
+
+def test_loader_reads_files_without_counties_and_rejects_missing_columns(tmp_path):
+  path = str(tmp_path / 'old.csv.gz')
+  with gzip.open(path, 'wt', encoding='utf-8') as f:
+    f.write('zip,city,state\n66044,LAWRENCE,KS\n')
+  index = ZipIndex.load(path)
+  assert index.lookup('66044') == [('LAWRENCE', 'KS', '')] and index.county('66044') is None
+  source = tmp_path / 'bad.csv'
+  source.write_text('zip,city,state\n66044,Lawrence,KS\n')
+  with pytest.raises(ValueError):
+    read_zip_source(str(source))
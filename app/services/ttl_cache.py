@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache():
+    """
+    Thread-safe LRU cache whose entries expire after a per-entry TTL.
+
+    When a path is given, entries are also written to a sqlite file so that every
+    worker process on the host shares one second tier. Values must be JSON serializable.
+    Writes delete the file's expired rows at most every sweep_interval seconds, whatever
+    their namespace, so rows left behind by an old namespace go too.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_size=1024, path=None, namespace='default', sweep_interval=60):
+        self.max_size = max_size
+        self.path = path
+        self.namespace = namespace
+        self.sweep_interval = sweep_interval
+        self.last_sweep = 0.0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+        if self.path:
+            self._execute('CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, expires REAL, PRIMARY KEY (namespace, key))')
+            self._execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+
+    def get(self, key):
+        """
+        Return the cached value for key, or TTLCache.MISSING if it is absent or expired.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(entry[0])
+                del self.entries[key]
+
+        row = self._fetch_from_disk(key, now)
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return self.MISSING
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        expires = now + ttl
+        serialized = json.dumps(value)
+        with self.lock:
+            self._remember(key, serialized, expires)
+            sweep = self.path and now - self.last_sweep >= self.sweep_interval
+            if sweep:
+                self.last_sweep = now
+        if self.path:
+            self._execute('INSERT OR REPLACE INTO cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, serialized, expires))
+        if sweep:
+            self.sweep(now)
+
+    def sweep(self, now=None):
+        """
+        Delete expired rows of every namespace from the disk tier.
+        """
+        if self.path:
+            self._execute('DELETE FROM cache WHERE expires <= ?', (now or time.time(),))
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.path:
+            self._execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.path:
+            self._execute('DELETE FROM cache WHERE namespace = ?', (self.namespace,))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'disk_errors': self.disk_errors,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, key, serialized, expires):
+        # caller holds self.lock
+        self.entries[key] = (serialized, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _fetch_from_disk(self, key, now):
+        if not self.path:
+            return None
+        rows = self._execute('SELECT value, expires FROM cache WHERE namespace = ? AND key = ? AND expires > ?',
+            (self.namespace, key, now))
+        return rows[0] if rows else None
+
+    def _connection(self):
+        # sqlite connections may not cross threads or forks, so keep one per thread per process
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def _execute(self, sql, params=()):
+        # the disk tier is best effort, a broken file must never fail the request
+        try:
+            conn = self._connection()
+            with conn:
+                return conn.execute(sql, params).fetchall()
+        except sqlite3.Error:
+            with self.lock:
+                self.disk_errors += 1
+            return []
@@ -1,7 +1,14 @@
 import os
+import time
 from pyusps import address_information
 from collections import OrderedDict
 from flask import current_app
+from app.services.address_cache import get_address_cache
+from app.services.address_parser import prevalidate, address_key
+from app.services.zip_index import get_zip_index
+from app.services.resilience import get_dependency
+from app.services.usps_coalescer import get_usps_coalescer
+from app.services.batch_runner import get_batch_runner
 
 class USPS_API():
     def __init__(self, address_payload = None):
@@ -78,16 +85,109 @@ class USPS_API():
             ]))
 
         current_app.logger.debug("Trying USPS address lookup")
-        results = self.verify_with_usps(addresses)
+        # a mailing address may be a PO box, only where the voter lives has to be residential
+        results = self.verify_with_usps(addresses, [name != 'mail_addr' for name in self.address_order])
         current_app.logger.debug("USPS API returned {}".format(results))
         if results:
             return self.marshall_address_results(results)
         else:
             return False
 
-    def verify_with_usps(self, addresses):
-        ### Needs to be in a try block for the usps verify method to not raise an error
+    def verify_with_usps(self, addresses, residential=None):
+        """
+        Verify the addresses of one form.
+        Returns an OrderedDict for a single valid address, a list of OrderedDict/ValueError for several, or False.
+        """
+        results = self.verify_many(addresses, residential)
+        if any(result is False for result in results):
+            return False
+        if len(results) == 1:
+            # a single invalid address has always been reported as a failed lookup
+            return results[0] if isinstance(results[0], OrderedDict) else False
+        return results
+
+    def verify_many(self, addresses, residential=None):
+        """
+        Verify any number of addresses, rejecting malformed ones and city/state/zip mismatches locally, answering from the
+        address cache where possible and asking USPS only for the rest.
+        residential has one flag per address, all True by default; addresses flagged False, such as mailing addresses,
+        skip the local checks, which would turn away PO boxes, and go to USPS as given.
+        Identical addresses are looked up once, and cache misses are packed into USPS multi-address requests that go
+        through the coalescer so concurrent requests share USPS calls.
+        Returns one OrderedDict, ValueError or False (USPS could not be reached) per address, in order.
+        """
+        cache = get_address_cache()
+        zip_index = get_zip_index()
+        if residential is None:
+            residential = [True] * len(addresses)
+        keys = [(address_key(address), bool(flag)) for address, flag in zip(addresses, residential)]
+        unique = OrderedDict()
+        for key, address in zip(keys, addresses):
+            unique.setdefault(key, address)
+        unique_addresses = list(unique.values())
+        checked = [address for (_, flag), address in unique.items() if flag]
+
+        results = []
+        parsed_checked = iter(prevalidate(checked))
+        for (_, flag), address in unique.items():
+            reason = None
+            if flag:
+                parsed = next(parsed_checked)
+                reason = parsed.reason if parsed.is_invalid else zip_index.mismatch(address.get('city'), address.get('state'), address.get('zip_code'))
+            if reason:
+                current_app.logger.debug("USPS lookup skipped, {}".format(reason))
+                results.append(ValueError(reason))
+            else:
+                results.append(cache.get(address))
+
+        missing = [i for i, result in enumerate(results) if result is cache.MISSING]
+        batch_size = min(int(current_app.config['USPS_BATCH_SIZE']), address_information.address_max)
+        chunks = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+        for chunk, fetched in self.fetch_chunks(chunks, unique_addresses):
+            for i, result in zip(chunk, fetched or [False] * len(chunk)):
+                if result is not False:
+                    cache.set(unique_addresses[i], result)
+                results[i] = result
+
+        by_key = dict(zip(unique.keys(), results))
+        return [by_key[key] for key in keys]
+
+    def fetch_chunks(self, chunks, addresses):
+        """
+        Yield (chunk, results) for each chunk of address indexes, fetching several chunks concurrently.
+        """
+        coalescer = get_usps_coalescer()
+        def fetch(chunk):
+            return coalescer.verify([addresses[i] for i in chunk])
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                yield chunk, fetch(chunk)
+            return
+        limit = int(current_app.config['USPS_MAX_CONCURRENT'])
+        for index, fetched, error in get_batch_runner().run(fetch, chunks, limit=limit):
+            if error is not None:
+                current_app.logger.warning("USPS lookup failed: %s" %(error))
+            yield chunks[index], fetched
+
+    def fetch_from_usps(self, addresses):
+        """
+        Call the USPS Verify API and return one OrderedDict or ValueError per address, or False if the call failed.
+        """
+        start = time.time()
+        # address-level errors come back as ValueError and say nothing about USPS health
+        usps = get_dependency('usps', is_failure=lambda err: not isinstance(err, ValueError))
         try:
-            return address_information.verify(self.usps_id, *addresses)
-        except:
+            results = usps.call(address_information.verify, self.usps_id, *addresses)
+        except ValueError as err:
+            # pyusps raises the address error itself when only one address was sent
+            if len(addresses) > 1:
+                return False
+            results = err
+        except Exception as err:
+            current_app.logger.warning("USPS lookup failed: %s" %(err))
             return False
+        get_address_cache().record_lookup(time.time() - start, len(addresses))
+
+        if isinstance(results, list):
+            return results
+        return [results]
@@ -0,0 +1,158 @@
+import threading
+from flask import current_app
+from pyusps import address_information
+from app.services.address_parser import address_key
+
+class PendingLookup():
+    def __init__(self, address, key):
+        self.address = address
+        self.key = key
+        self.result = False
+        self.done = threading.Event()
+
+class USPSCoalescer():
+    """
+    Collects address lookups arriving from concurrent requests within a short window and
+    sends them to USPS together, in batches of at most batch_size addresses.
+
+    When no other lookup is in progress the caller goes straight to USPS without waiting.
+    A lookup for an address already on its way to USPS waits for that call instead of
+    making another, and gets the same answer, including False when the call failed.
+    """
+
+    def __init__(self, fetch, window=0.015, batch_size=5, wait_timeout=30, key=address_key):
+        self.fetch = fetch
+        self.window = window
+        self.batch_size = batch_size
+        self.wait_timeout = wait_timeout
+        self.key = key
+        self.condition = threading.Condition()
+        self.pending = []
+        self.in_flight = {}
+        self.leader_waiting = False
+        self.active = 0
+        self.direct_calls = 0
+        self.batches = 0
+        self.batched_addresses = 0
+        self.shared = 0
+
+    def verify(self, addresses):
+        """
+        Return one OrderedDict or ValueError per address, or False if USPS could not be reached.
+        """
+        keys = [self.key(address) for address in addresses]
+        lookups, new = [], []
+        with self.condition:
+            for address, key in zip(addresses, keys):
+                lookup = self.in_flight.get(key)
+                if lookup is None:
+                    lookup = self.in_flight[key] = PendingLookup(address, key)
+                    new.append(lookup)
+                else:
+                    self.shared += 1
+                lookups.append(lookup)
+            idle = self.active == 0 or self.window <= 0
+            self.active += 1
+            if idle and new:
+                self.direct_calls += 1
+        try:
+            if idle:
+                self._fetch(new)
+            else:
+                self._coalesce(new)
+            return self._wait(lookups)
+        finally:
+            with self.condition:
+                self.active -= 1
+
+    def stats(self):
+        with self.condition:
+            return {
+                'direct_calls': self.direct_calls,
+                'batches': self.batches,
+                'batched_addresses': self.batched_addresses,
+                'avg_batch_size': round(self.batched_addresses / self.batches, 2) if self.batches else 0.0,
+                'shared_lookups': self.shared,
+            }
+
+    def _wait(self, lookups):
+        results = []
+        for lookup in lookups:
+            if not lookup.done.wait(self.wait_timeout):
+                return False
+            results.append(lookup.result)
+        if any(result is False for result in results):
+            return False
+        return results
+
+    def _fetch(self, lookups):
+        if not lookups:
+            return
+        results = False
+        try:
+            results = self.fetch([lookup.address for lookup in lookups])
+        finally:
+            if not results:
+                results = [False] * len(lookups)
+            # answered lookups leave in_flight first, so a failure is not handed to later callers
+            with self.condition:
+                for lookup in lookups:
+                    del self.in_flight[lookup.key]
+            for lookup, result in zip(lookups, results):
+                lookup.result = result
+                lookup.done.set()
+
+    def _coalesce(self, lookups):
+        if not lookups:
+            return
+        with self.condition:
+            self.pending.extend(lookups)
+            lead = not self.leader_waiting
+            if lead:
+                self.leader_waiting = True
+            elif len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+
+        if lead:
+            self._lead()
+
+    def _lead(self):
+        # wait out the window, or less if a full batch has already queued up
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.pending) >= self.batch_size, timeout=self.window)
+            batch, self.pending = self.pending, []
+            self.leader_waiting = False
+
+        error = None
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            with self.condition:
+                self.batches += 1
+                self.batched_addresses += len(chunk)
+            # every chunk is answered even if one raised, or its waiters would hang until wait_timeout
+            try:
+                self._fetch(chunk)
+            except Exception as err:
+                error = error or err
+        if error is not None:
+            raise error
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+def get_usps_coalescer():
+    """
+    Process-wide USPSCoalescer, configured from the app config on first use.
+    """
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                from app.services.usps_api import USPS_API
+                _coalescer = USPSCoalescer(
+                    fetch=lambda addresses: USPS_API().fetch_from_usps(addresses),
+                    window=int(current_app.config['USPS_COALESCE_WINDOW_MS']) / 1000.0,
+                    # the Verify API silently drops anything past its per-request maximum
+                    batch_size=min(int(current_app.config['USPS_BATCH_SIZE']), address_information.address_max),
+                )
+    return _coalescer
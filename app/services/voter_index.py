@@ -0,0 +1,191 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+
+# Kansas SoS voter file columns, as used by bin/match.py
+VOTER_FILE_COLUMNS = {
+    'first': 'text_name_first',
+    'last': 'text_name_last',
+    'dob': 'date_of_birth',
+    'zip5': 'text_res_zip5',
+    'address_nbr': 'text_res_address_nbr',
+    'registrant_id': 'text_registrant_id',
+    'county': 'db_logid',
+    'party': 'desc_party',
+    'reg_date': 'date_of_registration',
+    'status': 'cde_registrant_status',
+}
+STATUS_CODES = {'A': 'active', 'I': 'inactive', 'S': 'suspense', 'C': 'cancelled'}
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S']
+
+def normalize_name(name):
+    """
+    Same normalization bin/match.py applies to first_low/last_low.
+    """
+    return (name or '').strip(' "?').replace("'", '').lower()
+
+def normalize_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return ''
+
+def build_voter_index(source, dest, batch_size=50000):
+    """
+    Turn a tab-separated voter file into the sqlite index VoterIndex reads.
+
+    Rows are bulk loaded into a scratch table and then copied in key order into a WITHOUT ROWID
+    table whose primary key (last, first, dob, registrant id) is itself the covering index for
+    lookups. The file is built next to dest and swapped in atomically, so running workers move
+    to the new index on their next connection.
+    """
+    start = time.time()
+    tmp = dest + '.building'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('CREATE TABLE staging (last_low TEXT, first_low TEXT, dob TEXT, registrant_id TEXT, zip5 TEXT, address_nbr TEXT, county TEXT, party TEXT, reg_date TEXT, status TEXT)')
+
+    rows = 0
+    with open(source, encoding='latin-1', newline='') as f:
+        reader = csv.DictReader(f, delimiter='\t')
+        has_status = VOTER_FILE_COLUMNS['status'] in (reader.fieldnames or [])
+        batch = []
+        for record in reader:
+            def col(name):
+                return (record.get(VOTER_FILE_COLUMNS[name]) or '').strip()
+            status = STATUS_CODES.get(col('status').upper(), col('status').lower()) if has_status else 'active'
+            batch.append((
+                normalize_name(col('last')), normalize_name(col('first')), normalize_date(col('dob')),
+                col('registrant_id'), col('zip5')[:5], col('address_nbr'), col('county'), col('party'),
+                normalize_date(col('reg_date')), status,
+            ))
+            if len(batch) >= batch_size:
+                conn.executemany('INSERT INTO staging VALUES (?,?,?,?,?,?,?,?,?,?)', batch)
+                rows += len(batch)
+                batch = []
+        if batch:
+            conn.executemany('INSERT INTO staging VALUES (?,?,?,?,?,?,?,?,?,?)', batch)
+            rows += len(batch)
+
+    conn.execute('''CREATE TABLE voters (
+        last_low TEXT, first_low TEXT, dob TEXT, registrant_id TEXT,
+        zip5 TEXT, address_nbr TEXT, county TEXT, party TEXT, reg_date TEXT, status TEXT,
+        PRIMARY KEY (last_low, first_low, dob, registrant_id)) WITHOUT ROWID''')
+    conn.execute('INSERT OR REPLACE INTO voters SELECT * FROM staging ORDER BY last_low, first_low, dob, registrant_id')
+    conn.execute('DROP TABLE staging')
+    conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+        ('source', os.path.basename(source)),
+        ('rows', str(rows)),
+        ('built_at', datetime.utcnow().isoformat()),
+    ])
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+    os.replace(tmp, dest)
+    return {'rows': rows, 'seconds': round(time.time() - start, 2), 'bytes': os.path.getsize(dest)}
+
+class VoterIndex():
+    """
+    Read-only view of a voter file index built by build_voter_index.
+
+    Only active registrations are answered locally; anything else is treated as a miss so the
+    caller asks VoterView, which knows about changes made since the file was pulled.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.query_seconds = 0.0
+
+    def lookup(self, name_first, name_last, dob, zipcode=None):
+        """
+        Return VoterView-shaped records for an active registration matching name and dob
+        (mm/dd/yyyy), preferring ones at zipcode; None on a miss.
+        """
+        start = time.time()
+        rows = self._connection().execute(
+            'SELECT zip5, county, party, reg_date, status FROM voters WHERE last_low = ? AND first_low = ? AND dob = ?',
+            (normalize_name(name_last), normalize_name(name_first), normalize_date(dob))
+        ).fetchall()
+        rows = [row for row in rows if row[4] == 'active']
+        if zipcode and len(rows) > 1:
+            rows = [row for row in rows if row[0] == zipcode[:5]] or rows
+
+        with self.lock:
+            self.query_seconds += time.time() - start
+            if rows:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not rows:
+            return None
+        return [self._as_record(row) for row in rows]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'hits': self.hits,
+                'misses': self.misses,
+                'avg_query_us': round(self.query_seconds * 1000000 / lookups, 1) if lookups else 0.0,
+            }
+
+    def _as_record(self, row):
+        zip5, county, party, reg_date, status = row
+        return {
+            'tree': OrderedDict([
+                ('Status', status.title()),
+                ('County', county),
+                ('Party', party),
+                ('Registration Date', reg_date),
+            ]),
+            'polling': [],
+            'sample_ballot': [],
+            'districts': [],
+            'elections': [],
+            'source': 'voter_file',
+        }
+
+    def _connection(self):
+        # reconnect when the file was rebuilt (new inode) or after a fork
+        inode = os.stat(self.path).st_ino
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid() or self.local.inode != inode:
+            conn = sqlite3.connect('file:%s?mode=ro' %(self.path), uri=True)
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+            self.local.inode = inode
+        return conn
+
+_voter_index = None
+_voter_index_lock = threading.Lock()
+
+def get_voter_index():
+    """
+    Process-wide VoterIndex for VOTER_INDEX_PATH, or None when no index has been built.
+    """
+    global _voter_index
+    path = current_app.config['VOTER_INDEX_PATH']
+    if not path or not os.path.exists(path):
+        return None
+    if _voter_index is None:
+        with _voter_index_lock:
+            if _voter_index is None:
+                _voter_index = VoterIndex(path)
+    return _voter_index
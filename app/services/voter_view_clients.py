@@ -0,0 +1,116 @@
+import os
+import threading
+import myvoteinfo
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default (connect, read) timeout to every request sent through it.
+    """
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super(TimeoutHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super(TimeoutHTTPAdapter, self).send(request, **kwargs)
+
+class VoterViewClients():
+    """
+    Process-wide registry of keep-alive connection pools for the registration lookup providers,
+    keyed by (state, url).
+
+    MyVoteInfo objects are still built per lookup, since each one carries its own cookies and
+    page state, but their sessions are given the shared adapter for their provider so TCP and
+    TLS connections are reused across lookups. A forked worker starts with fresh pools rather
+    than sharing the parent's sockets.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3, read_timeout=10):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapters = {}
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def client(self, state=None, url=None):
+        kwargs = {}
+        if state:
+            kwargs['state'] = state
+        if url:
+            kwargs['url'] = url
+        kmvi = myvoteinfo.MyVoteInfo(**kwargs)
+
+        session = self._find_session(kmvi)
+        if session is not None:
+            adapter = self.adapter(state, kmvi.url)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        else:
+            current_app.logger.debug("no requests session on %s lookup client, not pooled" %(kmvi.url))
+        return kmvi
+
+    def adapter(self, state, url):
+        key = (state or 'ks', url)
+        with self.lock:
+            if self.pid != os.getpid():
+                self.adapters = {}
+                self.pid = os.getpid()
+            if key not in self.adapters:
+                self.adapters[key] = TimeoutHTTPAdapter(
+                    timeout=self.timeout,
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    # only retry failed connects, a lookup is a form POST and must not be replayed
+                    max_retries=Retry(total=1, connect=1, read=0, status=0),
+                )
+            return self.adapters[key]
+
+    def stats(self):
+        stats = {}
+        with self.lock:
+            adapters = list(self.adapters.items())
+        for (state, url), adapter in adapters:
+            connections = 0
+            sent = 0
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    sent += pool.num_requests
+            stats['%s %s' %(state, url)] = {
+                'requests': sent,
+                'connections': connections,
+                'reuse_rate': round(1 - connections / sent, 4) if sent else 0.0,
+            }
+        return stats
+
+    def _find_session(self, kmvi):
+        # MyVoteInfo drives either a requests.Session directly or a RoboBrowser wrapping one
+        for holder in [kmvi, getattr(kmvi, 'browser', None)]:
+            session = getattr(holder, 'session', None)
+            if isinstance(session, requests.Session):
+                return session
+        return None
+
+_clients = None
+_clients_lock = threading.Lock()
+
+def get_voter_view_clients():
+    global _clients
+    if _clients is None:
+        with _clients_lock:
+            if _clients is None:
+                config = current_app.config
+                _clients = VoterViewClients(
+                    pool_size=int(config['VOTER_VIEW_POOL_SIZE']),
+                    connect_timeout=float(config['VOTER_VIEW_CONNECT_TIMEOUT']),
+                    read_timeout=float(config['VOTER_VIEW_READ_TIMEOUT']),
+                )
+    return _clients
@@ -0,0 +1,220 @@
+import csv
+import gzip
+import io
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from flask import current_app
+from app.services.address_parser import normalize_part
+
+class ZipIndex():
+    """
+    Compact in-memory index of ZIP code -> (city, state, county), plus a sorted city index
+    for prefix searches.
+
+    Rows are held in parallel arrays sorted by ZIP; city, state and county names are
+    interned once in small lookup tables, so a full national file stays a few megabytes.
+    """
+
+    def __init__(self):
+        self.zips = array('I')
+        self.city_ids = array('I')
+        self.state_ids = array('H')
+        self.county_ids = array('I')
+        self.cities = []
+        self.states = []
+        self.counties = []
+        self.city_keys = []
+        self.load_seconds = 0.0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build an index from (zip, city, state, county) tuples in any order.
+        """
+        index = cls()
+        city_lookup, state_lookup, county_lookup = {}, {}, {}
+        def intern(lookup, table, value):
+            if value not in lookup:
+                lookup[value] = len(table)
+                table.append(value)
+            return lookup[value]
+
+        for zip_code, city, state, county in sorted(rows, key=lambda row: row[0]):
+            index.zips.append(int(zip_code))
+            index.city_ids.append(intern(city_lookup, index.cities, normalize_part(city)))
+            index.state_ids.append(intern(state_lookup, index.states, normalize_part(state)))
+            index.county_ids.append(intern(county_lookup, index.counties, (county or '').strip()))
+
+        index.city_keys = sorted(set(
+            index.cities[city_id] + '|' + index.states[state_id]
+            for city_id, state_id in zip(index.city_ids, index.state_ids)
+        ))
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the bundled gzipped CSV (zip,city,state,county) written by `manage.py load_zipcodes`;
+        files written without the county column load with no counties.
+        """
+        start = time.time()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            index = cls.from_rows((row[0], row[1], row[2], row[3] if len(row) >= 4 else '') for row in reader if len(row) >= 3)
+        index.load_seconds = time.time() - start
+        return index
+
+    def __len__(self):
+        return len(self.zips)
+
+    def lookup(self, zip_code):
+        """
+        Return a list of (city, state, county) tuples for zip_code, empty if it is unknown.
+        """
+        try:
+            zip_int = int(str(zip_code)[:5])
+        except ValueError:
+            return []
+        lo = bisect_left(self.zips, zip_int)
+        hi = bisect_right(self.zips, zip_int, lo)
+        return [
+            (self.cities[self.city_ids[i]], self.states[self.state_ids[i]], self.counties[self.county_ids[i]])
+            for i in range(lo, hi)
+        ]
+
+    def county(self, zip_code):
+        """
+        The county for zip_code, or None when it is unknown or the ZIP straddles counties.
+        """
+        counties = set(row[2] for row in self.lookup(zip_code))
+        if len(counties) == 1:
+            return counties.pop() or None
+        return None
+
+    def cities_with_prefix(self, prefix, state=None, limit=20):
+        """
+        Return up to limit (city, state) pairs whose city starts with prefix.
+        """
+        prefix = normalize_part(prefix)
+        matches = []
+        for key in self.city_keys[bisect_left(self.city_keys, prefix):]:
+            if not key.startswith(prefix) or len(matches) >= limit:
+                break
+            city, city_state = key.split('|')
+            if state is None or city_state == normalize_part(state):
+                matches.append((city, city_state))
+        return matches
+
+    def _knows_city(self, city, state):
+        key = normalize_part(city) + '|' + normalize_part(state)
+        i = bisect_left(self.city_keys, key)
+        return i < len(self.city_keys) and self.city_keys[i] == key
+
+    def mismatch(self, city, state, zip_code):
+        """
+        Return a reason string if the city/state/zip combination is known to be inconsistent, otherwise None.
+
+        Cities the index has never seen (alternate or vanity names) are left for USPS to judge.
+        """
+        rows = self.lookup(zip_code)
+        if not rows:
+            return None
+        state = normalize_part(state)
+        if state not in set(row[1] for row in rows):
+            return 'zip {} is not in {}'.format(zip_code, state)
+        city = normalize_part(city)
+        if self._knows_city(city, state) and city not in set(row[0] for row in rows):
+            return 'zip {} is not in {}'.format(zip_code, city)
+        return None
+
+    def memory_bytes(self):
+        """
+        Approximate footprint of the index structures.
+        """
+        size = sum(a.buffer_info()[1] * a.itemsize for a in [self.zips, self.city_ids, self.state_ids, self.county_ids])
+        for strings in [self.cities, self.states, self.counties, self.city_keys]:
+            size += sys.getsizeof(strings) + sum(sys.getsizeof(s) for s in strings)
+        return size
+
+    def stats(self):
+        return {
+            'zips': len(self.zips),
+            'cities': len(self.city_keys),
+            'load_ms': round(self.load_seconds * 1000, 1),
+            'memory_kb': round(self.memory_bytes() / 1024, 1),
+        }
+
+# accepted spellings of each column in a source CSV
+SOURCE_COLUMNS = {
+    'zip': ['zip', 'zipcode', 'zip_code'],
+    'city': ['city', 'primary_city'],
+    'state': ['state', 'state_abbr'],
+    'county': ['county', 'county_name'],
+}
+
+def read_zip_source(path):
+    """
+    (zip, city, state, county) rows of a source CSV with a header naming its columns; other
+    columns are ignored, and rows whose ZIP is not a number are skipped.
+    """
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        header = dict((name.lower().strip(), name) for name in reader.fieldnames)
+        fields = {}
+        for key, choices in SOURCE_COLUMNS.items():
+            found = [header[choice] for choice in choices if choice in header]
+            if not found:
+                raise ValueError("{} has no {} column".format(path, key))
+            fields[key] = found[0]
+        for row in reader:
+            zip_code = row[fields['zip']].strip().zfill(5)
+            if zip_code.isdigit():
+                rows.append((zip_code, row[fields['city']].strip(), row[fields['state']].strip(), row[fields['county']].strip()))
+    return rows
+
+def write_zip_file(rows, path):
+    """
+    Write (zip, city, state, county) rows in the compact sorted format ZipIndex.load reads.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(['zip', 'city', 'state', 'county'])
+    for row in sorted(set(rows)):
+        writer.writerow(row)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(buf.getvalue())
+
+_zip_index = None
+_zip_index_lock = threading.Lock()
+
+def get_zip_index():
+    """
+    Process-wide ZipIndex loaded from ZIP_INDEX_PATH on first use.
+
+    A missing file, or one whose index would exceed ZIP_INDEX_MAX_MB, leaves the index empty so
+    every check falls through to USPS.
+    """
+    global _zip_index
+    if _zip_index is None:
+        with _zip_index_lock:
+            if _zip_index is None:
+                path = current_app.config['ZIP_INDEX_PATH']
+                index = ZipIndex()
+                if path and os.path.exists(path):
+                    index = ZipIndex.load(path)
+                    max_bytes = float(current_app.config['ZIP_INDEX_MAX_MB']) * 1024 * 1024
+                    if index.memory_bytes() > max_bytes:
+                        current_app.logger.error("zip index at %s exceeds ZIP_INDEX_MAX_MB, not using it" %(path))
+                        index = ZipIndex()
+                    else:
+                        current_app.logger.info("zip index loaded %s" %(index.stats()))
+                else:
+                    current_app.logger.warning("no zip index at %s, run make load-zipcodes" %(path))
+                _zip_index = index
+    return _zip_index
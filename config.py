@@ -16,6 +16,11 @@ class Config:
     AWS_DEFAULT_REGION = os.getenv('AWS_DEFAULT_REGION')
     SES_ACCESS_KEY_ID = os.getenv('SES_ACCESS_KEY_ID')
     SES_SECRET_ACCESS_KEY = os.getenv('SES_SECRET_ACCESS_KEY')
+    SES_ENDPOINT_URL = os.getenv('SES_ENDPOINT_URL', '')
+    SES_MAX_POOL_CONNECTIONS = os.getenv('SES_MAX_POOL_CONNECTIONS', '10')
+    SES_MAX_ATTEMPTS = os.getenv('SES_MAX_ATTEMPTS', '3')
+    SES_CONNECT_TIMEOUT = os.getenv('SES_CONNECT_TIMEOUT', '5')
+    SES_READ_TIMEOUT = os.getenv('SES_READ_TIMEOUT', '10')
     SEND_EMAIL = os.getenv('SEND_EMAIL')
     SSL_DISABLE = os.getenv('SSL_DISABLE', False)
     SESSION_TTL = os.getenv('SESSION_TTL', '10')
@@ -25,6 +30,81 @@ class Config:
     ENABLE_VOTING_LOCATION = os.getenv('ENABLE_VOTING_LOCATION', False)
     FAIL_EMAIL = os.getenv('FAIL_EMAIL', 'fail@ksvotes.org')
     STAGE_BANNER = os.getenv('STAGE_BANNER', False)
+    ADDRESS_CACHE_SIZE = os.getenv('ADDRESS_CACHE_SIZE', '2048')
+    ADDRESS_CACHE_TTL = os.getenv('ADDRESS_CACHE_TTL', '86400')
+    ADDRESS_CACHE_NEGATIVE_TTL = os.getenv('ADDRESS_CACHE_NEGATIVE_TTL', '600')
+    ADDRESS_CACHE_PATH = os.getenv('ADDRESS_CACHE_PATH', None)
+    USPS_COALESCE_WINDOW_MS = os.getenv('USPS_COALESCE_WINDOW_MS', '15')
+    USPS_BATCH_SIZE = os.getenv('USPS_BATCH_SIZE', '5')
+    ZIP_INDEX_PATH = os.getenv('ZIP_INDEX_PATH', 'app/data/zipcodes.csv.gz')
+    ZIP_INDEX_MAX_MB = os.getenv('ZIP_INDEX_MAX_MB', '16')
+    USPS_TIMEOUT = os.getenv('USPS_TIMEOUT', '5')
+    USPS_MAX_CONCURRENT = os.getenv('USPS_MAX_CONCURRENT', '10')
+    VOTER_VIEW_TIMEOUT = os.getenv('VOTER_VIEW_TIMEOUT', '10')
+    VOTER_VIEW_MAX_CONCURRENT = os.getenv('VOTER_VIEW_MAX_CONCURRENT', '10')
+    VOTER_VIEW_POOL_SIZE = os.getenv('VOTER_VIEW_POOL_SIZE', '10')
+    VOTER_VIEW_CONNECT_TIMEOUT = os.getenv('VOTER_VIEW_CONNECT_TIMEOUT', '3')
+    VOTER_VIEW_READ_TIMEOUT = os.getenv('VOTER_VIEW_READ_TIMEOUT', '10')
+    LOOKUP_HEDGE_MS = os.getenv('LOOKUP_HEDGE_MS', '2000')
+    LOOKUP_MAX_HEDGES = os.getenv('LOOKUP_MAX_HEDGES', '1')
+    LOOKUP_WORKERS = os.getenv('LOOKUP_WORKERS', '20')
+    BATCH_WORKERS = os.getenv('BATCH_WORKERS', '32')
+    REGISTERED_BATCH_MAX = os.getenv('REGISTERED_BATCH_MAX', '50')
+    REGISTERED_BATCH_CONCURRENCY = os.getenv('REGISTERED_BATCH_CONCURRENCY', '8')
+    ADDRESS_BATCH_MAX = os.getenv('ADDRESS_BATCH_MAX', '100')
+    REGISTRATION_CACHE_SALT = os.getenv('REGISTRATION_CACHE_SALT', None)
+    REGISTRATION_CACHE_TTL = os.getenv('REGISTRATION_CACHE_TTL', '900')
+    REGISTRATION_CACHE_NOT_FOUND_TTL = os.getenv('REGISTRATION_CACHE_NOT_FOUND_TTL', '120')
+    REGISTRATION_CACHE_SIZE = os.getenv('REGISTRATION_CACHE_SIZE', '4096')
+    REGISTRATION_CACHE_PATH = os.getenv('REGISTRATION_CACHE_PATH', None)
+    VOTER_INDEX_PATH = os.getenv('VOTER_INDEX_PATH', None)
+    GMAIL_TIMEOUT = os.getenv('GMAIL_TIMEOUT', '10')
+    GMAIL_MAX_CONCURRENT = os.getenv('GMAIL_MAX_CONCURRENT', '5')
+    GMAIL_TOKEN_PATH = os.getenv('GMAIL_TOKEN_PATH', 'token.pickle')
+    GMAIL_REFRESH_MARGIN_SECONDS = os.getenv('GMAIL_REFRESH_MARGIN_SECONDS', '300')
+    GMAIL_API_ENDPOINT = os.getenv('GMAIL_API_ENDPOINT', '')
+    # messages.send costs 100 of the 250 quota units per user per second
+    GMAIL_SEND_RATE = os.getenv('GMAIL_SEND_RATE', '2')
+    GMAIL_SEND_BURST = os.getenv('GMAIL_SEND_BURST', '5')
+    BULK_SEND_WORKERS = os.getenv('BULK_SEND_WORKERS', '4')
+    BULK_SEND_ATTEMPTS = os.getenv('BULK_SEND_ATTEMPTS', '3')
+    BULK_SEND_BACKOFF_SECONDS = os.getenv('BULK_SEND_BACKOFF_SECONDS', '2')
+    # messages per Gmail API batch request in bulk sends; 1 sends them one request at a time
+    GMAIL_BATCH_SIZE = os.getenv('GMAIL_BATCH_SIZE', '20')
+    CHALLENGE_SWEEP_PAGE_SIZE = os.getenv('CHALLENGE_SWEEP_PAGE_SIZE', '500')
+    # the sweep day is cut into SWEEP_PARTITIONS time ranges, SWEEP_PARALLELISM of them read at once
+    SWEEP_PARTITIONS = os.getenv('SWEEP_PARTITIONS', '8')
+    SWEEP_PARALLELISM = os.getenv('SWEEP_PARALLELISM', '4')
+    SWEEP_LEDGER_PATH = os.getenv('SWEEP_LEDGER_PATH', 'sweep-ledger.sqlite3')
+    SWEEP_CLAIM_TTL_SECONDS = os.getenv('SWEEP_CLAIM_TTL_SECONDS', '3600')
+    SWEEP_LEDGER_DAYS = os.getenv('SWEEP_LEDGER_DAYS', '14')
+    FIREBASE_CREDENTIALS = os.getenv('FIREBASE_CREDENTIALS', 'by8-318322-9aac6ae02900.json')
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'false')
+    SCHEDULER_LOCK_PATH = os.getenv('SCHEDULER_LOCK_PATH', 'scheduler.lock')
+    SCHEDULER_JITTER_SECONDS = os.getenv('SCHEDULER_JITTER_SECONDS', '30')
+    # UTC; 07:15 is just after midnight PST, and the scheduled sweep covers the PST day that just ended
+    CHALLENGE_SWEEP_CRON = os.getenv('CHALLENGE_SWEEP_CRON', '15 7 * * *')
+    CACHE_WARMUP_SECONDS = os.getenv('CACHE_WARMUP_SECONDS', '600')
+    TEMPLATE_REFRESH_SECONDS = os.getenv('TEMPLATE_REFRESH_SECONDS', '60')
+    EMAIL_IMAGE_PRELOAD = os.getenv('EMAIL_IMAGE_PRELOAD', 'img/*.png')
+    SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+    SMTP_PORT = os.getenv('SMTP_PORT', '465')
+    SMTP_SSL = os.getenv('SMTP_SSL', 'true')
+    SMTP_USERNAME = os.getenv('FROM_EMAIL')
+    SMTP_PASSWORD = os.getenv('EMAIL_PWD')
+    SMTP_POOL_SIZE = os.getenv('SMTP_POOL_SIZE', '2')
+    SMTP_MAX_MESSAGES = os.getenv('SMTP_MAX_MESSAGES', '100')
+    SMTP_NOOP_AFTER_SECONDS = os.getenv('SMTP_NOOP_AFTER_SECONDS', '30')
+    SMTP_TIMEOUT = os.getenv('SMTP_TIMEOUT', '10')
+    # transports each kind of email is sent on, in priority order; name:priority gives several the same one
+    EMAIL_ROUTE = os.getenv('EMAIL_ROUTE', 'gmail,smtp')
+    MAILER_ROUTE = os.getenv('MAILER_ROUTE', 'ses,smtp')
+    EMAIL_FILE_DIR = os.getenv('EMAIL_FILE_DIR', 'outbox')
+    EMAIL_ROUTE_DECAY = os.getenv('EMAIL_ROUTE_DECAY', '0.2')
+    EMAIL_ROUTE_MAX_ERROR_RATE = os.getenv('EMAIL_ROUTE_MAX_ERROR_RATE', '0.5')
+    EMAIL_ROUTE_SLOW_MS = os.getenv('EMAIL_ROUTE_SLOW_MS', '5000')
+    BREAKER_FAILURE_THRESHOLD = os.getenv('BREAKER_FAILURE_THRESHOLD', '5')
+    BREAKER_RESET_SECONDS = os.getenv('BREAKER_RESET_SECONDS', '30')
 
     @staticmethod
     def init_app(app):
@@ -49,6 +49,20 @@ def generate_demo_uuid():
     print('DEMO_UUID="{}"'.format(this_uuid))
 
 
+@manager.command
+def load_zipcodes(source='zipcodes.csv'):
+    """ Build the bundled ZIP/city/county index from a zip,city,state,county CSV """
+    from app.services.zip_index import ZipIndex, read_zip_source, write_zip_file
+
+    rows = read_zip_source(source)
+
+    path = app.config['ZIP_INDEX_PATH']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_zip_file(rows, path)
+    index = ZipIndex.load(path)
+    print("wrote {} rows to {}: {}".format(len(index), path, index.stats()))
+
+
 @manager.command
 def check_configuration():
     """ Ensure our configuration looks plausible """